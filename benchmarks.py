@@ -0,0 +1,545 @@
+"""
+	Benchmarks for parsr.
+
+	Runs a set of grammars over generated inputs of growing size and
+	nesting depth and measures lexing, parsing and building of the
+	results separately. Every measurement runs in a forked process, so
+	the peak memory of one case does not hide the next one.
+
+	Usage:
+
+		python benchmarks.py [--quick] [--output FILE] [--compare FILE]
+
+	The results are written as JSON, give a file from an older commit
+	to --compare to get the ratios of the timings.
+"""
+
+from parsr import *
+from tests import grammarTests
+import argparse
+import gc
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import time
+
+try:
+	import resource
+except ImportError:
+	resource = None
+
+# Grammars
+
+class SExpr(grammar):
+	"""
+		The grammar from example.py.
+	"""
+	space = token("[ ]+")
+	lp = token("[(]")
+	rp = token("[)]")
+
+	@token("\d+")
+	def number(res):
+		return int(res)
+
+	@token("[+-/%\\*]")
+	def operator(res):
+		if res == "+":
+			return lambda x,y: x + y
+		elif res == "-":
+			return lambda x,y: x - y
+		elif res == "*":
+			return lambda x,y: x * y
+		elif res == "/":
+			return lambda x,y: x/y
+		return lambda x,y: x % y
+
+	lexerStartState = lexState(["rp", "lp", "number", "operator"], ["space"])
+
+	@symbol("lp operator expr expr rp")
+	def op_expr(res):
+		return res[1](res[2], res[3])
+
+	@symbol("op_expr|number")
+	def expr(res):
+		return res[0]
+
+	@symbol("expr")
+	def startSymbol(res):
+		return res[0]
+
+class JSON(grammar):
+	"""
+		JSON without escapes in strings and without exponents in numbers.
+	"""
+	space = token("[ \\n\\t]+")
+	lBrace = token("[{]")
+	rBrace = token("[}]")
+	lBracket = token("\\[")
+	rBracket = token("\\]")
+	comma = token(",")
+	colon = token(":")
+
+	@token("\"[^\"]*\"")
+	def string(res):
+		return res[1:-1]
+
+	@token("-?\d+([.]\d+)?")
+	def number(res):
+		return float(res)
+
+	@token("true|false|null")
+	def constant(res):
+		return {"true" : True, "false" : False, "null" : None}[res]
+
+	lexerStartState = lexState(["lBrace", "rBrace", "lBracket", "rBracket", "comma", "colon",
+								"string", "number", "constant"], ["space"])
+
+	@symbol("string colon value")
+	def member(res):
+		return (res[0], res[2])
+
+	@symbol("lBrace ?(member *(comma member)) rBrace")
+	def object(res):
+		members = flatten(res[1])
+		return dict(i for i in members if isinstance(i, tuple))
+
+	@symbol("lBracket ?(value *(comma value)) rBracket")
+	def array(res):
+		if len(res[1]) == 0:
+			return []
+		first = res[1][0][0]
+		return [first] + [i[1] for i in res[1][0][1]]
+
+	@symbol("object | array | string | number | constant")
+	def value(res):
+		return res[0]
+
+	@symbol("value")
+	def startSymbol(res):
+		return res[0]
+
+class ambiguousExpr(grammar):
+	"""
+		Expressions with a binary operator, where a leading pair of
+		operands can be grouped in two ways. The number of possible
+		interpretations grows exponentially with the number of
+		operators.
+	"""
+	space = token("[ ]+")
+	number = token("\d+")
+	op = token("[+]")
+
+	lexerStartState = lexState(["number", "op"], ["space"])
+
+	pair = symbol("number op number")
+	expr = symbol("number | (number op expr) | (pair op expr)")
+	startSymbol = symbol("expr")
+
+class numberColumn(grammar):
+	"""
+		Numbers separated by white space, converted one by one.
+	"""
+	space = token("[ \\n]+")
+
+	@token("-?\d+")
+	def number(res):
+		return int(res)
+
+	lexerStartState = lexState(["number"], ["space"])
+
+	startSymbol = symbol("{,}*number")
+
+class bulkNumberColumn(numberColumn):
+	"""
+		The same numbers, converted at once by a bulk merger.
+	"""
+	number = token("-?\d+", bulkMerger = lambda lexemes: numericArray(lexemes, int))
+
+# Inputs
+
+def sexprBalanced(depth):
+	if depth == 0:
+		return str(random.randint(1, 9))
+	return "(%s %s %s)" % (random.choice("+-*"), sexprBalanced(depth - 1), sexprBalanced(depth - 1))
+
+def sexprDeep(depth):
+	text = str(random.randint(1, 9))
+	for i in range(depth):
+		text = "(%s %s %d)" % (random.choice("+-*"), text, random.randint(1, 9))
+	return text
+
+def langDigits(digits):
+	number = "".join(random.choice("0123456789") for i in range(digits))
+	return "1%s + 1%s /* %s */" % (number, number, "x" * digits)
+
+def jsonFlat(size):
+	return "[%s]" % ", ".join(str(random.randint(0, 1000)) for i in range(size))
+
+def jsonNested(depth):
+	text = "1"
+	for i in range(depth):
+		if i % 2:
+			text = "[%s, true]" % text
+		else:
+			text = "{\"k%d\" : %s}" % (i, text)
+	return text
+
+def ambiguousOperators(operators):
+	return " + ".join(str(random.randint(1, 9)) for i in range(operators + 1))
+
+def numbers(size):
+	return " ".join(str(random.randint(-1000, 1000)) for i in range(size))
+
+def bnfNames(size):
+	return " ".join("name%d" % i for i in range(size))
+
+def bnfNested(depth):
+	return "(" * depth + "a|b" + ")" * depth
+
+def referenceBnf():
+	gr = bnfGrammar()
+	return gr, {"parser" : gr}
+
+# name, grammar factory, family, input generator, sizes, quick sizes
+cases = [
+	("sexpr", lambda: (SExpr(), {}), "balanced", sexprBalanced, [2, 3, 4, 5, 6], [2, 3, 4]),
+	("sexpr", lambda: (SExpr(), {}), "deep", sexprDeep, [4, 8, 16, 32, 64], [4, 8, 16]),
+	("lang", lambda: (grammarTests.lang(), {}), "digits", langDigits, [4, 16, 64, 256], [4, 16, 64]),
+	("json", lambda: (JSON(), {}), "flat", jsonFlat, [8, 32, 128, 512], [8, 32, 128]),
+	("json", lambda: (JSON(), {}), "nested", jsonNested, [4, 8, 16, 32], [4, 8, 16]),
+	("ambiguous", lambda: (ambiguousExpr(), {}), "operators", ambiguousOperators, [2, 4, 6, 8, 10], [2, 4, 6]),
+	("numbers", lambda: (numberColumn(), {}), "column", numbers, [64, 256, 1024, 4096], [64, 256, 1024]),
+	("bulk", lambda: (bulkNumberColumn(), {}), "column", numbers, [64, 256, 1024, 4096], [64, 256, 1024]),
+	("bnf", referenceBnf, "names", bnfNames, [2, 4, 8, 16], [2, 4, 8]),
+	("bnf", referenceBnf, "nested", bnfNested, [1, 2, 3, 4, 5], [1, 2, 3]),
+]
+
+# Measurement
+
+def currentRSS():
+	"""
+		Resident memory of this process in kB, if known.
+	"""
+	try:
+		with open("/proc/self/statm") as f:
+			return int(f.read().split()[1]) * resource.getpagesize() / 1024
+	except (IOError, AttributeError):
+		return None
+
+def peakRSS():
+	"""
+		Peak resident memory of this process in kB, if known.
+	"""
+	if resource is None:
+		return None
+	return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def liveLeafs(state):
+	"""
+		Count the leafs of the possibility tree without changing it.
+	"""
+	if len(state._possibilities) == 0:
+		return 1
+	return sum(liveLeafs(p) for p in state._possibilities)
+
+class phase(object):
+	"""
+		Measures time, objects and memory of one phase of a parse.
+
+		objects is the number of objects tracked by the garbage collector
+		that were created and not freed in the phase, peakKB is how far
+		the peak resident memory rose above the memory in use when the
+		phase started. It is 0 if the phase stayed below an earlier peak.
+	"""
+	def __init__(self, measureMemory):
+		self.measureMemory = measureMemory
+		self.seconds = None
+		self.objects = None
+		self.peakKB = None
+
+	def __enter__(self):
+		if self.measureMemory:
+			gc.collect()
+			self._objects = len(gc.get_objects())
+			self._rss = currentRSS()
+			self._peak = peakRSS()
+		gc.disable()
+		self._start = time.time()
+		return self
+
+	def __exit__(self, *args):
+		self.seconds = time.time() - self._start
+		gc.enable()
+		if self.measureMemory:
+			self.objects = len(gc.get_objects()) - self._objects
+			peak = peakRSS()
+			if peak is not None and self._rss is not None:
+				self.peakKB = max(0, peak - self._rss) if peak > self._peak else 0
+		return False
+
+def runOnce(gr, context, text, measureMemory):
+	"""
+		Lex, parse and build results like grammar.parse, measuring
+		every step.
+	"""
+	report = {"outcome" : "ok", "tokens" : 0, "peakLiveStates" : 0}
+	phases = {}
+
+	try:
+		with phase(measureMemory) as p:
+			tokens = gr.lex(text)
+		phases["lex"] = p
+		report["tokens"] = len(tokens)
+
+		with phase(measureMemory) as p:
+			state = parserRootState(gr.startSymbol)
+			peak = 1
+			for t in tokens:
+				state.pushToken(t)
+				peak = max(peak, len(state.lastTokens))
+			peak = max(peak, liveLeafs(state))
+		phases["parse"] = p
+		report["peakLiveStates"] = peak
+
+		with phase(measureMemory) as p:
+			state.result(context)
+		phases["result"] = p
+	except ParsrError as e:
+		report["outcome"] = e.__class__.__name__
+
+	report["phases"] = phases
+	return report
+
+def measureMemory(gr, context, text, tokens):
+	"""
+		Bytes attributed to tokens, states and results by parseMemory,
+		measuring the states about 16 times per parse.
+	"""
+	memory = parseMemory(every = max(1, tokens // 16))
+
+	try:
+		grammar.parse(gr, text, context, tracer = memory)
+	except ParsrError:
+		pass
+
+	return {
+		"method" : memory.method,
+		"tokenBytes" : memory.tokenBytes,
+		"treeBytes" : memory.treeBytes,
+		"resultBytes" : memory.resultBytes,
+		"peakBytes" : memory.peakBytes,
+		"perInputByte" : memory.perInputByte(),
+	}
+
+def runCase(factory, text, repeat):
+	gr, context = factory()
+	report = runOnce(gr, context, text, True)
+
+	for i in range(repeat - 1):
+		again = runOnce(gr, context, text, False)
+		for name, p in again["phases"].items():
+			report["phases"][name].seconds = min(report["phases"][name].seconds, p.seconds)
+
+	report["memory"] = measureMemory(gr, context, text, report["tokens"])
+
+	tokens = report["tokens"]
+	report["phases"] = dict((name, {
+		"seconds" : p.seconds,
+		"tokensPerSecond" : tokens / p.seconds if p.seconds > 0 else None,
+		"objects" : p.objects,
+		"peakKB" : p.peakKB,
+	}) for name, p in report["phases"].items())
+
+	return report
+
+def inChild(f, *args):
+	"""
+		Run f in a forked process and return its result, or run it
+		here where fork is not available.
+	"""
+	if not hasattr(os, "fork"):
+		return f(*args)
+
+	read, write = os.pipe()
+	pid = os.fork()
+
+	if pid == 0:
+		os.close(read)
+		try:
+			data = json.dumps(f(*args))
+		except Exception as e:
+			data = json.dumps({"error" : "%s: %s" % (e.__class__.__name__, e)})
+		with os.fdopen(write, "w") as out:
+			out.write(data)
+		os._exit(0)
+
+	os.close(write)
+	with os.fdopen(read) as inp:
+		data = inp.read()
+	os.waitpid(pid, 0)
+	return json.loads(data)
+
+def timeConstruction(factory, repeat):
+	times = []
+	for i in range(repeat):
+		start = time.time()
+		factory()
+		times.append(time.time() - start)
+	return min(times)
+
+def slope(points):
+	"""
+		Fit log(y) = a * log(x) + b and return a.
+	"""
+	points = [(math.log(x), math.log(y)) for x, y in points if x > 0 and y > 0]
+	if len(points) < 2:
+		return None
+
+	mx = sum(x for x, y in points) / len(points)
+	my = sum(y for x, y in points) / len(points)
+	sxx = sum((x - mx) ** 2 for x, y in points)
+
+	if sxx == 0:
+		return None
+
+	return sum((x - mx) * (y - my) for x, y in points) / sxx
+
+def gitCommit():
+	try:
+		return subprocess.check_output(["git", "rev-parse", "HEAD"],
+										cwd = os.path.dirname(os.path.abspath(__file__)),
+										stderr = subprocess.STDOUT).strip()
+	except (OSError, subprocess.CalledProcessError):
+		return None
+
+def run(quick = False, repeat = 3, seed = 0):
+	results = {
+		"meta" : {
+			"commit" : gitCommit(),
+			"python" : platform.python_version(),
+			"platform" : platform.platform(),
+			"seed" : seed,
+			"repeat" : repeat,
+			"quick" : quick,
+		},
+		"construction" : {},
+		"cases" : [],
+	}
+
+	for name, factory, family, generate, sizes, quickSizes in cases:
+		if not name in results["construction"]:
+			results["construction"][name] = inChild(timeConstruction, factory, repeat)
+
+		for size in (quickSizes if quick else sizes):
+			random.seed("%s-%s-%s-%s" % (seed, name, family, size))
+			text = generate(size)
+
+			report = inChild(runCase, factory, text, repeat)
+			report.update({
+				"grammar" : name,
+				"family" : family,
+				"size" : size,
+				"inputBytes" : len(text),
+			})
+			results["cases"].append(report)
+
+	return results
+
+def caseKey(case):
+	return (case["grammar"], case["family"], case["size"])
+
+def printResults(results, compareTo = None):
+	old = {}
+	if compareTo:
+		old = dict((caseKey(c), c) for c in compareTo["cases"])
+
+	print "Construction:"
+	for name, seconds in sorted(results["construction"].items()):
+		print "  %-10s %8.2fms" % (name, seconds * 1000)
+	print
+
+	header = "%-10s %-10s %5s %7s %-18s %9s %11s %8s %8s %8s" % (
+		"grammar", "family", "size", "tokens", "outcome", "phase", "tokens/s", "objects", "peakKB", "states")
+	if compareTo:
+		header += " %8s" % "vs old"
+	print header
+
+	curves = {}
+
+	for case in results["cases"]:
+		if "error" in case:
+			print "%-10s %-10s %5s error: %s" % (case["grammar"], case["family"], case["size"], case["error"])
+			continue
+
+		for name in ("lex", "parse", "result"):
+			if not name in case["phases"]:
+				continue
+			p = case["phases"][name]
+			line = "%-10s %-10s %5d %7d %-18s %9s %11s %8s %8s %8s" % (
+				case["grammar"], case["family"], case["size"], case["tokens"], case["outcome"], name,
+				"%.0f" % p["tokensPerSecond"] if p["tokensPerSecond"] else "-",
+				p["objects"] if p["objects"] is not None else "-",
+				p["peakKB"] if p["peakKB"] is not None else "-",
+				case["peakLiveStates"] if name == "parse" else "")
+
+			previous = old.get(caseKey(case), {}).get("phases", {}).get(name)
+			if previous and previous["seconds"]:
+				line += " %7.2fx" % (p["seconds"] / previous["seconds"])
+
+			print line
+
+			curves.setdefault((case["grammar"], case["family"], name), []).append((case["tokens"], p["seconds"]))
+
+	print
+	print "Growth of time with number of tokens (fitted exponent):"
+	for key, points in sorted(curves.items()):
+		exponent = slope(points)
+		print "  %-10s %-10s %-7s %s" % (key + ("%.2f" % exponent if exponent is not None else "-",))
+
+	print
+	print "Memory (bytes, %s):" % ", ".join(sorted(set(c["memory"]["method"] for c in results["cases"] if "memory" in c)))
+	print "%-10s %-10s %5s %7s %10s %10s %10s %10s %10s" % (
+		"grammar", "family", "size", "input", "tokens", "states", "results", "peak", "per byte")
+
+	perByte = {}
+
+	for case in results["cases"]:
+		if not "memory" in case:
+			continue
+		m = case["memory"]
+		print "%-10s %-10s %5d %7d %10d %10d %10d %10d %10.1f" % (
+			case["grammar"], case["family"], case["size"], case["inputBytes"], m["tokenBytes"],
+			m["treeBytes"], m["resultBytes"], m["peakBytes"], m["perInputByte"])
+		key = case["grammar"]
+		perByte[key] = max(perByte.get(key, 0), m["perInputByte"])
+
+	print
+	print "Largest peak per byte of input, to size memory limits:"
+	for name, value in sorted(perByte.items()):
+		print "  %-10s %10.1f" % (name, value)
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description = "Run the parsr benchmarks.")
+	parser.add_argument("--quick", action = "store_true", help = "only use the smaller inputs")
+	parser.add_argument("--repeat", type = int, default = 3, help = "runs per case, the fastest counts")
+	parser.add_argument("--seed", type = int, default = 0, help = "seed for the generated inputs")
+	parser.add_argument("--output", help = "write results as JSON to this file")
+	parser.add_argument("--compare", help = "JSON file of an earlier run to compare with")
+	args = parser.parse_args()
+
+	results = run(quick = args.quick, repeat = args.repeat, seed = args.seed)
+
+	compareTo = None
+	if args.compare:
+		with open(args.compare) as f:
+			compareTo = json.load(f)
+
+	printResults(results, compareTo)
+
+	if args.output:
+		with open(args.output, "w") as f:
+			json.dump(results, f, indent = 1, sort_keys = True)
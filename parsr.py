@@ -8,9 +8,37 @@
 	A tool for creating parsers for self defined languages.
 """
 
+import array
+import bisect
+import collections
+import hashlib
+import marshal
+import os
+import pkgutil
 import re
-import pdb
-import os.path as path
+import sre_constants
+import sre_parse
+import struct
+import sys
+import time
+import types
+import warnings
+import weakref
+
+try:
+	import cPickle as pickle
+except ImportError:
+	import pickle
+
+try:
+	from cStringIO import StringIO
+except ImportError:
+	from StringIO import StringIO
+
+try:
+	import tracemalloc
+except ImportError:
+	tracemalloc = None
 
 class ParsrError(Exception):
 	"""
@@ -92,17 +120,131 @@ class InfiniteStateExpansion(RuntimeError, ParsrError):
 	def __str__(self):
 		return "States expand to infinity."
 
+class ParseLimitExceeded(RuntimeError, ParsrError):
+	"""
+		Indicates that a parse went over one of its parseLimits.
+
+		Has attributes limit, which is the name of the limit, value,
+		which is the value it was exceeded with, state, which is the
+		root state of the parse or None while lexing, and the statistics of the parse so 
+		far: tokens, the number of tokens pushed, liveStates, the 
+		number of possible interpretations after the last one, states,
+		the number of states created, and seconds, the time spent.
+	"""
+	def __init__(self, limit, value, state, tokens, liveStates, states, seconds):
+		self.limit = limit
+		self.value = value
+		self.state = state
+		self.tokens = tokens
+		self.liveStates = liveStates
+		self.states = states
+		self.seconds = seconds
+
+	def __str__(self):
+		return "Exceeded %s with %s after %d tokens, %d live states, %d states created, %.3fs." % (
+					self.limit, self.value, self.tokens, self.liveStates, self.states, self.seconds)
+
+class BNFError(SyntaxError, ParsrError):
+	"""
+		Indicates a malformed BNF string given to symbol.
+
+		Has attributes text, which is the BNF string, pos,
+		which is the position in the text where the error
+		occured, and expected, which describes what was
+		expected there.
+	"""
+	def __init__(self, text, pos, expected):
+		self.text = text
+		self.pos = pos
+		self.expected = expected
+
+	def __str__(self):
+		return "At position %d in '%s': Expected %s." % (self.pos, self.text, self.expected)
+
+class GrammarWarning(UserWarning, ParsrError):
+	"""
+		Warns about an issue found in a grammar when it was created,
+		see grammar.analyze.
+	"""
+	pass
+
+class GrammarError(TypeError, ParsrError):
+	"""
+		Indicates issues found in a strict grammar when it was 
+		created, see grammar.analyze.
+
+		Has attribute issues, which is the list of grammarIssues.
+	"""
+	def __init__(self, issues):
+		self.issues = issues
+
+	def __str__(self):
+		return "\n".join(str(i) for i in self.issues)
+
+class SerializationError(TypeError, ParsrError):
+	"""
+		Indicates that a grammar can't be serialized by dumps, since
+		the merger of one of its symbols can't be looked up when 
+		loading.
+
+		Has attributes symbol, which is the symbol, and merger, which
+		is the function.
+	"""
+	def __init__(self, symbol, merger):
+		self.symbol = symbol
+		self.merger = merger
+
+	def __str__(self):
+		return "Can't store merger %s of symbol %s, it needs to be defined in the grammar class or at module level." % (
+					self.merger.__name__, self.symbol.name)
+
+class grammarIssue(object):
+	"""
+		A shape in a grammar that makes the parser fail or blow up.
+
+		Has attributes kind, which names the shape, level, which is
+		"error" for shapes that make the parser fail, "warning" for
+		shapes that make it slow and "info" for shapes that could make
+		it slow, symbols, which are the names of the symbols that form
+		the shape, and message, which describes it.
+	"""
+	def __init__(self, kind, level, symbols, message):
+		self.kind = kind
+		self.level = level
+		self.symbols = symbols
+		self.message = message
+
+	def __str__(self):
+		return "%s: %s" % (", ".join(self.symbols), self.message)
+
+	def __repr__(self):
+		return "<grammarIssue %s: %s>" % (self.kind, ", ".join(self.symbols))
+
 class grammar(object):
 	"""
 		Base class for grammar.
 	"""
+	# Raise a GrammarError instead of warning about issues found by
+	# analyze.
+	strict = False
+
+	# Names of the tokens that end an item of the repeated start
+	# symbol, see parallelParse.
+	syncTokens = []
+
+	# A parseCache for the results of parse.
+	cache = None
+
+	# The parseLimits for parse and parseSpans.
+	limits = None
+
 	@classmethod
-	def fromSymbol(cls, symbol, verbose = False, lexerStates = None):
+	def fromSymbol(cls, symbol, verbose = False, lexerStates = None, strict = None):
 		if not lexerStates:
 			lexerStates = [lexerState(symbol.getTokens(), [])]
-		return grammar(lexerStates, symbol, verbose = verbose)
+		return grammar(lexerStates, symbol, verbose = verbose, strict = strict)
 
-	def __init__(self, lexerStates = None, startSymbol = None, lexerStartState = None, verbose = False):
+	def __init__(self, lexerStates = None, startSymbol = None, lexerStartState = None, verbose = False, strict = None):
 		self.lexerStates = None
 
 		if not lexerStates and not startSymbol and not lexerStartState:
@@ -125,409 +267,3101 @@ class grammar(object):
 		if not hasattr(self, "lexerStartState") or not self.lexerStartState:
 			self.lexerStartState = self.lexerStates[0]
 
+		self.initLexerTables()
 
 		self.verbose = verbose
 
-	def parse(self, text, context = None):
+		if strict is not None:
+			self.strict = strict
+
+		self.issues = self.analyze()
+		self.reportIssues()
+
+	# Version of the format written by dumps.
+	serializationFormat = 3
+
+	def dumps(self):
 		"""
-			Try to match this grammar to a text.
+			Serialize this grammar with its symbols and lexer tables
+			to a string, to be read back with grammar.loads.
 
-			context : dict - This dict could be used to pass some context
-						     dependend variables to the mergers of the symbols.
+			Mergers are stored by their place in the grammar class,
+			so the class needs to be importable when loading. Mergers
+			of grammars created from plain symbols need to be module
+			level functions, others raise a SerializationError.
 		"""
-		if context is None:
-			context = {}
+		cls = self.__class__
+		mergers = self.mergerReferences()
+
+		def persistentId(obj):
+			if obj is cls and cls is not grammar:
+				return ("class", cls.__module__, _qualifiedName(cls))
+			if isinstance(obj, types.FunctionType):
+				if id(obj) in mergers:
+					return ("merger", cls.__module__, _qualifiedName(cls)) + mergers[id(obj)]
+				if getattr(sys.modules.get(obj.__module__), obj.__name__, None) is not obj:
+					raise SerializationError(self.mergerOwner(obj), obj)
+			return None
+
+		f = StringIO()
+		p = pickle.Pickler(f, 2)
+		p.persistent_id = persistentId
+		p.dump((self.serializationFormat, self))
+		return f.getvalue()
 
-		tokens = self.lex(text)
+	@classmethod
+	def loads(cls, data):
+		"""
+			Create a grammar from a string written by dumps.
+		"""
+		def persistentLoad(pid):
+			obj = _findByName(pid[1], pid[2])
 
-		state = None
+			if pid[0] == "class":
+				return obj
 
-		try:
-			state = parserRootState(self.startSymbol, verbose = self.verbose)
+			obj = getattr(obj, pid[3])
+			for i in pid[4]:
+				obj = obj.symbols[i]
 
-			if self.verbose:
-				print "\n== Start parsing. == \n"
+			if len(pid) > 6:
+				return obj.levels[pid[6]][1]
+			return getattr(obj, pid[5] if len(pid) > 5 else "merger")
 
-			for t in tokens:
-				if self.verbose:
-					print "\n\n\n--> Push result from token %s at position %d: %s" % (t.token.name, tokens.index(t) + 1, t.result)
-				state.pushToken(t)
-		except RuntimeError as e:
-			if ("%s" % e)[:5] == "maxim":
-				raise InfiniteStateExpansion(state)
-			raise
+		u = pickle.Unpickler(StringIO(data))
+		u.persistent_load = persistentLoad
+		version, gr = u.load()
 
+		if version != cls.serializationFormat:
+			raise ValueError("Can't load grammar in format %s." % version)
 
-		return state.result(context)
+		return gr
 
-	def lex(self, text):
+	def save(self, filename):
 		"""
-			Turn text to a list of token matches.
+			Write this grammar to a file, see dumps.
 		"""
-		if self.verbose:
-			print "\n == Start lexing. == \n"
+		with open(filename, "wb") as f:
+			f.write(self.dumps())
 
-		tokStream = []
-
-		states = [self.lexerStartState]
+	@classmethod
+	def load(cls, filename):
+		"""
+			Read a grammar from a file written by save.
+		"""
+		with open(filename, "rb") as f:
+			return cls.loads(f.read())
 
-		pushOn = {}
+	def generateParser(self):
+		"""
+			Get the source of a python module with a function 
+			parse(text, context = None), which parses like parse of 
+			this grammar, see parserGenerator. 
+
+			Like for dumps, the class of the grammar needs to be 
+			importable and mergers of grammars created from plain 
+			symbols need to be module level functions. Left recursive
+			grammars raise a GrammarError.
+		"""
+		return parserGenerator(self).module()
 
-		for state in self.lexerStates:
-			if state.pushOn:
-				if isinstance(state.pushOn, list):
-					for p in state.pushOn:
-						pushOn[p] = state
-				else:
-					pushOn[state.pushOn] = state
+	def mergerReferences(self):
+		"""
+			Get a dict mapping the id of every merger defined in the
+			grammar class to (name of symbol, path to subsymbol), with
+			"bulkMerger" appended for bulk mergers and "levels" and the
+			level for the mergers of the levels of operators.
+		"""
+		refs = {}
+		cls = self.__class__
 
-		pos = 0
+		def collect(sym, name, path, seen):
+			if sym in seen:
+				return
+			seen.append(sym)
 
-		while pos < len(text):
-			if len(states) == 0:
-				states = [self.lexerState]
-			
-			if self.verbose:
-				print "\nRemaining Text starts at: '%s'" % self.adjustCodeOutput(text[pos:])
+			merger = getattr(sym, "merger", None)
+			if isinstance(merger, types.FunctionType) and not id(merger) in refs:
+				refs[id(merger)] = (name, path)
 
-			# Check weather next chars should be omitted
-			omitted = False
+			merger = getattr(sym, "bulkMerger", None)
+			if isinstance(merger, types.FunctionType) and not id(merger) in refs:
+				refs[id(merger)] = (name, path, "bulkMerger")
 
-			for tok in states[-1].omit:
-				if self.verbose:
-					print "Omit: %s" % tok.name
+			for level, (associativity, merger) in enumerate(getattr(sym, "levels", [])):
+				if isinstance(merger, types.FunctionType) and not id(merger) in refs:
+					refs[id(merger)] = (name, path, "levels", level)
 
-				match = tok.match(text, pos)
+			if isinstance(sym, containsSymbols):
+				for i, sub in enumerate(sym.symbols):
+					collect(sub, name, path + (i,), seen)
 
-				if match:
-					if states[-1].popOn == tok:
-						states.pop()
-						if self.verbose:
-							print "Popped state, new state is %s" % states[-1].name
-					if tok in pushOn:
-						states.append(pushOn[tok])
-						if self.verbose:
-							print "Pushed state, new state is %s" % states[-1].name
-
-					omitted = True
-					pos = match.end
-					break
-
-			if omitted:
-				continue
+		for name in dir(cls):
+			item = getattr(cls, name)
+			if isinstance(item, symbol):
+				collect(item, name, (), [])
 
-			# Next character mus be some token.
-			success = False
+		return refs
 
-			for tok in states[-1].tokens:
-				if self.verbose:
-					print "Checking: %s" % tok.name
+	def mergerOwner(self, merger):
+		"""
+			Get the symbol of the grammar that uses merger, as merger,
+			bulkMerger or merger of a level of operators.
+		"""
+		seen = set()
+		todo = [self.startSymbol] + [tok for state in self.lexerStates for tok in state.tokens + state.omit]
 
-				match = tok.match(text, pos)
+		while todo:
+			sym = todo.pop()
+			if sym in seen:
+				continue
+			seen.add(sym)
 
-				if match:
-					if states[-1].popOn == tok:
-						states.pop()
-						if self.verbose:
-							print "Popped state, new state is %s" % states[-1].name
-					if tok in pushOn:
-						states.append(pushOn[tok])
-						if self.verbose:
-							print "Pushed state, new state is %s" % states[-1].name
+			used = [getattr(sym, "merger", None), getattr(sym, "bulkMerger", None)]
+			used.extend(m for a, m in getattr(sym, "levels", []))
+			if any(m is merger for m in used):
+				return sym
 
-					if self.verbose:
-						print "-----> Found from position %d to %d: %s" % (match.start, match.end, match.result)
+			todo.extend(getattr(sym, "symbols", []))
 
-					tokStream.append(match)
+		return None
 
-					success = True
-					pos = match.end
-					break
+	def parse(self, text, context = None, stats = None, tracer = None, limits = None):
+		"""
+			Try to match this grammar to a text.
 
-			if success:
-				continue
+			context : dict - This dict could be used to pass some context
+						     dependend variables to the mergers of the symbols.
+			stats : parseStats - Collect statistics about the parse in this
+								 object.
+			tracer : tracer - Receives the events of the parse.
+			limits : parseLimits - Bounds for the parse, instead of the
+								   limits of the grammar.
 
-			# That surely is a problem...
-			raise LexerError(text, pos, states[-1])
+			Parses with stats or a tracer don't use the cache.
+		"""
+		if context is None:
+			context = {}
 
-		if self.verbose:
-			print "\n"
-			print "---> %d tokens found." % len(tokStream)
-			print "\n"
+		if limits is None:
+			limits = self.limits
 
-		return tokStream
+		tracer = self.getTracer(stats, tracer)
 
-	def adjustCodeOutput(self, text):
-		newLinePos = text.find("\n")
-		if newLinePos == -1:
-			return text
+		if tracer is None:
+			if self.cache is not None:
+				return self.cache.parse(self, text, context, lambda: self._parse(text, context, None, limits))
+			return self._parse(text, context, None, limits)
 
-		if text[:newLinePos].strip() == "":
-			return "\\n" + self.adjustCodeOutput(text[(newLinePos+1):])
+		try:
+			return self._parse(text, context, tracer, limits)
+		finally:
+			tracer.parseFinished()
 
-		return text[:newLinePos]
+	def _parse(self, text, context, tracer, limits = None):
+		state = self._parseState(text, tracer, limits)
 
-	def initLexerStates(self):
-		self.lexerStates = []
+		if tracer is None:
+			return state.result(context)
 
-		for key, item in ((i, getattr(self, i)) for i in dir(self)):
-			if not isinstance(item, lexState):
-				continue
+		start = time.time()
+		try:
+			result = state.result(context)
+			tracer.resultBuilt(result)
+			return result
+		finally:
+			tracer.phaseDone("result", time.time() - start)
 
-			omit = []
+	def parseSpans(self, text, stats = None, tracer = None, limits = None):
+		"""
+			Parse a text like parse, but return a spanTree instead of
+			the results. No mergers are called.
+		"""
+		if limits is None:
+			limits = self.limits
 
-			def getToken(name):
-				if not name in self.definedSymbols:
-					raise ValueError("Token %s not defined." % name)
-				t = self.definedSymbols[name]
-				if not isinstance(t, token):
-					raise ValueError("%s is no token." % name)
-				return t 
+		tracer = self.getTracer(stats, tracer)
 
-			for o in item.omit:
-				omit.append(getToken(o))
+		try:
+			state = self._parseState(text, tracer, limits)
+
+			if tracer is None:
+				return spanTree(text, state.validPossibility())
+
+			start = time.time()
+			try:
+				tree = spanTree(text, state.validPossibility())
+				tracer.resultBuilt(tree)
+				return tree
+			finally:
+				tracer.phaseDone("result", time.time() - start)
+		finally:
+			if tracer is not None:
+				tracer.parseFinished()
+
+	def _parseState(self, text, tracer, limits = None):
+		"""
+			Lex and parse text, return the root state.
+		"""
+		if tracer is not None or limits is not None:
+			start = time.time()
+			started = start
 
+		if limits is None or (limits.maxTokens is None and limits.maxSeconds is None):
+			tokens = self.lex(text, tracer)
+		else:
+			# Check the limits while lexing, they bound it too.
 			tokens = []
+			for t in self.iterlex(text, tracer):
+				tokens.append(t)
+				limits.checkLexing(len(tokens), started)
 
-			for n in item.tokens:
-				tokens.append(getToken(n))
+			if tracer is not None:
+				tracer.lexingDone(tokens)
 
-			if item.pushOn:
-				if isinstance(item.pushOn, str):
-					pushOn = [getToken(item.pushOn)]
-				else:
-					pushOn = [getToken(p) for p in item.pushOn]
-			else:
-				pushOn = None
+		if tracer is not None:
+			tracer.phaseDone("lex", time.time() - start)
+			start = time.time()
 
-			if item.popOn:
-				popOn = getToken(item.popOn)
-			else:
-				popOn = None
+		state = None
 
-			l = lexerState(tokens, omit, pushOn, popOn)
-			l.name = key
-			self.lexerStates.append(l)
+		try:
+			state = parserRootState(self.startSymbol, tracer = tracer)
 
-			if key == "lexerStartState":
-				self.lexerStartState = l 
+			if limits is not None:
+				limits.check(state, 0, len(tokens), started)
 
-		if not hasattr(self, "lexerStartState"):
-			raise TypeError("No lexerStartState defined.")
-			
+			if tracer is None and limits is None:
+				for t in tokens:
+					state.pushToken(t)
+			else:
+				if tracer is not None:
+					tracer.parsingStarted(state)
+
+				for index, t in enumerate(tokens):
+					if tracer is not None:
+						tracer.tokenPushed(t, index)
+					state.pushToken(t)
+					if tracer is not None:
+						tracer.tokenProcessed(state)
+					if limits is not None:
+						limits.check(state, index + 1, len(tokens), started)
+		except RuntimeError as e:
+			if ("%s" % e)[:5] == "maxim":
+				raise InfiniteStateExpansion(state)
+			raise
+		finally:
+			if tracer is not None:
+				tracer.phaseDone("parse", time.time() - start)
 
-	def initSymbols(self):
-		self.definedSymbols = {}
+		return state
 
-		for key, item in ((i, getattr(self, i)) for i in dir(self)):
-			if not isinstance(item, symbol):
-				continue
+	def iterparse(self, text, context = None, stats = None, tracer = None):
+		"""
+			Parse a text with a start symbol that repeats some item and
+			yield the result of every item as soon as it is complete.
 
-			item = item.__copy__()
-			item.name = key
+			An item is complete when all possible interpretations of the
+			text agree on it. Its states are dropped then, so the memory
+			needed does not grow with the number of items. The mergers of 
+			the repetition and of the symbols around it are not called.
+			Errors in the text are raised when they are reached. 
 
-			if key == "startSymbol":
-				self.startSymbol = item
+			Arguments are the same as for parse.
+		"""
+		if context is None:
+			context = {}
 
-			self.definedSymbols[key] = item
+		for result, end, lexerStates in self._iterItems(text, context, self.getTracer(stats, tracer)):
+			yield result
 
-			for key2, item2 in self.definedSymbols.viewitems():
-				item2.define(key, item)
-				item.define(key2, item2)
+	def parseIncremental(self, text, context = None, stats = None, tracer = None):
+		"""
+			Parse a text like iterparse and return an incrementalParse,
+			which could be passed to reparse after the text was edited.
+		"""
+		if context is None:
+			context = {}
 
+		items = []
+		checkpoints = [(0, (self.lexerStartState,))]
 
-class lexerState(object):
-	def __init__(self, tokens, omit = None, pushOn = None, popOn = None):
-		if omit is None:
-			omit = []
-		elif not isinstance(omit, list):
-			omit = [omit]
+		for result, end, lexerStates in self._iterItems(text, context, self.getTracer(stats, tracer)):
+			items.append(result)
+			checkpoints.append((end, lexerStates))
 
-		self.omit = omit
+		return incrementalParse(_pieces([(text, 0, len(text), 0)], ""), _pieces([(items, 0, len(items), 0)], []), 
+								_pieces([(checkpoints, 0, len(checkpoints), 0)], []), context, len(items))
 
-		self.tokens = []
-		
-		for t in tokens:
-			if isinstance(t, token):
-				self.tokens.append(t)
-			elif isinstance(t, lexerState):
-				self.tokens.extend(t.tokens)
+	def reparse(self, previous, start, end, replacement, stats = None, tracer = None):
+		"""
+			Replace text[start:end] of a previous incrementalParse and
+			parse the new text, reusing what did not change.
+
+			The parse restarts at the second checkpoint before the edit
+			and stops as soon as an item ends where an item of the 
+			previous parse ended behind the edit, with the same lexer
+			states. The items behind are taken from the previous parse 
+			then. Tokens must not look further ahead or behind than the 
+			item before or after them.
+
+			Only the text from the item before the restart on is lexed,
+			as far as needed, and the text, items and checkpoints are
+			shared with the previous parse, so an edit takes time in the 
+			items parsed again, not in the length of the text.
+		"""
+		oldText, oldItems, checkpoints = previous.pieces
+		text = _pieces(oldText.cut(0, start) + [(replacement, 0, len(replacement), 0)] + oldText.cut(end, len(oldText)), "")
+		shift = len(replacement) - (end - start)
+
+		# The last checkpoint before the edit.
+		low, high = 0, len(checkpoints) - 1
+		while low < high:
+			middle = (low + high + 1) // 2
+			if checkpoints[middle][0] < start:
+				low = middle
 			else:
-				raise TypeError("lexerState: can only contain other tokens, not '%s'" % type(t))
+				high = middle - 1
+
+		# The last token before the checkpoint could have looked
+		# into the edited text.
+		restart = max(0, low - 1)
+
+		# The first checkpoint of the previous parse behind the edit.
+		low, high = restart + 1, len(checkpoints)
+		while low < high:
+			middle = (low + high) // 2
+			if checkpoints[middle][0] < end:
+				low = middle + 1
+			else:
+				high = middle
+		behind = low
+
+		# With limits on the repetition, the number of items has to be
+		# the same to reuse the rest.
+		sym = self.repeatedSymbol()
+		limited = sym.From > 0 or sym.To != -1
+
+		# Only a window of the text is lexed, from the item before the
+		# restart, for tokens that look behind, to at least the item 
+		# after the one the parse stops with, for tokens that look 
+		# ahead. It grows while the parse doesn't stop in it.
+		windowStart = checkpoints[restart - 1][0] if restart > 0 else 0
+		windowEnd = checkpoints[min(behind + 2, len(checkpoints) - 1)][0] + shift if behind < len(checkpoints) else len(text)
+		tracer = self.getTracer(stats, tracer)
+
+		while True:
+			final = windowEnd >= len(text)
+			if final:
+				windowEnd = len(text)
+
+			window = _pieces(text.cut(windowStart, windowEnd), "").join()
+			error = None
+
+			try:
+				parse = self._reparseWindow(previous, text, window, windowStart, final, restart, behind, shift, limited, tracer)
+			except ParsrError as e:
+				if final:
+					error = e
+				parse = None
+
+			if error is not None:
+				# Raise the error again with the positions in the whole
+				# text.
+				pos, lexerStates = checkpoints[restart]
+				for item in self._iterItems(text.join(), previous.context, None, pos, list(lexerStates), restart):
+					pass
+				raise error
+
+			if parse is not None:
+				return parse
+
+			windowEnd = windowStart + max(1, 2 * (windowEnd - windowStart))
+
+	def _reparseWindow(self, previous, text, window, offset, final, restart, behind, shift, limited, tracer):
+		"""
+			Parse the edited text from the checkpoint restart on with 
+			window, the text from offset on, for reparse. Returns the 
+			incrementalParse, None if the window is too short to know 
+			it.
+		"""
+		oldText, oldItems, checkpoints = previous.pieces
 
-		#self.tokens.sort(key = lambda x: x.preference, reverse = True)
+		items = []
+		newCheckpoints = []
 
-		self.pushOn = pushOn
-		self.popOn = popOn
+		pos, lexerStates = checkpoints[restart]
+		parsed = self._iterItems(window, previous.context, tracer, pos - offset, list(lexerStates), restart)
 
-		self.name = "lexerState"
+		try:
+			for result, itemEnd, lexerStates in parsed:
+				itemEnd += offset
+				items.append(result)
+				newCheckpoints.append((itemEnd, lexerStates))
+
+				while behind < len(checkpoints) and checkpoints[behind][0] + shift < itemEnd:
+					behind += 1
+
+				# The last checkpoint behind the edit at the end of the 
+				# item.
+				index = behind
+				while index + 1 < len(checkpoints) and checkpoints[index + 1][0] + shift == itemEnd:
+					index += 1
+
+				if index == len(checkpoints) or checkpoints[index][0] + shift != itemEnd:
+					continue
+
+				if checkpoints[index][1] != lexerStates:
+					continue
+
+				if limited and index != restart + len(items):
+					continue
+
+				# Without the next item in the window, its tokens could
+				# have looked past the window.
+				if not final and (index + 1 == len(checkpoints) or checkpoints[index + 1][0] + shift > offset + len(window)):
+					continue
+
+				return incrementalParse(text, 
+										_pieces(oldItems.cut(0, restart) + [(items, 0, len(items), 0)] + oldItems.cut(index, len(oldItems)), []),
+										_pieces(checkpoints.cut(0, restart + 1) + [(newCheckpoints, 0, len(newCheckpoints), 0)] 
+												+ checkpoints.cut(index + 1, len(checkpoints), shift), []),
+										previous.context, len(items))
+		finally:
+			parsed.close()
+
+		if not final:
+			return None
+
+		return incrementalParse(text, _pieces(oldItems.cut(0, restart) + [(items, 0, len(items), 0)], []),
+								_pieces(checkpoints.cut(0, restart + 1) + [(newCheckpoints, 0, len(newCheckpoints), 0)], []),
+								previous.context, len(items))
+
+	def _iterItems(self, text, context, tracer, pos = 0, lexerStates = None, dropped = 0):
+		"""
+			Parse text from pos on like iterparse, starting with the
+			stack lexerStates and after dropped items. Yields the result
+			of every item, the position in text where the item ends and 
+			the lexer states there.
+		"""
+		if lexerStates is None:
+			lexerStates = [self.lexerStartState]
 
-class lexState(object):
-	"""
-		Lexer state for deferred creation of a real lexer state.
-	"""
-	def __init__(self, tokens, omit = None, pushOn = None, popOn = None):
-		if omit is None:
-			omit = []
-		elif not isinstance(omit, list):
-			omit = [omit]
+		symbol = self.repeatedSymbol()
 
-		self.omit = omit
-		self.tokens = tokens
-		self.pushOn = pushOn
-		self.popOn = popOn
+		# Tokens of items that are not complete yet, with the lexer
+		# states after them.
+		pending = collections.deque()
+		boundary = (pos, tuple(lexerStates))
 
+		state = None
 
-class metaSymbol(type):
-	"""
-		Metaclass for enabling the BNF-like syntax for creation of symbols.
-	"""
-	def __call__(cls, *args, **kwargs):
-		if not cls == symbol or len(args) != 1 or len(kwargs) != 0:
-			return super(metaSymbol, cls).__call__(*args, **kwargs)
+		try:
+			state = parserRootState(symbol, tracer = tracer)
+			state.skipItems(dropped)
 
-		if isinstance(args[0], basestring):
-			return createSymbolFromBNF(args[0])
+			if tracer is not None:
+				tracer.parsingStarted(state)
 
-		sym = super(metaSymbol, cls).__call__(args[0])
-		sym.name = args[0]
-		return sym
+			for index, t in enumerate(self.iterlex(text, tracer, pos, lexerStates)):
+				pending.append((t, tuple(lexerStates)))
 
+				if tracer is not None:
+					tracer.tokenPushed(t, index)
 
-class symbol(object):
-	"""
-		Base class for any symbol in the grammar.
-	"""
-	__metaclass__ = metaSymbol
+				state.pushToken(t)
 
-	def __init__(self, merger, name):
-		self.merger = merger
-		if not name:
-			self.name = self.__class__.__name__
-		else:
-			self.name = name
+				if tracer is not None:
+					tracer.tokenProcessed(state)
 
-	def __copy__(self):
-		"""
-			Get a copy of this symbol.
-		"""
-		raise NotImplementedError
+				item = state.completedItem()
+				while item is not None:
+					boundary = self._itemEnd(item, pending, boundary)
+					yield (item.result(context),) + boundary
+					item = state.completedItem()
 
-	def __call__(self, fun):
-		"""
-			Add fun as merger if symbol has no merger.
+			for item in state.items():
+				boundary = self._itemEnd(item, pending, boundary)
+				yield (item.result(context),) + boundary
+		except RuntimeError as e:
+			if ("%s" % e)[:5] == "maxim":
+				raise InfiniteStateExpansion(state)
+			raise
+		finally:
+			if tracer is not None:
+				tracer.parseFinished()
 
-			Used for symbols as decorators for their mergers.
+	def _itemEnd(self, item, pending, boundary):
 		"""
-		if self.merger:
-			raise RuntimeError("Symbol already has a merger.")
+			Position and lexer states after the last token of item, 
+			boundary if it has none.
+		"""
+		last = item.lastToken()
 
-		if not callable(fun):
-			raise TypeError("Merger for symbol must be callable.")
+		if last is None:
+			return boundary
 
-		self.merger = fun
+		while True:
+			t, lexerStates = pending.popleft()
+			if t is last:
+				return (t.end, lexerStates)
 
-		return self
+	def session(self, context = None, stats = None, tracer = None):
+		"""
+			Start a parseSession, to parse a text that is fed to the 
+			parser in chunks. Arguments are the same as for parse.
+		"""
+		if context is None:
+			context = {}
+
+		return parseSession(self, context, self.getTracer(stats, tracer))
+
+	def parallelParse(self, text, context = None, processes = None, pool = None):
+		"""
+			Parse a text with a start symbol that repeats some item in 
+			a pool of processes and return the same result as parse.
+
+			The text is split into segments after matches of the 
+			syncTokens of the grammar. The items of every segment are 
+			parsed in one of the processes and put together in order. 
+			If a segment can't be parsed, e.g. because a sync token was
+			inside an item or another token, or the grammar, the context 
+			or the results can't be pickled, the text is parsed here with
+			parse instead.
+
+			processes : int - Number of processes to split the text for,
+							  the number of cpus if not given.
+			pool : multiprocessing.Pool - Use this pool instead of 
+										  starting one with processes.
+		"""
+		# Imported here, since it is slow to import and only needed 
+		# for this.
+		import multiprocessing
+
+		if context is None:
+			context = {}
+
+		if processes is None:
+			processes = multiprocessing.cpu_count()
+
+		sym = self.repeatedSymbol()
+
+		if processes < 2 or sym.From > 1 or sym.To != -1 or sym.bulkMerger or sym.symbols[0].bulkMerger:
+			return self.parse(text, context)
+
+		segments = self.segments(text, processes * 4)
+
+		if len(segments) < 2:
+			return self.parse(text, context)
+
+		try:
+			data = self.dumps()
+			pickle.dumps(context, 2)
+			tasks = [(data, text[start:end], context, end == len(text)) for start, end in segments]
+
+			if pool is None:
+				ownPool = multiprocessing.Pool(processes)
+				try:
+					parsed = ownPool.map(_parseSegment, tasks)
+				finally:
+					ownPool.terminate()
+			else:
+				parsed = pool.map(_parseSegment, tasks)
+		except Exception:
+			return self.parse(text, context)
+
+		if None in parsed:
+			return self.parse(text, context)
+
+		items = [item for segment in parsed for item in segment]
+
+		return self.wrapItems(items, context)
+
+	def segments(self, text, count):
+		"""
+			Split text into about count segments of the same length 
+			after matches of sync tokens, return a list of (start, end).
+
+			The text is only searched for the sync tokens, not lexed, so
+			a match could be inside another token or in another lexer 
+			state. segmentLexes tells if a segment is lexed like in the
+			whole text.
+		"""
+		syncTokens = self.getSyncTokens()
+
+		if not syncTokens or count < 2:
+			return [(0, len(text))]
+
+		size = len(text) / float(count)
+		segments = []
+		start = 0
+
+		while True:
+			ends = [m.end() for m in (t.regexp.search(text, int(start + size)) for t in syncTokens) if m]
+			if not ends or min(ends) >= len(text):
+				break
+
+			segments.append((start, min(ends)))
+			start = min(ends)
+
+		segments.append((start, len(text)))
+		return segments
+
+	def segmentLexes(self, text):
+		"""
+			Check weather text, starting in the start state of the 
+			lexer, is lexed to the same tokens whatever text follows it, 
+			and ends in the start state.
+		"""
+		states = [self.lexerStartState]
+		pos = 0
+
+		while pos < len(text):
+			step = self._lexAt(text, pos, states, None, False)
+			if step is None:
+				return False
+			pos = step[0].end
+
+		return states == [self.lexerStartState]
+
+	def getSyncTokens(self):
+		"""
+			The tokens named in syncTokens.
+		"""
+		definedSymbols = getattr(self, "definedSymbols", {})
+		return set(definedSymbols[t] if isinstance(t, basestring) else t for t in self.syncTokens)
+
+	def wrapItems(self, items, context):
+		"""
+			Build the result of the start symbol from the results of the
+			items of the repetition, like parse would.
+		"""
+		wrappers = []
+		sym = self.startSymbol
+
+		while isinstance(sym, chain) and len(sym.symbols) == 1:
+			wrappers.append(sym)
+			sym = sym.symbols[0]
+
+		result = items
+		if sym.merger:
+			result = sym.merger(result, **context)
+
+		for sym in reversed(wrappers):
+			result = [result]
+			if sym.merger:
+				result = sym.merger(result, **context)
+
+		return result
+
+	def repeatedSymbol(self):
+		"""
+			The repetition that is the start symbol, maybe wrapped in
+			chains of one symbol.
+		"""
+		sym = self.startSymbol
+
+		while isinstance(sym, chain) and len(sym.symbols) == 1:
+			sym = sym.symbols[0]
+
+		if not isinstance(sym, repeat):
+			raise TypeError("Start symbol %s is no repetition." % self.startSymbol.name)
+
+		return sym
+
+	def getTracer(self, *tracers):
+		"""
+			Combine the given tracers and the one for verbose output
+			to one tracer, None if there is no tracer at all.
+		"""
+		tracers = [t for t in tracers if t is not None]
+
+		if self.verbose:
+			tracers.insert(0, verboseTracer())
+
+		if len(tracers) == 0:
+			return None
+
+		if len(tracers) == 1:
+			return tracers[0]
+
+		return multiTracer(tracers)
+
+	def lex(self, text, tracer = None):
+		"""
+			Turn text to a list of token matches.
+		"""
+		if tracer is None:
+			tracer = self.getTracer()
+
+		if tracer is None:
+			lexer = getattr(self, "charClassLexers", {}).get(self.lexerStartState)
+			if lexer is not None and _numpy() is not None:
+				tokStream = lexer.lex(text)
+				if tokStream is not None:
+					return tokStream
+
+		tokStream = list(self.iterlex(text, tracer))
+
+		if tracer is not None:
+			tracer.lexingDone(tokStream)
+
+		return tokStream
+
+	def iterlex(self, text, tracer = None, pos = 0, states = None):
+		"""
+			Yield the token matches of text one by one.
+
+			pos : int - Position in text to start at.
+			states : list - Stack of lexer states to start with, it is
+							changed while lexing.
+		"""
+		if tracer is not None:
+			tracer.lexingStarted(text)
+
+		if states is None:
+			states = [self.lexerStartState]
+
+		while pos < len(text):
+			match, omitted = self._lexAt(text, pos, states, tracer)
+			pos = match.end
+
+			if not omitted:
+				yield match
+
+	def _lexAt(self, text, pos, states, tracer, final = True):
+		"""
+			Match the next token in text at pos and change the stack
+			of lexer states according to it. Returns the match and 
+			weather it is omitted.
+
+			If not final, more text could follow. Then None is returned 
+			if nothing matches or a token tried could have looked past 
+			the end of the text, since more text could change the match.
+		"""
+		if len(states) == 0:
+			states.append(self.lexerStartState)
+
+		current = states[-1]
+		table, keywords = self.lexerTables[current]
+
+		# Without the rest of the text, a match is only sure if no 
+		# token tried looked past its end.
+		looked = pos
+
+		# Check weather next chars should be omitted, otherwise
+		# they must be some token.
+		for omit, candidates in table:
+			for tok in candidates:
+				if tracer is not None:
+					for t in getattr(tok, "tokens", [tok]):
+						tracer.tokenTried(t, text, pos, omit)
+
+				match = tok.match(text, pos)
+
+				if not final:
+					looked = _most(looked, _lookedAt(tok, text, pos, match))
+
+				if not match:
+					continue
+
+				if not final and (looked is None or looked > len(text)):
+					return None
+
+				tok = match.token
+
+				if keywords and not omit and match.text in keywords:
+					tok = keywords[match.text]
+					match = tok.matchType(tok, match.text, match.text, match.start, match.end)
+
+				if current.popOn == tok:
+					states.pop()
+					if tracer is not None and states:
+						tracer.lexerPopped(states[-1], match.end)
+				if tok in self.pushStates:
+					states.append(self.pushStates[tok])
+					if tracer is not None:
+						tracer.lexerPushed(states[-1], match.end)
+
+				if tracer is not None and not omit:
+					tracer.tokenLexed(match)
+
+				return match, omit
+
+		if not final:
+			return None
+
+		# That surely is a problem...
+		raise LexerError(text, pos, current)
+
+	def adjustCodeOutput(self, text):
+		return _adjustCodeOutput(text)
+
+	def initLexerTables(self):
+		"""
+			Precompute which token pushes which lexer state, the 
+			literalTries or longestMatchers and keywords of every lexer
+			state and which lexer states could be lexed by 
+			charClassLexer.
+		"""
+		self.pushStates = {}
+
+		for state in self.lexerStates:
+			if state.pushOn:
+				if isinstance(state.pushOn, list):
+					for p in state.pushOn:
+						self.pushStates[p] = state
+				else:
+					self.pushStates[state.pushOn] = state
+
+		self.lexerTables = {}
+
+		for state in self.lexerStates:
+			keywords = {}
+			for tok in state.keywords:
+				literal = _literal(tok.origRegexp)
+				if literal is None:
+					raise ValueError("Keyword %s is no literal." % tok.name)
+				keywords.setdefault(literal, tok)
+
+			if getattr(state, "longestMatch", False):
+				table = ((True, [longestMatcher(state.omit)]), (False, [longestMatcher(state.tokens)]))
+			else:
+				table = ((True, literalTrie.group(state.omit)), (False, literalTrie.group(state.tokens)))
+			self.lexerTables[state] = (table, keywords)
+
+		self.charClassLexers = {}
+
+		if not _numpyInstalled():
+			return
+
+		for state in self.lexerStates:
+			lexer = charClassLexer.create(state, self.pushStates)
+			if lexer is not None:
+				self.charClassLexers[state] = lexer
+
+	def analyze(self):
+		"""
+			Look for shapes in the grammar that make the parser fail
+			or blow up and return a list of grammarIssues for them.
+
+			Errors are left recursion, which expands states to 
+			infinity, and repetitions of symbols that match the empty
+			text. Warnings are repetitions of unbounded repetitions
+			and oneOfs with more than one alternative that matches the
+			empty text, which both are ambigious, and symbols that are
+			not reachable from the start symbol. Alternatives of oneOfs
+			that start with the same token are listed as info, since
+			the parser has to follow both until one fails.
+		"""
+		symbols = []
+		labels = {}
+
+		def collect(sym, label):
+			if sym in labels or isinstance(sym, definedLater):
+				return
+			labels[sym] = label
+			symbols.append(sym)
+
+			subs = getattr(sym, "symbols", [])
+
+			for pos, sub in enumerate(subs):
+				if sub in named:
+					collect(sub, named[sub])
+				elif len(subs) > 1:
+					collect(sub, "%s #%d in %s" % (sub.name, pos + 1, label))
+				else:
+					collect(sub, "%s in %s" % (sub.name, label))
+
+		named = dict((sym, key) for key, sym in getattr(self, "definedSymbols", {}).viewitems())
+		named.setdefault(self.startSymbol, self.startSymbol.name)
+
+		collect(self.startSymbol, named[self.startSymbol])
+		reachable = set(symbols)
+
+		for sym, key in sorted(named.viewitems(), key = lambda i: i[1]):
+			collect(sym, key)
+
+		def unwrap(sym):
+			while isinstance(sym, chain) and len(sym.symbols) == 1:
+				sym = sym.symbols[0]
+			return sym
+
+		# Symbols that could match the empty text.
+		nullable = set()
+		changed = True
+
+		while changed:
+			changed = False
+
+			for sym in symbols:
+				if sym in nullable:
+					continue
+
+				if isinstance(sym, chain):
+					isNullable = all(s in nullable for s in sym.symbols)
+				elif isinstance(sym, oneOf):
+					isNullable = any(s in nullable for s in sym.symbols)
+				elif isinstance(sym, repeat):
+					isNullable = sym.From == 0 or sym.symbols[0] in nullable
+				else:
+					isNullable = False
+
+				if isNullable:
+					nullable.add(sym)
+					changed = True
+
+		# Symbols a symbol could start with, before any token.
+		left = {}
+
+		for sym in symbols:
+			left[sym] = []
+
+			if isinstance(sym, chain):
+				for s in sym.symbols:
+					left[sym].append(s)
+					if not s in nullable:
+						break
+			elif isinstance(sym, containsSymbols):
+				left[sym].extend(sym.symbols)
+
+			left[sym] = [s for s in left[sym] if s in labels]
+
+		def leftClosure(sym):
+			seen = set()
+			stack = [sym]
+			while stack:
+				for s in left[stack.pop()]:
+					if not s in seen:
+						seen.add(s)
+						stack.append(s)
+			return seen
+
+		closures = dict((sym, leftClosure(sym)) for sym in symbols)
+
+		def firstTokens(sym):
+			return set(s for s in closures[sym] | set([sym]) if isinstance(s, token))
+
+		issues = []
+
+		def names(syms):
+			namedOnes = [labels[s] for s in syms if s in named]
+			return namedOnes or [labels[s] for s in syms]
+
+		cycles = []
+
+		for sym in symbols:
+			if not sym in closures[sym]:
+				continue
+
+			cycle = set(s for s in closures[sym] if sym in closures[s])
+			if cycle in cycles:
+				continue
+			cycles.append(cycle)
+
+			cycle = [s for s in symbols if s in cycle]
+			issues.append(grammarIssue("leftRecursion", "error", names(cycle), 
+				"Left recursion, the states expand to infinity."))
+
+		for sym in symbols:
+			if isinstance(sym, repeat) and sym.symbols[0] in nullable and sym.To != 1:
+				issues.append(grammarIssue("nullableRepeat", "error", [labels[sym]], 
+					"Repeats %s, which matches the empty text." % labels[sym.symbols[0]]))
+
+			if isinstance(sym, repeat) and sym.To != 1:
+				inner = unwrap(sym.symbols[0])
+				if isinstance(inner, repeat) and inner.To != 1 and not inner in nullable:
+					issues.append(grammarIssue("nestedRepeat", "warning", [labels[sym]], 
+						"Repeats the repetition %s, the items are ambigious." % labels[inner]))
+
+			# The order decides between the alternatives of ordered
+			# oneOfs.
+			if isinstance(sym, oneOf) and not sym.ordered:
+				empty = [s for s in sym.symbols if s in nullable]
+				if len(empty) > 1:
+					issues.append(grammarIssue("ambigiousEmpty", "warning", [labels[sym]], 
+						"Alternatives %s all match the empty text." % ", ".join(labels[s] for s in empty)))
+
+				for i, a in enumerate(sym.symbols):
+					for b in sym.symbols[i + 1:]:
+						if not a in labels or not b in labels:
+							continue
+
+						common = firstTokens(a) & firstTokens(b)
+						if common:
+							issues.append(grammarIssue("overlappingOneOf", "info", [labels[sym]], 
+								"Alternatives %s and %s both start with %s." % (labels[a], labels[b], 
+								", ".join(sorted(t.name for t in common)))))
+
+		if named:
+			used = set()
+			for state in self.lexerStates:
+				used.update(state.omit)
+				if isinstance(state.pushOn, list):
+					used.update(state.pushOn)
+				elif state.pushOn is not None:
+					used.add(state.pushOn)
+				if state.popOn is not None:
+					used.add(state.popOn)
+
+			for sym, key in sorted(named.viewitems(), key = lambda i: i[1]):
+				if not sym in reachable and not sym in used:
+					issues.append(grammarIssue("unreachable", "warning", [key], 
+						"Not reachable from the start symbol."))
+
+		return issues
+
+	def reportIssues(self):
+		"""
+			Warn about the errors and warnings found by analyze, or
+			raise a GrammarError for them if the grammar is strict.
+		"""
+		issues = [i for i in self.issues if i.level != "info"]
+
+		if not issues:
+			return
+
+		if self.strict:
+			raise GrammarError(issues)
+
+		for issue in issues:
+			warnings.warn(GrammarWarning(str(issue)), stacklevel = 3)
+
+	def initLexerStates(self):
+		self.lexerStates = []
+
+		for key, item in ((i, getattr(self, i)) for i in dir(self)):
+			if not isinstance(item, lexState):
+				continue
+
+			omit = []
+
+			def getToken(name):
+				if not name in self.definedSymbols:
+					raise ValueError("Token %s not defined." % name)
+				t = self.definedSymbols[name]
+				if not isinstance(t, token):
+					raise ValueError("%s is no token." % name)
+				return t 
+
+			for o in item.omit:
+				omit.append(getToken(o))
+
+			tokens = []
+
+			for n in item.tokens:
+				tokens.append(getToken(n))
+
+			if item.pushOn:
+				if isinstance(item.pushOn, str):
+					pushOn = [getToken(item.pushOn)]
+				else:
+					pushOn = [getToken(p) for p in item.pushOn]
+			else:
+				pushOn = None
+
+			if item.popOn:
+				popOn = getToken(item.popOn)
+			else:
+				popOn = None
+
+			keywords = [getToken(k) for k in item.keywords]
+
+			l = lexerState(tokens, omit, pushOn, popOn, keywords, item.longestMatch)
+			l.name = key
+			self.lexerStates.append(l)
+
+			if key == "lexerStartState":
+				self.lexerStartState = l 
+
+		if not hasattr(self, "lexerStartState"):
+			raise TypeError("No lexerStartState defined.")
+			
+
+	def initSymbols(self):
+		self.definedSymbols = {}
+
+		for key, item in ((i, getattr(self, i)) for i in dir(self)):
+			if not isinstance(item, symbol):
+				continue
+
+			item = item.__copy__()
+			item.name = key
+
+			if key == "startSymbol":
+				self.startSymbol = item
+
+			self.definedSymbols[key] = item
+
+			for key2, item2 in self.definedSymbols.viewitems():
+				item2.define(key, item)
+				item.define(key2, item2)
+
+
+class lexerState(object):
+	"""
+		The tokens and omitted tokens the lexer tries at a position,
+		in order.
+
+		Contiguous literal tokens are matched at once, the longest of 
+		them wins. A lexeme of another token that equals the literal
+		of one of the keywords is lexed as that keyword instead.
+
+		With longestMatch, the longest match of all tokens wins, the
+		order only decides between equally long ones. Omitted tokens
+		are still tried first.
+	"""
+	def __init__(self, tokens, omit = None, pushOn = None, popOn = None, keywords = None, longestMatch = False):
+		if omit is None:
+			omit = []
+		elif not isinstance(omit, list):
+			omit = [omit]
+
+		self.omit = omit
+		self.keywords = keywords or []
+		self.longestMatch = longestMatch
+
+		self.tokens = []
+		
+		for t in tokens:
+			if isinstance(t, token):
+				self.tokens.append(t)
+			elif isinstance(t, lexerState):
+				self.tokens.extend(t.tokens)
+			else:
+				raise TypeError("lexerState: can only contain other tokens, not '%s'" % type(t))
+
+		#self.tokens.sort(key = lambda x: x.preference, reverse = True)
+
+		self.pushOn = pushOn
+		self.popOn = popOn
+
+		self.name = "lexerState"
+
+def _literal(regexp):
+	"""
+		The text regexp matches, if it only matches that text, None
+		otherwise.
+	"""
+	try:
+		parsed = sre_parse.parse(regexp)
+	except (sre_constants.error, ValueError):
+		return None
+
+	if parsed.pattern.flags & ~sre_parse.SRE_FLAG_UNICODE:
+		return None
+
+	char = unichr if isinstance(regexp, unicode) else chr
+	chars = []
+
+	for op, av in parsed:
+		if op == sre_constants.IN and len(av) == 1:
+			op, av = av[0]
+		if op != sre_constants.LITERAL or av > sys.maxunicode:
+			return None
+		if char is chr and av > 255:
+			return None
+		chars.append(char(av))
+
+	if not chars:
+		return None
+
+	return regexp[:0].join(chars)
+
+class literalTrie(object):
+	"""
+		Matches a group of literal tokens at once by walking a trie
+		of their characters. The longest literal wins, if two are
+		equal the first one.
+
+		Acts like a token to the lexer.
+	"""
+	@classmethod
+	def group(cls, tokens):
+		"""
+			Replace every run of two or more literal tokens in tokens
+			by a literalTrie. A run ends before a literal that starts 
+			with an earlier literal of the run, so the longest literal 
+			that matches is always the first one that matches.
+		"""
+		grouped = []
+		run = []
+
+		def flush():
+			if len(run) > 1:
+				grouped.append(cls(run))
+			else:
+				grouped.extend(run)
+			del run[:]
+
+		for tok in tokens:
+			literal = _literal(tok.origRegexp)
+			if literal is None:
+				flush()
+				grouped.append(tok)
+			else:
+				if any(literal != l and literal.startswith(l) for l in (_literal(t.origRegexp) for t in run)):
+					flush()
+				run.append(tok)
+
+		flush()
+		return grouped
+
+	def __init__(self, tokens):
+		self.tokens = list(tokens)
+
+		# A node is a dict of the next characters and the token that
+		# ends at the node.
+		self.root = [{}, None]
+
+		for tok in self.tokens:
+			node = self.root
+			for char in _literal(tok.origRegexp):
+				node = node[0].setdefault(char, [{}, None])
+			if node[1] is None:
+				node[1] = tok
+
+	def match(self, text, pos):
+		node = self.root
+		found = None
+		end = pos
+		length = len(text)
+
+		while end < length:
+			node = node[0].get(text[end])
+			if node is None:
+				break
+
+			end += 1
+
+			if node[1] is not None:
+				found = node[1], end
+
+		if found is None:
+			return None
+
+		tok, end = found
+		lexeme = text[pos:end]
+		return tok.matchType(tok, lexeme, lexeme, pos, end)
+
+_asciiChars = [chr(c) for c in range(128)]
+
+_categories = {
+	sre_constants.CATEGORY_DIGIT : lambda c: c.isdigit(),
+	sre_constants.CATEGORY_NOT_DIGIT : lambda c: not c.isdigit(),
+	sre_constants.CATEGORY_SPACE : lambda c: c in " \t\n\r\f\v",
+	sre_constants.CATEGORY_NOT_SPACE : lambda c: not c in " \t\n\r\f\v",
+	sre_constants.CATEGORY_WORD : lambda c: c.isalnum() or c == "_",
+	sre_constants.CATEGORY_NOT_WORD : lambda c: not (c.isalnum() or c == "_"),
+}
+
+def _firstChars(regexp):
+	"""
+		The ascii characters a match of regexp could start with and 
+		weather it could start with others, or None if that is not 
+		known. Could contain more characters than possible.
+	"""
+	try:
+		parsed = sre_parse.parse(regexp)
+	except (sre_constants.error, ValueError):
+		return None
+
+	first = _firstOfItems(list(parsed))
+	if first is None:
+		return None
+
+	chars, other, nullable = first
+
+	if parsed.pattern.flags & sre_parse.SRE_FLAG_IGNORECASE:
+		chars = chars | set(c.swapcase() for c in chars)
+
+	return chars, other
+
+def _firstOfItems(items):
+	"""
+		See _firstChars, for a sequence of parsed items. Also returns
+		weather the sequence could match the empty text.
+	"""
+	chars = set()
+	other = False
+
+	for op, av in items:
+		first = _firstOfItem(op, av)
+		if first is None:
+			return None
+
+		chars |= first[0]
+		other = other or first[1]
+
+		if not first[2]:
+			return chars, other, False
+
+	return chars, other, True
+
+def _firstOfItem(op, av):
+	if op == sre_constants.LITERAL:
+		if av < 128:
+			return set([chr(av)]), False, False
+		return set(), True, False
+
+	if op == sre_constants.NOT_LITERAL:
+		return set(c for c in _asciiChars if ord(c) != av), True, False
+
+	if op == sre_constants.ANY:
+		return set(_asciiChars), True, False
+
+	if op == sre_constants.IN:
+		def member(c):
+			for itemOp, itemAv in av:
+				if itemOp == sre_constants.LITERAL and ord(c) == itemAv:
+					return True
+				if itemOp == sre_constants.RANGE and itemAv[0] <= ord(c) <= itemAv[1]:
+					return True
+				if itemOp == sre_constants.CATEGORY and _categories.get(itemAv, lambda c: True)(c):
+					return True
+			return False
+
+		if av and av[0][0] == sre_constants.NEGATE:
+			return set(c for c in _asciiChars if not member(c)), True, False
+
+		other = any(itemOp == sre_constants.CATEGORY 
+					or (itemOp == sre_constants.LITERAL and itemAv >= 128)
+					or (itemOp == sre_constants.RANGE and itemAv[1] >= 128)
+					for itemOp, itemAv in av)
+
+		return set(c for c in _asciiChars if member(c)), other, False
+
+	if op == sre_constants.MAX_REPEAT or op == sre_constants.MIN_REPEAT:
+		first = _firstOfItems(list(av[2]))
+		if first is None:
+			return None
+		return first[0], first[1], first[2] or av[0] == 0
+
+	if op == sre_constants.SUBPATTERN:
+		return _firstOfItems(list(av[1]))
+
+	if op == sre_constants.BRANCH:
+		chars = set()
+		other = nullable = False
+
+		for items in av[1]:
+			first = _firstOfItems(list(items))
+			if first is None:
+				return None
+			chars |= first[0]
+			other = other or first[1]
+			nullable = nullable or first[2]
+
+		return chars, other, nullable
+
+	return None
+
+_reaches = {}
+
+def _regexpReach(regexp):
+	"""
+		How far around the text it matches regexp looks: the chars 
+		after the end of a match it could look at, the chars after 
+		the start it could look at when it doesn't match, the chars 
+		before the start it could look at and _firstChars. The first 
+		two are None if that is not bounded or not known.
+	"""
+	if regexp not in _reaches:
+		try:
+			parsed = sre_parse.parse(regexp)
+		except (sre_constants.error, ValueError):
+			_reaches[regexp] = None, None, 0, None
+		else:
+			pattern, items = parsed.pattern, list(parsed)
+			_reaches[regexp] = (_readsAfter(pattern, items, []), _readsFailing(pattern, items), 
+								_readsBefore(pattern, items), _firstChars(regexp))
+
+	return _reaches[regexp]
+
+def _widths(pattern, items):
+	lo, hi = sre_parse.SubPattern(pattern, items).getwidth()
+	if hi >= sre_constants.MAXREPEAT:
+		hi = None
+	return lo, hi
+
+def _plus(*counts):
+	if None in counts:
+		return None
+	return sum(counts)
+
+def _most(*counts):
+	if None in counts:
+		return None
+	return max(counts)
+
+_atStart = (sre_constants.AT_BEGINNING, sre_constants.AT_BEGINNING_STRING, sre_constants.AT_BEGINNING_LINE)
+_atBehind = (sre_constants.AT_BEGINNING_LINE, sre_constants.AT_BOUNDARY, sre_constants.AT_NON_BOUNDARY)
+
+def _readsAfter(pattern, items, after):
+	"""
+		The chars after the end of a match of items followed by after
+		the matcher could look at, or None.
+	"""
+	reads = [0]
+
+	for i, (op, av) in enumerate(items):
+		rest = items[i + 1:] + after
+		restMin = _widths(pattern, rest)[0]
+		lo, hi = _widths(pattern, [(op, av)])
+
+		if op in (sre_constants.LITERAL, sre_constants.NOT_LITERAL, sre_constants.ANY, sre_constants.IN):
+			continue
+
+		if op == sre_constants.AT:
+			if av not in _atStart:
+				# $ looks for a newline at the end too.
+				reads.append(2 - restMin)
+		elif op == sre_constants.SUBPATTERN:
+			reads.append(_readsAfter(pattern, list(av[-1]), rest))
+		elif op == sre_constants.BRANCH:
+			for branch in av[1]:
+				reads.append(_readsAfter(pattern, list(branch), rest))
+				# The branches tried before the one that matched.
+				reads.append(_plus(_readsFailing(pattern, list(branch)), -lo - restMin))
+			if _canFail(rest):
+				# The branches tried when the rest didn't match.
+				reads.append(_plus(hi, _readsFailing(pattern, rest), -lo - restMin))
+		elif op in (sre_constants.ASSERT, sre_constants.ASSERT_NOT):
+			direction, sub = av
+			if direction > 0:
+				sub = list(sub)
+				reads.append(_plus(_readsFailing(pattern, sub), -restMin))
+				reads.append(_plus(_widths(pattern, sub)[1], _readsAfter(pattern, sub, []), -restMin))
+		elif op == sre_constants.MAX_REPEAT:
+			least, most, sub = av
+			sub = list(sub)
+			reads.append(_readsAfter(pattern, sub, rest))
+			if most > least:
+				# The repetition tried after the last one.
+				reads.append(_plus(_readsFailing(pattern, sub), -restMin))
+			if lo != hi and _canFail(rest) and not _disjoint(pattern, sub, rest):
+				# Giving back repetitions when the rest didn't match.
+				reads.append(_plus(hi, _readsFailing(pattern, rest), -lo - restMin))
+		else:
+			return None
+
+		if None in reads:
+			return None
+
+	return max(reads)
+
+def _readsFailing(pattern, items):
+	"""
+		The chars after the start a match of items that fails could 
+		look at, or None.
+	"""
+	reads = [0]
+	start = 0
+
+	for i, (op, av) in enumerate(items):
+		if not _canFail(items[i:]):
+			break
+		if start is None:
+			return None
+
+		lo, hi = _widths(pattern, [(op, av)])
+
+		if op in (sre_constants.LITERAL, sre_constants.NOT_LITERAL, sre_constants.ANY, sre_constants.IN):
+			failing = 1
+		elif op == sre_constants.AT:
+			failing = 0 if av in _atStart else 2
+		elif op == sre_constants.SUBPATTERN:
+			failing = _readsFailing(pattern, list(av[-1]))
+		elif op == sre_constants.BRANCH:
+			failing = _most(*[_readsFailing(pattern, list(branch)) for branch in av[1]])
+		elif op in (sre_constants.ASSERT, sre_constants.ASSERT_NOT):
+			direction, sub = av
+			sub = list(sub)
+			failing = 0
+			if direction > 0:
+				failing = _most(_readsFailing(pattern, sub), 
+								_plus(_widths(pattern, sub)[1], _readsAfter(pattern, sub, [])))
+		elif op == sre_constants.MAX_REPEAT:
+			least, most, sub = av
+			sub = list(sub)
+			failing = 0
+			if least > 0:
+				# Fewer repetitions than needed matched.
+				failing = _readsFailing(pattern, sub)
+			if least > 1:
+				subMost = _widths(pattern, sub)[1]
+				failing = _plus(subMost and subMost * (least - 1), _most(failing, _readsAfter(pattern, sub, [])))
+		else:
+			return None
+
+		reads.append(_plus(start, failing))
+		if _canFail(items[i + 1:]):
+			# The item matched and an item after it failed.
+			reads.append(_plus(start, hi, _readsAfter(pattern, [(op, av)], [])))
+
+		if None in reads:
+			return None
+
+		start = _plus(start, hi)
+
+	return max(reads)
+
+def _readsBefore(pattern, items):
+	"""
+		The chars before the start of a match of items the matcher 
+		could look at.
+	"""
+	reads = 0
+
+	for op, av in items:
+		if op == sre_constants.AT and av in _atBehind:
+			reads = max(reads, 1)
+		elif op in (sre_constants.ASSERT, sre_constants.ASSERT_NOT):
+			direction, sub = av
+			if direction < 0:
+				reads = max(reads, _widths(pattern, list(sub))[1])
+			reads = max(reads, _readsBefore(pattern, list(sub)))
+		elif op == sre_constants.SUBPATTERN:
+			reads = max(reads, _readsBefore(pattern, list(av[-1])))
+		elif op == sre_constants.BRANCH:
+			for branch in av[1]:
+				reads = max(reads, _readsBefore(pattern, list(branch)))
+		elif op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT):
+			reads = max(reads, _readsBefore(pattern, list(av[2])))
+
+	return reads
+
+def _canFail(items):
+	"""
+		Weather a match of items could fail.
+	"""
+	for op, av in items:
+		if op == sre_constants.SUBPATTERN:
+			if _canFail(list(av[-1])):
+				return True
+		elif op == sre_constants.BRANCH:
+			if all(_canFail(list(branch)) for branch in av[1]):
+				return True
+		elif op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT):
+			if av[0] > 0 and _canFail(list(av[2])):
+				return True
+		else:
+			return True
+
+	return False
+
+def _disjoint(pattern, items, other):
+	"""
+		Weather matches of items and other surely start with different
+		chars.
+	"""
+	first, otherFirst = _firstOfItems(items), _firstOfItems(other)
+	if first is None or otherFirst is None or first[2] or otherFirst[2]:
+		return False
+	if pattern.flags & sre_parse.SRE_FLAG_IGNORECASE:
+		return False
+	return not (first[0] & otherFirst[0]) and not (first[1] and otherFirst[1])
+
+def _lookedAt(tok, text, pos, match):
+	"""
+		The position up to which trying tok at pos looked at text, 
+		given its match, or None if that isn't known. A group of tokens
+		looked as far as the furthest of its tokens.
+	"""
+	if hasattr(tok, "tokens"):
+		return _most(pos, *[_lookedAt(t, text, pos, t.match(text, pos)) for t in tok.tokens])
+
+	after, failing, before, first = _regexpReach(tok.origRegexp)
+
+	if match:
+		return _plus(match.end, after)
+
+	char = text[pos]
+	if first is not None and char not in first[0] and (ord(char) < 128 or not first[1]):
+		return pos + 1
+
+	return _plus(pos, failing)
+
+class longestMatcher(object):
+	"""
+		Matches the longest of a list of tokens, the first one if two
+		are equally long. Literals are matched with a literalTrie, the 
+		other tokens are only tried if they could start with the next
+		character of the text.
+
+		Acts like a token to the lexer.
+	"""
+	def __init__(self, tokens):
+		self.tokens = list(tokens)
+		self.order = dict((tok, pos) for pos, tok in reversed(list(enumerate(self.tokens))))
+
+		literals = [tok for tok in self.tokens if _literal(tok.origRegexp) is not None]
+		self.trie = literalTrie(literals) if literals else None
+
+		# Tokens to try per ascii character and for other characters.
+		self.dispatch = dict((c, []) for c in _asciiChars)
+		self.other = []
+
+		for tok in self.tokens:
+			if tok in literals:
+				continue
+
+			first = _firstChars(tok.origRegexp)
+
+			for c in _asciiChars:
+				if first is None or c in first[0]:
+					self.dispatch[c].append(tok)
+
+			if first is None or first[1]:
+				self.other.append(tok)
+
+	def match(self, text, pos):
+		best = None
+
+		if self.trie is not None:
+			best = self.trie.match(text, pos)
+
+		for tok in self.dispatch.get(text[pos], self.other):
+			match = tok.match(text, pos)
+
+			if not match:
+				continue
+
+			if best is None or match.end > best.end or (match.end == best.end and self.order[tok] < self.order[best.token]):
+				best = match
+
+		return best
+
+class charClassLexer(object):
+	"""
+		Lexes a text in one lexer state with numpy at once, if all
+		tokens of the state match a single character of a class, or a
+		run of such characters, and no character is in two classes.
+
+		Every character of the text is looked up in a table of the
+		class it belongs to, tokens start where the class changes
+		and at every character of a class of single characters.
+	"""
+	@classmethod
+	def create(cls, state, pushStates):
+		"""
+			Return a charClassLexer for state or None if the tokens
+			don't fit.
+		"""
+		if state.popOn is not None or state.keywords:
+			return None
+
+		tokens = state.omit + state.tokens
+		runs = []
+
+		for tok in tokens:
+			if tok in pushStates:
+				return None
+
+			run = cls.shape(tok.origRegexp)
+			if run is None:
+				return None
+			runs.append(run)
+
+		lexer = cls(state, tokens, runs)
+
+		for codes in (lexer.members(str), lexer.members(unicode)):
+			seen = set()
+			for c in codes:
+				if c & seen:
+					return None
+				seen |= c
+
+		return lexer
+
+	@staticmethod
+	def shape(regexp):
+		"""
+			True if regexp matches a run of characters of a class,
+			False if it matches one character of it, None otherwise.
+		"""
+		try:
+			parsed = list(sre_parse.parse(regexp))
+		except (sre_constants.error, ValueError):
+			return None
+
+		single = (sre_constants.LITERAL, sre_constants.NOT_LITERAL, sre_constants.IN, sre_constants.ANY)
+
+		if len(parsed) != 1:
+			return None
+
+		op, av = parsed[0]
+
+		if op in single:
+			return False
+
+		if op == sre_constants.MAX_REPEAT and av[0] == 1 and av[1] == sre_constants.MAXREPEAT:
+			if len(av[2]) == 1 and av[2][0][0] in single:
+				return True
+
+		return None
+
+	def __init__(self, state, tokens, runs):
+		self.state = state
+		self.tokens = tokens
+		self.runs = runs
+		self.omitted = len(state.omit)
+
+		# Lookup tables per type of text, built on first use.
+		self._tables = {}
+
+	def __getstate__(self):
+		state = dict(self.__dict__)
+		state["_tables"] = {}
+		return state
+
+	def members(self, textType):
+		"""
+			Codes below 256 of the characters every token matches.
+		"""
+		char = chr if textType is str else unichr
+		return [set(c for c in range(256) if tok.regexp.match(char(c))) for tok in self.tokens]
+
+	def tables(self, textType):
+		"""
+			Class of every character code below 256, 0 for none and
+			the index of the token + 1 otherwise, and for every class
+			whether a token starts at each of its characters.
+		"""
+		if not textType in self._tables:
+			numpy = _numpy()
+			classes = numpy.zeros(256, dtype = numpy.int32)
+			for index, codes in enumerate(self.members(textType)):
+				classes[list(codes)] = index + 1
+
+			single = numpy.array([True] + [not run for run in self.runs])
+			self._tables[textType] = (classes, single)
+
+		return self._tables[textType]
+
+	def lex(self, text):
+		"""
+			Return the token matches of text, None if text contains
+			characters the tables don't know.
+		"""
+		numpy = _numpy()
+
+		if isinstance(text, unicode):
+			codes = numpy.frombuffer(text.encode("utf-32-le"), dtype = "<u4")
+			if len(codes) and codes.max() > 255:
+				return None
+			classes, single = self.tables(unicode)
+		else:
+			codes = numpy.frombuffer(text, dtype = numpy.uint8)
+			classes, single = self.tables(str)
+
+		if len(codes) == 0:
+			return []
+
+		kinds = classes[codes]
+
+		unknown = numpy.flatnonzero(kinds == 0)
+		if len(unknown):
+			raise LexerError(text, int(unknown[0]), self.state)
+
+		starts = numpy.empty(len(kinds), dtype = bool)
+		starts[0] = True
+		numpy.not_equal(kinds[1:], kinds[:-1], starts[1:])
+		starts |= single[kinds]
+
+		starts = numpy.flatnonzero(starts)
+		ends = numpy.append(starts[1:], len(kinds))
+		kinds = kinds[starts]
+
+		# Drop omitted tokens.
+		keep = kinds > self.omitted
+
+		tokens = self.tokens
+		matches = []
+
+		for start, end, kind in zip(starts[keep].tolist(), ends[keep].tolist(), kinds[keep].tolist()):
+			tok = tokens[kind - 1]
+			lexeme = text[start:end]
+			matches.append(tok.matchType(tok, lexeme, lexeme, start, end))
+
+		return matches
+
+class lexState(object):
+	"""
+		Lexer state for deferred creation of a real lexer state.
+	"""
+	def __init__(self, tokens, omit = None, pushOn = None, popOn = None, keywords = None, longestMatch = False):
+		if omit is None:
+			omit = []
+		elif not isinstance(omit, list):
+			omit = [omit]
+
+		self.omit = omit
+		self.tokens = tokens
+		self.pushOn = pushOn
+		self.popOn = popOn
+		self.keywords = keywords or []
+		self.longestMatch = longestMatch
+
+
+class metaSymbol(type):
+	"""
+		Metaclass for enabling the BNF-like syntax for creation of symbols.
+	"""
+	def __call__(cls, *args, **kwargs):
+		if not cls == symbol or len(args) != 1 or len(kwargs) != 0:
+			return super(metaSymbol, cls).__call__(*args, **kwargs)
+
+		if isinstance(args[0], basestring):
+			return createSymbolFromBNF(args[0])
+
+		sym = super(metaSymbol, cls).__call__(args[0])
+		sym.name = args[0]
+		return sym
+
+
+class symbol(object):
+	"""
+		Base class for any symbol in the grammar.
+	"""
+	__metaclass__ = metaSymbol
+
+	# Merger for all items of a repetition at once, see repeat.
+	bulkMerger = None
+
+	def __init__(self, merger, name):
+		self.merger = merger
+		if not name:
+			self.name = self.__class__.__name__
+		else:
+			self.name = name
+
+	def __copy__(self):
+		"""
+			Get a copy of this symbol.
+		"""
+		raise NotImplementedError
+
+	def __call__(self, fun):
+		"""
+			Add fun as merger if symbol has no merger.
+
+			Used for symbols as decorators for their mergers.
+		"""
+		if self.merger:
+			raise RuntimeError("Symbol already has a merger.")
+
+		if not callable(fun):
+			raise TypeError("Merger for symbol must be callable.")
+
+		self.merger = fun
+
+		return self
+
+	def getState(self, parent = None, tracer = None, indent = 0):
+		"""
+			Get a stateful representation of this symbol.
+		"""
+		return self.stateType(self, parent = parent, tracer = tracer, indent = indent)
+
+	def getTokens(self, gottenFrom = None):
+		"""
+			Get a list of all subTokens.
+
+			Leave 'gottenFrom' empty, it is there for not running 
+			into infinit recursion in recursive symbols.
+
+			This just encapsulates that mechanism and then calls
+			__getToken__, which should just pass on gottenFrom to
+			sub-symbols and return a list of all tokens.
+		"""
+		if gottenFrom is None:
+			gottenFrom = []
+
+		if self in gottenFrom:
+			return []
+
+		gottenFrom.append(self)
+
+		return self.__getTokens__(gottenFrom)
+
+	def __getTokens__(self, gottenFrom):
+		"""
+			Return a list of tokens within this symbol. Pass on
+			gottenFrom to calls to getTokens from sub-symbols.
+		"""
+		raise NotImplementedError
+
+	def define(self, name, symbol, definedIn = None):
+		"""
+			Define a sub-symbol which is not defined by now.
+
+			Uses a similar mechanism than getTokens to not run
+			into infinite recursion.
+
+			Calls __define__ which has to be reimplemented.
+		"""
+		if definedIn is None:
+			definedIn = []
+
+		if self in definedIn:
+			return
+
+		definedIn.append(self)
+
+		return self.__define__(name, symbol, definedIn)
+
+	def __define__(self, name, symbol, definedIn):
+		"""
+			Define an undefined symbol. Pass on defined in
+			to calls to define from sub-symbols.
+		"""
+		raise NotImplementedError
+
+	def __rshift__(self, other):
+		"""
+			Use as symbol >> symbol to create a chain of two or more
+			symbols.
+		"""
+		return chain([self, other])
+
+class definedLater(symbol):
+	def __init__(self, name):
+		self.name = name
+
+	def getState(self, *args, **kwargs):
+		raise RuntimeError("%s not defined." % self.name)
+
+	def __copy__(self):
+		return definedLater(self.name)
+
+	def __define__(self, name, symbol, definedIn):
+		return
+
+	def __getTokens__(self, gottenFrom):
+		raise NotImplementedError("Undefined symbol: %s" % self.name)
+
+class containsSymbols(symbol):
+	def __getTokens__(self, gottenFrom):
+		tokens = []
+
+		for r in self.symbols:
+			tokens.extend(r.getTokens(gottenFrom))
+
+		return tokens
+
+	def __define__(self, name, symbol, definedIn):
+		for r in [i for i in self.symbols]:
+			if isinstance(r, definedLater) and r.name == name:
+				self.symbols[self.symbols.index(r)] = symbol 
+			else:
+				r.define(name, symbol, definedIn)
+
+
+class tracer(object):
+	"""
+		Receives the events of lexing and parsing.
+
+		Pass an instance as tracer to grammar.parse. This class
+		ignores all events, subclasses override the ones they are
+		interested in. When no tracer is installed, lexer and parser
+		don't spend any time on tracing.
+	"""
+	# Names of all events.
+	events = ("lexingStarted", "tokenTried", "lexerPushed", "lexerPopped",
+			  "tokenLexed", "lexingDone", "parsingStarted", "tokenPushed",
+			  "tokenProcessed", "stateSpawned", "stateValid", "stateInvalid",
+			  "stateForked", "merged", "resultBuilt", "phaseDone",
+			  "parseFinished")
+
+	def lexingStarted(self, text):
+		pass
+
+	def tokenTried(self, token, text, pos, omit):
+		"""
+			The lexer tries to match token at pos, omit tells 
+			weather the token would be omitted.
+		"""
+		pass
+
+	def lexerPushed(self, lexerState, pos):
+		pass
+
+	def lexerPopped(self, lexerState, pos):
+		"""
+			lexerState is the state that is current after the pop.
+		"""
+		pass
+
+	def tokenLexed(self, match):
+		pass
+
+	def lexingDone(self, tokens):
+		pass
+
+	def parsingStarted(self, root):
+		pass
+
+	def tokenPushed(self, match, index):
+		"""
+			The parser is about to process the index'th token.
+		"""
+		pass
+
+	def tokenProcessed(self, root):
+		"""
+			The parser has processed a token.
+		"""
+		pass
+
+	def stateSpawned(self, state):
+		pass
+
+	def stateValid(self, state):
+		"""
+			A state is about to be reported as valid to its parent.
+		"""
+		pass
+
+	def stateInvalid(self, state):
+		"""
+			A state is about to be reported as invalid to its parent.
+		"""
+		pass
+
+	def stateForked(self, state, copy):
+		pass
+
+	def merged(self, state, seconds):
+		"""
+			The merger of the symbol of state was called.
+		"""
+		pass
 
-	def getState(self, parent = None, verbose = False, indent = 0):
+	def resultBuilt(self, result):
+		pass
+
+	def phaseDone(self, phase, seconds):
 		"""
-			Get a stateful representation of this symbol.
+			Phase is one of "lex", "parse" or "result".
 		"""
-		return self.stateType(self, parent = parent, verbose = verbose, indent = indent)
+		pass
 
-	def getTokens(self, gottenFrom = None):
+	def parseFinished(self):
 		"""
-			Get a list of all subTokens.
+			The parse is over, successful or not.
+		"""
+		pass
 
-			Leave 'gottenFrom' empty, it is there for not running 
-			into infinit recursion in recursive symbols.
+class multiTracer(tracer):
+	"""
+		Pass events to some tracers.
+	"""
+	def __init__(self, tracers):
+		self.tracers = tracers
 
-			This just encapsulates that mechanism and then calls
-			__getToken__, which should just pass on gottenFrom to
-			sub-symbols and return a list of all tokens.
+def _forwardEvent(name):
+	def forward(self, *args):
+		for t in self.tracers:
+			getattr(t, name)(*args)
+	forward.__name__ = name
+	return forward
+
+for _name in tracer.events:
+	setattr(multiTracer, _name, _forwardEvent(_name))
+
+del _name
+
+class verboseTracer(tracer):
+	"""
+		Prints a human readable description of lexing and parsing.
+
+		This is what you get with grammar(verbose = True).
+	"""
+	# Characters of the remaining text shown while lexing.
+	textWidth = 80
+
+	def __init__(self, out = None):
+		self.out = out or sys.stdout
+		self.pos = None
+		self.token = None
+		self.path = []
+
+	def write(self, line = ""):
+		self.out.write(line + "\n")
+
+	def lexingStarted(self, text):
+		self.pos = None
+		self.write("\n == Start lexing. == \n")
+
+	def tokenTried(self, token, text, pos, omit):
+		if pos != self.pos:
+			self.pos = pos
+			self.write("\nRemaining Text starts at: '%s'" % _adjustCodeOutput(text, pos, self.textWidth))
+
+		self.write("%s: %s" % ("Omit" if omit else "Checking", token.name))
+
+	def lexerPushed(self, lexerState, pos):
+		self.write("Pushed state, new state is %s" % lexerState.name)
+
+	def lexerPopped(self, lexerState, pos):
+		self.write("Popped state, new state is %s" % lexerState.name)
+
+	def tokenLexed(self, match):
+		self.write("-----> Found from position %d to %d: %s" % (match.start, match.end, match.result))
+
+	def lexingDone(self, tokens):
+		self.write("\n")
+		self.write("---> %d tokens found." % len(tokens))
+		self.write("\n")
+
+	def parsingStarted(self, root):
+		self.write("\n== Start parsing. == \n")
+
+	def tokenPushed(self, match, index):
+		self.token = match
+		self.path = []
+		self.write("\n\n\n--> Push result from token %s at position %d: %s" % (match.token.name, index + 1, match.result))
+
+	def checked(self, state, success):
+		# Print the chains we went through to reach state, as far
+		# as they were not printed for the state checked before.
+		path = []
+		parent = state.parent
+		while parent is not None and parent.parent is not None:
+			path.insert(0, parent)
+			parent = parent.parent
+
+		same = 0
+		while same < min(len(path), len(self.path)) and path[same] is self.path[same]:
+			same += 1
+
+		for p in path[same:]:
+			self.write("%sIn %s:" % (p.indentation(), p.symbol.name))
+
+		self.path = path
+
+		self.write("%s%s: Checking %s --> %s" % (state.indentation(), state.symbol.name, self.token.text.replace("\n", "\\n"), "success" if success else "fail"))
+
+	def stateValid(self, state):
+		if isinstance(state, token.stateType):
+			self.checked(state, True)
+
+		parent = state.parent
+
+		if isinstance(parent, oneOf.stateType):
+			self.write("%s%s: Option %s found" % (parent.indentation(), parent.symbol.name, state.symbol.name))
+		elif isinstance(parent, repeat.stateType):
+			self.write("%s%s: Valid symbol %s found for the %d'th time." % (parent.indentation(), parent.symbol.name, parent.symbol.symbols[0].name, len(parent.results[state]) + 1))
+		elif isinstance(parent, chain.stateType):
+			position = parent.currentPositions[state]
+			self.write("%s%s: Valid subsymbol %s at position %d found" % (parent.indentation(), parent.symbol.name, parent.symbol.symbols[position].name, position))
+
+	def stateInvalid(self, state):
+		if isinstance(state, token.stateType):
+			self.checked(state, False)
+
+class binaryTracer(tracer):
+	"""
+		Writes the events of a parse to a compact binary file, read
+		it with readTrace.
+
+		States are numbered in the order they were spawned, symbols,
+		tokens and lexer states are written as names once and 
+		referenced by number afterwards. The trace does not contain
+		the attempts of the lexer and the timings of the phases.
+	"""
+	# Version of the format.
+	formatVersion = 1
+
+	magic = "PRST"
+
+	# Record types with the layout of their fields.
+	records = {
+		"name"		: (0, "<I"),	# number, followed by the name
+		"spawned"	: (1, "<III"),	# state, parent, symbol
+		"valid"		: (2, "<I"),	# state
+		"invalid"	: (3, "<I"),	# state
+		"forked"	: (4, "<II"),	# state, copy
+		"token"		: (5, "<IIII"),	# index, token, start, end
+		"pushed"	: (6, "<II"),	# lexer state, position
+		"popped"	: (7, "<II"),	# lexer state, position
+		"merged"	: (8, "<Id"),	# state, seconds
+		}
+
+	def __init__(self, out):
 		"""
-		if gottenFrom is None:
-			gottenFrom = []
+			out : file - open for writing in binary mode.
+		"""
+		self.out = out
+		self.names = {}
+		self.states = 0
 
-		if self in gottenFrom:
-			return []
+		self.packers = {}
+		for kind, (code, layout) in self.records.items():
+			self.packers[kind] = (chr(code), struct.Struct(layout).pack)
 
-		gottenFrom.append(self)
+		out.write(self.magic + chr(self.formatVersion))
 
-		return self.__getTokens__(gottenFrom)
+	def record(self, kind, *fields):
+		code, pack = self.packers[kind]
+		self.out.write(code + pack(*fields))
 
-	def __getTokens__(self, gottenFrom):
+	def nameId(self, name):
+		try:
+			return self.names[name]
+		except KeyError:
+			number = len(self.names) + 1
+			self.names[name] = number
+			if isinstance(name, unicode):
+				name = name.encode("utf-8")
+			self.record("name", number)
+			self.out.write(struct.pack("<H", len(name)) + name)
+			return number
+
+	def stateId(self, state):
+		return getattr(state, "_traceId", 0)
+
+	def stateSpawned(self, state):
+		self.states += 1
+		state._traceId = self.states
+		self.record("spawned", self.states, self.stateId(state.parent), self.nameId(state.symbol.name))
+
+	def stateValid(self, state):
+		self.record("valid", self.stateId(state))
+
+	def stateInvalid(self, state):
+		self.record("invalid", self.stateId(state))
+
+	def stateForked(self, state, copy):
+		self.record("forked", self.stateId(state), self.stateId(copy))
+
+	def tokenPushed(self, match, index):
+		self.record("token", index, self.nameId(match.token.name), match.start, match.end)
+
+	def lexerPushed(self, lexerState, pos):
+		self.record("pushed", self.nameId(lexerState.name), pos)
+
+	def lexerPopped(self, lexerState, pos):
+		self.record("popped", self.nameId(lexerState.name), pos)
+
+	def merged(self, state, seconds):
+		self.record("merged", self.stateId(state), seconds)
+
+def readTrace(file):
+	"""
+		Read a file written by binaryTracer.
+
+		Yields tuples with the kind of the record first and the
+		fields from binaryTracer.records afterwards, where symbols, 
+		tokens and lexer states are replaced by their names.
+	"""
+	if file.read(len(binaryTracer.magic)) != binaryTracer.magic:
+		raise ValueError("No trace file.")
+
+	version = ord(file.read(1))
+	if version != binaryTracer.formatVersion:
+		raise ValueError("Can't read traces in format %d." % version)
+
+	layouts = {}
+	for kind, (code, layout) in binaryTracer.records.items():
+		layouts[chr(code)] = (kind, struct.Struct(layout))
+
+	names = {0 : None}
+	# Fields that are references to names.
+	named = { "spawned" : (2,), "token" : (1,), "pushed" : (0,), "popped" : (0,) }
+
+	while True:
+		code = file.read(1)
+		if not code:
+			return
+
+		kind, layout = layouts[code]
+		fields = layout.unpack(file.read(layout.size))
+
+		if kind == "name":
+			length = struct.unpack("<H", file.read(2))[0]
+			names[fields[0]] = file.read(length)
+			continue
+
+		if kind in named:
+			fields = list(fields)
+			for i in named[kind]:
+				fields[i] = names[fields[i]]
+
+		yield (kind,) + tuple(fields)
+
+class parseStats(tracer):
+	"""
+		Statistics about a parse, pass an instance as stats or tracer
+		to grammar.parse to fill it.
+
+		Has attributes
+			tokens - number of tokens pushed to the parser,
+			liveStates - number of possible interpretations (leafs
+						 of the tree of states) after every token,
+			peakTreeSize - maximum number of live states in the tree,
+			created, forked, invalidated - dicts from symbol names to
+						 the number of states of that symbol that were
+						 created, forked or made invalid,
+			mergerCalls, mergerTime - dicts from symbol names to the 
+						 number of calls and seconds spent in their
+						 merger,
+			lexTime, parseTime, resultTime - seconds spent in lexing,
+						 parsing and building the results, including
+						 mergers.
+
+		Anonymous symbols are named after their type, use byType
+		to sum up the counts per type of symbol.
+	"""
+	def __init__(self):
+		self.tokens = 0
+		self.liveStates = []
+		self.peakTreeSize = 0
+		self.created = {}
+		self.forked = {}
+		self.invalidated = {}
+		self.mergerCalls = {}
+		self.mergerTime = {}
+		self.lexTime = 0.0
+		self.parseTime = 0.0
+		self.resultTime = 0.0
+
+		# Symbol names to the names of their types.
+		self.symbolTypes = {}
+
+	def count(self, table, state):
+		name = state.symbol.name
+		table[name] = table.get(name, 0) + 1
+		self.symbolTypes[name] = state.symbol.__class__.__name__
+
+	def stateSpawned(self, state):
+		self.count(self.created, state)
+
+	def stateForked(self, state, copy):
+		self.count(self.forked, state)
+
+	def stateInvalid(self, state):
+		self.count(self.invalidated, state)
+
+	def merged(self, state, seconds):
+		self.count(self.mergerCalls, state)
+		name = state.symbol.name
+		self.mergerTime[name] = self.mergerTime.get(name, 0.0) + seconds
+
+	def phaseDone(self, phase, seconds):
+		setattr(self, phase + "Time", getattr(self, phase + "Time") + seconds)
+
+	def tokenProcessed(self, root):
 		"""
-			Return a list of tokens within this symbol. Pass on
-			gottenFrom to calls to getTokens from sub-symbols.
+			Measure the tree of states after a token was pushed.
 		"""
-		raise NotImplementedError
+		self.tokens += 1
 
-	def define(self, name, symbol, definedIn = None):
+		size = 0
+		leafs = 0
+		stack = list(root._possibilities)
+
+		while stack:
+			state = stack.pop()
+			size += 1
+			if len(state._possibilities) == 0:
+				leafs += 1
+			else:
+				stack.extend(state._possibilities)
+
+		self.liveStates.append(leafs)
+		self.peakTreeSize = max(self.peakTreeSize, size)
+
+	def byType(self, table):
 		"""
-			Define a sub-symbol which is not defined by now.
+			Sum up one of the dicts above per type of symbol.
+		"""
+		res = {}
+		for name, value in table.items():
+			t = self.symbolTypes.get(name, name)
+			res[t] = res.get(t, 0) + value
+		return res
 
-			Uses a similar mechanism than getTokens to not run
-			into infinite recursion.
+	def __str__(self):
+		lines = [
+			"%d tokens, at most %d live possibilities, at most %d live states." % (self.tokens, max(self.liveStates or [0]), self.peakTreeSize),
+			"Lexing %.4fs, parsing %.4fs, results %.4fs." % (self.lexTime, self.parseTime, self.resultTime),
+			"States per symbol (created/forked/invalid):"]
 
-			Calls __define__ which has to be reimplemented.
+		for name, count in sorted(self.created.items(), key = lambda i: -i[1]):
+			lines.append("    %s: %d/%d/%d" % (name, count, self.forked.get(name, 0), self.invalidated.get(name, 0)))
+
+		lines.append("Mergers (calls/seconds):")
+
+		for name, seconds in sorted(self.mergerTime.items(), key = lambda i: -i[1]):
+			lines.append("    %s: %d/%.4f" % (name, self.mergerCalls[name], seconds))
+
+		return "\n".join(lines)
+
+class parseMemory(tracer):
+	"""
+		Memory used by a parse, pass an instance as tracer to 
+		grammar.parse to fill it.
+
+		Has attributes
+			inputBytes - length of the parsed text,
+			tokenBytes - bytes used by the token stream,
+			treeBytes - peak of the bytes used by the tree of states,
+			resultBytes - bytes used by the result,
+			peakBytes - peak of the bytes used by the parse,
+			method - "tracemalloc" or "estimate".
+
+		Uses tracemalloc where it is available. Otherwise the sizes
+		are estimated by walking the objects with sys.getsizeof, 
+		without the objects of the grammar. The tree is then measured
+		after every every'th token, which makes the parse quadratic,
+		and peakBytes is the sum of the other sizes.
+	"""
+	def __init__(self, every = 1, useTracemalloc = True):
+		self.every = every
+		self.method = "tracemalloc" if useTracemalloc and tracemalloc else "estimate"
+
+		self.inputBytes = 0
+		self.tokenBytes = 0
+		self.treeBytes = 0
+		self.resultBytes = 0
+		self.peakBytes = 0
+
+		self._started = False
+		self._tokens = None
+		self._lexed = None
+		self._processed = 0
+		self._root = None
+
+	def traced(self):
 		"""
-		if definedIn is None:
-			definedIn = []
+			Current and peak traced memory.
+		"""
+		return tracemalloc.get_traced_memory()
+
+	def lexingStarted(self, text):
+		self.inputBytes = len(text)
+
+		if self.method == "tracemalloc":
+			if not tracemalloc.is_tracing():
+				tracemalloc.start()
+				self._started = True
+			self._base = self.traced()[0]
+
+	def lexingDone(self, tokens):
+		if self.method == "estimate":
+			# Keep the tokens, so the ids in _tokens are not reused.
+			self._lexed = tokens
+			self._tokens = set()
+			self.tokenBytes = _deepSize(tokens, self._tokens)
+			return
 
-		if self in definedIn:
+		self._afterLex = self.traced()[0]
+		self.tokenBytes = self._afterLex - self._base
+		if hasattr(tracemalloc, "reset_peak"):
+			tracemalloc.reset_peak()
+
+	def parsingStarted(self, root):
+		self._root = root
+
+	def tokenProcessed(self, root):
+		self._processed += 1
+		if self.method == "estimate" and self._processed % self.every == 0:
+			self.measureTree()
+
+	def measureTree(self):
+		self.treeBytes = max(self.treeBytes, _deepSize(self._root, set(), self._tokens))
+		self.peakBytes = self.tokenBytes + self.treeBytes
+
+	def phaseDone(self, phase, seconds):
+		if self.method == "estimate":
+			if phase == "parse" and self._root is not None:
+				self.measureTree()
+		else:
+			current, peak = self.traced()
+			if phase == "parse":
+				self._afterParse = current
+				self.treeBytes = max(0, peak - self._afterLex)
+			self.peakBytes = max(0, peak - self._base)
+
+	def resultBuilt(self, result):
+		if self.method == "estimate":
+			self.resultBytes = _deepSize(result, set(), self._tokens)
+			self.peakBytes += self.resultBytes
+		else:
+			self.resultBytes = max(0, self.traced()[0] - self._afterParse)
+
+	def parseFinished(self):
+		self._root = None
+		self._lexed = None
+
+		if self._started:
+			tracemalloc.stop()
+			self._started = False
+
+	def perInputByte(self):
+		"""
+			Peak bytes per byte of input.
+		"""
+		if self.inputBytes == 0:
+			return 0.0
+		return float(self.peakBytes) / self.inputBytes
+
+	def __str__(self):
+		return "%d bytes of input, peak %d bytes (%.1f per byte of input): tokens %d, states %d, results %d (%s)." % (
+					self.inputBytes, self.peakBytes, self.perInputByte(), self.tokenBytes, 
+					self.treeBytes, self.resultBytes, self.method)
+
+class _pieces(object):
+	"""
+		A text or list made of slices of other texts or lists, which 
+		are shared instead of copied, for incrementalParse. Slices of 
+		checkpoints have a shift that is added to the positions when 
+		they are read. Short neighbouring slices are copied into one,
+		so there are at most about two slices per long one.
+
+		slices : list - (source, start, end, shift) of every slice.
+		empty : str or list - Empty text or list of the same type.
+	"""
+	# Neighbouring slices shorter than this are copied into one.
+	short = 256
+
+	def __init__(self, slices, empty):
+		self.empty = empty
+		self.slices = []
+		self.starts = []
+		self.length = 0
+		self.joined = None
+
+		for piece in slices:
+			if piece[2] <= piece[1]:
+				continue
+
+			last = self.slices[-1] if self.slices else None
+			if last is not None and last[2] - last[1] < self.short and piece[2] - piece[1] < self.short:
+				merged = self.read(last) + self.read(piece)
+				self.slices[-1] = (merged, 0, len(merged), 0)
+			else:
+				self.slices.append(piece)
+				self.starts.append(self.length)
+
+			self.length += piece[2] - piece[1]
+
+	def __len__(self):
+		return self.length
+
+	def __getitem__(self, index):
+		number = bisect.bisect_right(self.starts, index) - 1
+		source, start, end, shift = self.slices[number]
+		item = source[start + index - self.starts[number]]
+
+		if shift:
+			return (item[0] + shift,) + item[1:]
+		return item
+
+	def read(self, piece):
+		source, start, end, shift = piece
+
+		if shift:
+			return [(item[0] + shift,) + item[1:] for item in source[start:end]]
+		return source[start:end]
+
+	def cut(self, start, end, shift = 0):
+		"""
+			The slices of the part from start to end, with shift added.
+		"""
+		cut = []
+		number = max(0, bisect.bisect_right(self.starts, start) - 1)
+
+		while number < len(self.slices) and self.starts[number] < end:
+			source, sliceStart, sliceEnd, sliceShift = self.slices[number]
+			offset = sliceStart - self.starts[number]
+			cut.append((source, max(sliceStart, start + offset), min(sliceEnd, end + offset), sliceShift + shift))
+			number += 1
+
+		return cut
+
+	def join(self):
+		"""
+			The whole text or list.
+		"""
+		if self.joined is None:
+			parts = [self.read(piece) for piece in self.slices]
+			if isinstance(self.empty, list):
+				self.joined = [item for part in parts for item in part]
+			else:
+				self.joined = self.empty.join(parts)
+
+		return self.joined
+
+class incrementalParse(object):
+	"""
+		Result of grammar.parseIncremental or grammar.reparse, pass it 
+		to grammar.reparse after the text was edited.
+
+		Has attributes
+			text - the parsed text,
+			items - the results of the items of the repetition in the
+					start symbol, like from iterparse,
+			checkpoints - position in the text and the lexer states
+					before every item and after the last one,
+			reparsed - number of items that were parsed, the others 
+					were reused from the previous parse.
+
+		They share most of their contents with the previous parse, 
+		text, items and checkpoints are only put together when read.
+	"""
+	def __init__(self, text, items, checkpoints, context, reparsed):
+		self.pieces = (text, items, checkpoints)
+		self.context = context
+		self.reparsed = reparsed
+
+	@property
+	def text(self):
+		return self.pieces[0].join()
+
+	@property
+	def items(self):
+		return self.pieces[1].join()
+
+	@property
+	def checkpoints(self):
+		return self.pieces[2].join()
+
+class parseSession(object):
+	"""
+		Parses a text that arrives in chunks, get one by grammar.session.
+
+		Lexes and parses as far as possible on every chunk passed to 
+		feed. Tokens are kept until more text arrives while the lexer
+		could have looked past the end of the chunks so far to find 
+		them, since more text could change them. Tokens whose regexps 
+		could look ahead arbitrarily far, like "[a-z]*x", are kept
+		until close.
+		Errors in the text are raised by feed as soon as the parser
+		reaches them, errors of the lexer only by close. The positions 
+		of tokens count from the start of the first chunk.
+	"""
+	def __init__(self, grammar, context, tracer):
+		self.grammar = grammar
+		self.context = context
+		self.tracer = tracer
+
+		# Characters kept before the current position, for tokens 
+		# that look behind.
+		self.lookBehind = max([0] + [_regexpReach(tok.origRegexp)[2] for state in grammar.lexerStates
+														for tok in state.tokens + state.omit])
+
+		# Text not lexed yet, with some lexed text in front.
+		self.buffer = ""
+		self.pos = 0
+
+		# Position of the buffer in the whole text.
+		self.offset = 0
+
+		self.lexerStates = [grammar.lexerStartState]
+		self.tokens = 0
+		self.closed = False
+
+		self.state = parserRootState(grammar.startSymbol, tracer = tracer)
+
+		if tracer is not None:
+			tracer.parsingStarted(self.state)
+
+	def feed(self, text):
+		"""
+			Parse the next chunk of the text.
+		"""
+		if self.closed:
+			raise ValueError("The session is closed.")
+
+		self.buffer += text
+		self.lex(False)
+
+		cut = self.pos - self.lookBehind
+		if cut > 0:
+			self.buffer = self.buffer[cut:]
+			self.pos -= cut
+			self.offset += cut
+
+	def close(self):
+		"""
+			The text is complete, return the result of the parse.
+		"""
+		if self.closed:
+			raise ValueError("The session is closed.")
+
+		self.closed = True
+
+		try:
+			self.lex(True)
+			return self.state.result(self.context)
+		finally:
+			if self.tracer is not None:
+				self.tracer.parseFinished()
+
+	def lex(self, final):
+		buffer = self.buffer
+
+		while self.pos < len(buffer):
+			step = self.grammar._lexAt(buffer, self.pos, self.lexerStates, self.tracer, final)
+
+			if step is None:
+				return
+
+			match, omitted = step
+			self.pos = match.end
+
+			if not omitted:
+				match.start += self.offset
+				match.end += self.offset
+				self.push(match)
+
+	def push(self, match):
+		if self.tracer is not None:
+			self.tracer.tokenPushed(match, self.tokens)
+
+		try:
+			self.state.pushToken(match)
+		except RuntimeError as e:
+			if ("%s" % e)[:5] == "maxim":
+				raise InfiniteStateExpansion(self.state)
+			raise
+
+		if self.tracer is not None:
+			self.tracer.tokenProcessed(self.state)
+
+		self.tokens += 1
+
+class parseCache(object):
+	"""
+		Results of parses, keyed by the text, the grammar and the
+		context. Set an instance as the cache of a grammar to make 
+		grammar.parse return the result of an earlier parse of the 
+		same text without lexing, parsing and calling mergers.
+
+		maxSize : int - Bytes the results in memory may use, the
+						least recently used results are dropped 
+						when there are more.
+		directory : str - Also store results in this directory, so
+						  they are found by other processes. Results 
+						  that can't be pickled are only kept in 
+						  memory.
+
+		Results are shared between the parses that hit them in memory,
+		so they shouldn't be changed. Contexts need to be picklable to 
+		be part of the key, grammars in the context are replaced by 
+		their fingerprint. Parses with contexts that can't be pickled 
+		are not cached.
+
+		Has attributes
+			hits - parses answered from memory,
+			diskHits - parses answered from the directory,
+			misses - parses that had to run,
+			skipped - parses with a context that can't be pickled,
+			evictions - results dropped from memory,
+			size - bytes used by the results in memory.
+	"""
+	def __init__(self, maxSize = 64 * 1024 * 1024, directory = None):
+		self.maxSize = maxSize
+		self.directory = directory
+		self.entries = collections.OrderedDict()
+		self.fingerprints = weakref.WeakKeyDictionary()
+		self.resetStats()
+
+	def resetStats(self):
+		self.hits = 0
+		self.diskHits = 0
+		self.misses = 0
+		self.skipped = 0
+		self.evictions = 0
+		self.size = sum(s for r, s in self.entries.itervalues())
+
+	def key(self, gr, text, context):
+		"""
+			Get the key for a parse, or None if the context can't be
+			pickled.
+		"""
+		fingerprint = self.fingerprints.get(gr)
+		if fingerprint is None:
+			fingerprint = self.fingerprints[gr] = _fingerprint(gr)
+
+		def persistentId(obj):
+			if isinstance(obj, grammar):
+				return self.fingerprints.get(obj) or _fingerprint(obj)
+			return None
+
+		f = StringIO()
+		p = pickle.Pickler(f, 2)
+		p.persistent_id = persistentId
+
+		try:
+			p.dump(context)
+		except Exception:
+			return None
+
+		h = hashlib.sha1(fingerprint)
+		if isinstance(text, unicode):
+			h.update("u" + text.encode("utf-8"))
+		else:
+			h.update("s" + text)
+		h.update(f.getvalue())
+		return h.hexdigest()
+
+	def parse(self, gr, text, context, run):
+		"""
+			Get the result for the text from the cache, or from run
+			and store it.
+		"""
+		key = self.key(gr, text, context)
+
+		if key is None:
+			self.skipped += 1
+			return run()
+
+		if key in self.entries:
+			self.hits += 1
+			result, size = self.entries.pop(key)
+			self.entries[key] = (result, size)
+			return result
+
+		data = self.read(key)
+		if data is not None:
+			self.diskHits += 1
+			result = pickle.loads(data)
+			self.remember(key, result, len(data))
+			return result
+
+		self.misses += 1
+		result = run()
+
+		data = None
+		if self.directory is not None:
+			try:
+				data = pickle.dumps(result, 2)
+			except Exception:
+				pass
+
+		if data is not None:
+			self.write(key, data)
+			self.remember(key, result, len(data))
+		else:
+			self.remember(key, result, _deepSize(result, set()))
+
+		return result
+
+	def remember(self, key, result, size):
+		if size > self.maxSize:
 			return
 
-		definedIn.append(self)
+		self.entries[key] = (result, size)
+		self.size += size
 
-		return self.__define__(name, symbol, definedIn)
+		while self.size > self.maxSize:
+			old, (r, s) = self.entries.popitem(last = False)
+			self.size -= s
+			self.evictions += 1
 
-	def __define__(self, name, symbol, definedIn):
+	def path(self, key):
+		return os.path.join(self.directory, key + ".pickle")
+
+	def read(self, key):
+		if self.directory is None:
+			return None
+
+		try:
+			with open(self.path(key), "rb") as f:
+				return f.read()
+		except IOError:
+			return None
+
+	def write(self, key, data):
+		# Write to a file of our own first, so that other processes 
+		# never read a half written result.
+		path = self.path(key)
+		temp = "%s.%d.tmp" % (path, os.getpid())
+
+		try:
+			with open(temp, "wb") as f:
+				f.write(data)
+			os.rename(temp, path)
+		except (IOError, OSError):
+			pass
+
+	def clear(self):
 		"""
-			Define an undefined symbol. Pass on defined in
-			to calls to define from sub-symbols.
+			Drop the results in memory, the directory stays as it is.
 		"""
-		raise NotImplementedError
+		self.entries.clear()
+		self.size = 0
 
-	def __rshift__(self, other):
+	def __getstate__(self):
+		# Pickled with a grammar, e.g. by dumps, without the results.
+		return {"maxSize" : self.maxSize, "directory" : self.directory}
+
+	def __setstate__(self, state):
+		self.__init__(state["maxSize"], state["directory"])
+
+	def __len__(self):
+		return len(self.entries)
+
+	def __str__(self):
+		return "%d hits, %d hits on disk, %d misses, %d skipped, %d evictions, %d results in %d bytes." % (
+					self.hits, self.diskHits, self.misses, self.skipped, self.evictions, len(self.entries), self.size)
+
+class parseLimits(object):
+	"""
+		Bounds for a parse, pass an instance as limits to grammar.parse
+		or set it as the limits of a grammar. A parse that goes over one
+		of them raises ParseLimitExceeded. Limits that are None are not
+		checked.
+
+		maxTokens : int - Tokens in the input.
+		maxLiveStates : int - Possible interpretations (leafs of the
+							  tree of states) after a token.
+		maxStates : int - States created in the whole parse.
+		maxSeconds : float - Time spent lexing and parsing.
+
+		The limits are checked after every token, so a parse could go
+		over them by the states and time one token needs. maxTokens
+		and maxSeconds are checked while lexing too.
+	"""
+	def __init__(self, maxTokens = None, maxLiveStates = None, maxStates = None, maxSeconds = None):
+		self.maxTokens = maxTokens
+		self.maxLiveStates = maxLiveStates
+		self.maxStates = maxStates
+		self.maxSeconds = maxSeconds
+
+	def check(self, root, pushed, total, started):
 		"""
-			Use as symbol >> symbol to create a chain of two or more
-			symbols.
+			Raise ParseLimitExceeded if the parse with this root went 
+			over a limit after pushing pushed of total tokens, started 
+			at the time started.
 		"""
-		return chain([self, other])
+		live = root.leafCount()
+		seconds = time.time() - started
 
-class definedLater(symbol):
-	def __init__(self, name):
-		self.name = name
+		for limit, value in (("maxTokens", total), ("maxLiveStates", live), 
+							 ("maxStates", root.created), ("maxSeconds", seconds)):
+			bound = getattr(self, limit)
+			if bound is not None and value > bound:
+				raise ParseLimitExceeded(limit, value, root, pushed, live, root.created, seconds)
 
-	def getState(self, *args, **kwargs):
-		raise RuntimeError("%s not defined." % self.name)
+	def checkLexing(self, lexed, started):
+		"""
+			Raise ParseLimitExceeded if lexing went over a limit after
+			lexed tokens, started at the time started.
+		"""
+		seconds = time.time() - started
 
-	def __copy__(self):
-		return definedLater(self.name)
+		for limit, value in (("maxTokens", lexed), ("maxSeconds", seconds)):
+			bound = getattr(self, limit)
+			if bound is not None and value > bound:
+				raise ParseLimitExceeded(limit, value, None, 0, 0, 0, seconds)
 
-	def __define__(self, name, symbol, definedIn):
-		return
+class spanTree(object):
+	"""
+		A parse tree in flat arrays, get one by grammar.parseSpans.
+
+		The nodes are numbered in preorder, the root is node 0. Every
+		node has a symbol, the range of tokens it covers and the node 
+		after its subtree, so the children of a node follow it directly
+		and every child is followed by the next one after its subtree.
+		The lexemes of the tokens are not copied, but kept as offsets
+		into the text.
+
+		Has attributes
+			text - the parsed text,
+			names - names of the symbols, the symbols of the nodes 
+					are indices into this list,
+			symbol, firstToken, lastToken, subtreeEnd - arrays with
+					an entry for every node, the node covers the tokens
+					from firstToken to before lastToken,
+			tokenStart, tokenEnd - arrays with the offsets of every
+					token in text.
+	"""
+	def __init__(self, text, state):
+		self.text = text
+		self.names = []
+		self.symbol = array.array("l")
+		self.firstToken = array.array("l")
+		self.lastToken = array.array("l")
+		self.subtreeEnd = array.array("l")
+		self.tokenStart = array.array("l")
+		self.tokenEnd = array.array("l")
 
-	def __getTokens__(self, gottenFrom):
-		raise NotImplementedError("Undefined symbol: %s" % self.name)
+		ids = {}
 
-class containsSymbols(symbol):
-	def __getTokens__(self, gottenFrom):
-		tokens = []
+		# Entries are states to add or numbers of nodes to finish.
+		stack = [state]
 
-		for r in self.symbols:
-			tokens.extend(r.getTokens(gottenFrom))
+		while stack:
+			state = stack.pop()
+
+			if isinstance(state, (int, long)):
+				self.lastToken[state] = len(self.tokenStart)
+				self.subtreeEnd[state] = len(self.symbol)
+				continue
+
+			name = state.symbol.name
+			if not name in ids:
+				ids[name] = len(self.names)
+				self.names.append(name)
+
+			node = len(self.symbol)
+			self.symbol.append(ids[name])
+			self.firstToken.append(len(self.tokenStart))
+
+			if isinstance(state, token.stateType):
+				self.tokenStart.append(state._result.start)
+				self.tokenEnd.append(state._result.end)
+				self.lastToken.append(len(self.tokenStart))
+				self.subtreeEnd.append(node + 1)
+				continue
+
+			self.lastToken.append(0)
+			self.subtreeEnd.append(0)
+
+			stack.append(node)
+			stack.extend(reversed(state.children()))
+
+	def __len__(self):
+		return len(self.symbol)
+
+	def name(self, node):
+		return self.names[self.symbol[node]]
+
+	def children(self, node):
+		"""
+			Yield the numbers of the children of node.
+		"""
+		child = node + 1
+		while child < self.subtreeEnd[node]:
+			yield child
+			child = self.subtreeEnd[child]
+
+	def span(self, node):
+		"""
+			Start and end offset of node in the text, (start, start) if
+			it covers no token.
+		"""
+		first = self.firstToken[node]
+		last = self.lastToken[node]
 
-		return tokens
+		if first == last:
+			if first < len(self.tokenStart):
+				return (self.tokenStart[first], self.tokenStart[first])
+			return (len(self.text), len(self.text))
 
-	def __define__(self, name, symbol, definedIn):
-		for r in [i for i in self.symbols]:
-			if isinstance(r, definedLater) and r.name == name:
-				self.symbols[self.symbols.index(r)] = symbol 
-			else:
-				r.define(name, symbol, definedIn)
+		return (self.tokenStart[first], self.tokenEnd[last - 1])
 
+	def lexeme(self, node):
+		"""
+			The text covered by node.
+		"""
+		start, end = self.span(node)
+		return self.text[start:end]
 
 class parserState(object):
 	"""
@@ -541,61 +3375,47 @@ class parserState(object):
 		possibility anymore, but a true result of the parsing. The 
 		parent has to handle that event, either by spawning new possible
 		substates or declaring itself as valid.
+
+		The leafs of the tree are the states of tokens. They register
+		at the root, which only pushes a token to the leafs waiting
+		for it.
 	"""
-	def __init__(self, symbol, parent = None, verbose = False, indent = 0):
+	def __init__(self, symbol, parent = None, tracer = None, indent = 0):
 		# The symbol controlling this state.
 		self.symbol = symbol
 
 		# The parent state of this state.
 		self.parent = parent
 
+		# The root of the tree the state is in, which counts the
+		# states created.
+		if parent is not None:
+			self.root = parent.root
+			self.root.created += 1
+		else:
+			self.root = None
+
 		# State can have possible next states to 
 		# follow it.
 		self._possibilities = [] 
 
-		# Possibilities that should be evaluated
-		# with next token
-		self._addedPossibilities = []
+		# Weather the state was removed from the possibilities
+		# of its parent.
+		self.detached = False
 
-		# Possibilities that should be removed
-		self._removedPossibilities = []
+		self.indent = indent
 
-		# State of object, weather it is yielding
-		# possibilities atm.
-		self._yieldsPossibilities = False
+		# tracer to report to.
+		self.tracer = tracer
 
-		self.verbose = verbose
-		self.indent = indent
+		if tracer is not None:
+			tracer.stateSpawned(self)
 
 	def possibilities(self):
 		"""
 			Yield possibilities of state.
-
-			Does changes (i.e. inserting new possibilites and removing of
-			invalid possibilites) afterwards.
 		"""
-		self._yieldsPossibilities = True
-
-		for p in self._possibilities:
-			if p in self._removedPossibilities:
-				continue
-			yield p
-
-		for p in self._addedPossibilities:
-			self._possibilities.append(p)
-
-		self._addedPossibilities = []
-
-		for p in self._removedPossibilities:
-			if p in self._possibilities:
-				self._possibilities.remove(p)
-
-		self._removedPossibilities = []
-
-		self._yieldsPossibilities = False 
-
-		if self.isInvalid():
-			self.makeInvalid()
+		return iter(list(self._possibilities))
 
 	def leafs(self):
 		"""
@@ -627,17 +3447,6 @@ class parserState(object):
 
 			The possibility will be evaluated at next token.
 		"""
-		if not self._yieldsPossibilities:
-			self._possibilities.append(state)
-		else:
-			self._addedPossibilities.append(state)
-
-	def addPossibilityNow(self, state):
-		"""
-			Add a possibility to this state.
-
-			The possibility will be evaluated with current token.
-		"""
 		self._possibilities.append(state)
 
 	def makeValid(self):
@@ -647,6 +3456,9 @@ class parserState(object):
 		if not self.parent:
 			return
 
+		if self.tracer is not None:
+			self.tracer.stateValid(self)
+
 		self.parent.setValidPossibility(self)
 
 	def setValidPossibility(self, state):
@@ -665,6 +3477,12 @@ class parserState(object):
 		if not self.parent:
 			raise StatesExhausted(self)
 
+		if self.detached:
+			return
+
+		if self.tracer is not None:
+			self.tracer.stateInvalid(self)
+
 		self.parent.setInvalidPossibility(self)
 
 	def setInvalidPossibility(self, state):
@@ -683,14 +3501,25 @@ class parserState(object):
 	def removePossibility(self, state):
 		"""
 			Plainly removes state from possibilities without invoking other stuff.
+
+			If no possibilities are left, the root checks at the end
+			of the token weather the state is invalid.
 		"""
-		if not state in self._possibilities and not state in self._addedPossibilities:
+		if not state in self._possibilities:
 			raise ValueError("State is no substate of me.")
 
-		if self._yieldsPossibilities:
-			self._removedPossibilities.append(state)
-		else:
-			self._possibilities.remove(state)
+		self._possibilities.remove(state)
+		state.detached = True
+
+		if len(self._possibilities) == 0:
+			self.root.emptied.append(self)
+
+	def removePossibilities(self, states):
+		"""
+			Remove a list of states from possibilities at once.
+		"""
+		removed = set(states)
+		self._possibilities = [p for p in self._possibilities if not p in removed]
 
 	def result(self):
 		"""
@@ -698,6 +3527,53 @@ class parserState(object):
 		"""
 		raise NotImplementedError
 
+	def children(self):
+		"""
+			Return the substates of the one interpretation of a 
+			complete state.
+		"""
+		raise NotImplementedError
+
+	def lastToken(self):
+		"""
+			The last token match of a complete state, None if it
+			matched no token.
+		"""
+		for res in self.results.itervalues():
+			for state in reversed(res):
+				last = state.lastToken()
+				if last is not None:
+					return last
+
+		return None
+
+	def merge(self, result, context, merger = None):
+		"""
+			Pass result to the merger of the symbol, if there is one,
+			or to merger if given.
+		"""
+		if merger is None:
+			merger = self.symbol.merger
+
+		if not merger:
+			return result
+
+		if self.tracer is None:
+			return merger(result, **context)
+
+		start = time.time()
+		try:
+			return merger(result, **context)
+		finally:
+			self.tracer.merged(self, time.time() - start)
+
+	def lexeme(self):
+		"""
+			The text of the tokens of a complete state, without the
+			omitted text between them.
+		"""
+		return "".join(state.lexeme() for state in self.children())
+
 	def indentation(self):
 		"""
 			Indentation helper for creating more usefull
@@ -714,20 +3590,57 @@ class parserRootState(parserState):
 
 		Catches results and nows how to push tokens to possibilities. 
 	"""
-	def __init__(self, symbol, verbose = False):
-		super(parserRootState, self).__init__(symbol, verbose = verbose)
+	def __init__(self, symbol, tracer = None):
+		super(parserRootState, self).__init__(symbol, tracer = tracer)
+		self.root = self
+		self.created = 0
 
 		# Will contain all possibilities that were valid
 		# after last token was pushed.
 		self.validPossibilities = []
 
-		# Will contain a list of tokens that i tried to
-		# find at the last pushed token
-		self.lastTokens = []
+		# The leafs waiting for the next token, by token, and the 
+		# ones that waited for the last token.
+		self.waiting = {}
+		self.lastWaiting = {}
 		self.lastPushedToken = None
+
+		# States that lost their last possibility while pushing
+		# a token.
+		self.emptied = []
+
+		# Ordered oneOf states and their possibilities that completed
+		# while pushing a token.
+		self.completed = []
 	
 		# Create one possibility for startSymbol.
-		self.addPossibility(symbol.getState(parent = self, verbose = verbose))
+		self.addPossibility(symbol.getState(parent = self, tracer = tracer))
+
+		if self.completed:
+			self.resolveOrdered()
+
+	@property
+	def lastTokens(self):
+		"""
+			The leafs that waited for the last pushed token.
+		"""
+		return [leaf for leafs in self.lastWaiting.itervalues() for leaf in leafs]
+
+	def addLeaf(self, leaf):
+		"""
+			Let leaf wait for the next token.
+		"""
+		leafs = self.waiting.get(leaf.symbol)
+		if leafs is None:
+			self.waiting[leaf.symbol] = [leaf]
+		else:
+			leafs.append(leaf)
+
+	def leafCount(self):
+		"""
+			Number of leafs waiting for the next token.
+		"""
+		return sum(len(leafs) for leafs in self.waiting.itervalues())
 
 	def isInvalid(self):
 		"""
@@ -738,50 +3651,238 @@ class parserRootState(parserState):
 
 	def pushToken(self, token):
 		"""
-			Clears validPossibilities and pushes tokens to
-			possibilities.
+			Clears validPossibilities and pushes token to the leafs
+			waiting for it. Leafs spawned meanwhile wait for the next
+			token, all other leafs are invalid then.
 		"""
 		self.validPossibilities = []
 
 		if len(self._possibilities) == 0:
 			raise StatesExhausted(self, self.lastTokens)
 
-		self.lastTokens = []
+		self.lastWaiting = waiting = self.waiting
+		self.waiting = {}
+
+		for leaf in waiting.get(token.token, []):
+			path = self.pathTo(leaf)
+			if path is None:
+				continue
 
-		for l in self.leafs():
-			self.lastTokens.append(l)
+			for parent, child in path:
+				parent.currentlyWorksOn = child
 
-		for p in self.possibilities():
-			p.pushToken(token)
+			leaf.pushToken(token)
+
+			for parent, child in path:
+				parent.currentlyWorksOn = None
+
+		if self.completed:
+			self.resolveOrdered()
+
+		invalid = [state for state in self.emptied if state is not self and len(state._possibilities) == 0]
+		self.emptied = []
+
+		for tok, leafs in waiting.iteritems():
+			if not tok is token.token:
+				invalid.extend(leafs)
+
+		self.sweep(invalid)
+
+		if self.isInvalid():
+			self.makeInvalid()
+
+	def sweep(self, invalid):
+		"""
+			Remove the invalid states from the tree at once, level by 
+			level. Every parent drops all its invalid possibilities in
+			one go and is invalid itself if none are left.
+		"""
+		tracer = self.tracer
+
+		while invalid:
+			parents = []
+			byParent = {}
+
+			for state in invalid:
+				if state.detached:
+					continue
+				state.detached = True
+
+				if tracer is not None:
+					tracer.stateInvalid(state)
+
+				parent = state.parent
+				states = byParent.get(parent)
+				if states is None:
+					byParent[parent] = [state]
+					parents.append(parent)
+				else:
+					states.append(state)
+
+			invalid = []
+
+			for parent in parents:
+				parent.removePossibilities(byParent[parent])
+
+				if not parent is self and len(parent._possibilities) == 0:
+					invalid.append(parent)
+
+	def resolveOrdered(self):
+		"""
+			Let the ordered oneOf states with completed possibilities
+			choose between them, until no more complete.
+		"""
+		while self.completed:
+			completed = self.completed
+			self.completed = []
+
+			paths = {}
+			for state, child in completed:
+				if not state in paths:
+					paths[state] = self.pathTo(state)
+
+			completed = [(state, child) for state, child in completed if paths[state] is not None]
+			if not completed:
+				continue
+
+			# The deepest states go first, so the completions they pass
+			# on reach the ordered states above them together with the
+			# ones that completed directly.
+			depth = max(len(paths[state]) for state, child in completed)
+
+			states = []
+			byState = {}
+
+			for state, child in completed:
+				if len(paths[state]) < depth:
+					self.completed.append((state, child))
+					continue
+
+				if not state in byState:
+					byState[state] = []
+					states.append(state)
+				byState[state].append(child)
+
+			for state in states:
+				path = self.pathTo(state)
+				if path is None:
+					continue
+
+				for parent, child in path:
+					parent.currentlyWorksOn = child
+
+				state.resolve(byState[state])
+
+				for parent, child in path:
+					parent.currentlyWorksOn = None
+
+	def pathTo(self, leaf):
+		"""
+			List of (parent, child) from the parent of leaf up to the
+			child of the root, None if a state on the way was removed.
+		"""
+		path = []
+		child = leaf
+
+		while not child is self:
+			if child.detached:
+				return None
+
+			parent = child.parent
+			if not parent is self:
+				path.append((parent, child))
+			child = parent
+
+		return path
 
 	def setValidPossibility(self, state):
 		self.validPossibilities.append(state)
 
 		self.removePossibility(state)
 
+	def setInvalidPossibility(self, state):
+		"""
+			Remove state, pushToken checks weather the root is
+			invalid when the token is done.
+		"""
+		self.removePossibility(state)
+
 	def result(self, context):
+		return self.validPossibility().result(context)
+
+	def validPossibility(self):
+		"""
+			The one possibility that was valid after the last token.
+		"""
 		if len(self.validPossibilities) == 0:
 			raise NotCompleted(self)
 
 		if len(self.validPossibilities) > 1:
 			raise AmbigiousResults(self)
 
-		return self.validPossibilities[0].result(context)
+		return self.validPossibilities[0]
+
+	def completedItem(self):
+		"""
+			For a repetition as symbol: if all possibilities agree on
+			the first item found, drop it from them and return it.
+		"""
+		states = self._possibilities + self.validPossibilities
+
+		lists = []
+		for s in states:
+			lists.extend(s.results.itervalues())
+
+		if len(lists) == 0 or len(lists[0]) == 0:
+			return None
+
+		first = lists[0][0]
+
+		for l in lists:
+			if len(l) == 0 or not l[0] is first:
+				return None
+
+		dropped = set()
+		for l in lists:
+			if not id(l) in dropped:
+				dropped.add(id(l))
+				del l[0]
+
+		for s in states:
+			s.dropped += 1
+
+		return first
+
+	def items(self):
+		"""
+			For a repetition as symbol: the states of the items found
+			and not dropped by completedItem.
+		"""
+		return self.validPossibility().items()
+
+	def skipItems(self, count):
+		"""
+			For a repetition as symbol: count items for From and To 
+			as if they were found and dropped already.
+		"""
+		for s in self._possibilities + self.validPossibilities:
+			s.dropped = count
 
 
 
 class token(symbol):
-	def __init__(self, regexp, merger = None):
+	def __init__(self, regexp, merger = None, bulkMerger = None):
 		name = "\"" + regexp.replace("\n", "\\n").replace("\t", "\\t") + "\""
 		super(token, self).__init__(merger, name = name)
 		self.origRegexp = regexp
+		self.bulkMerger = bulkMerger
 
 		try:
 			self.regexp = re.compile(regexp)
 		except Exception as e:
 			raise ValueError("Can't compile python regexp: '%s', %s" % (self.name, e)) 
 	def __copy__(self):
-		return token(self.origRegexp, self.merger)
+		return token(self.origRegexp, self.merger, self.bulkMerger)
 
 	def __getTokens__(self, gottenFrom):
 		return [self]
@@ -819,15 +3920,14 @@ class token(symbol):
 
 			assert self.parent
 
+			self.root.addLeaf(self)
+
 		def leafs(self):
 			yield self
 
 		def pushToken(self, token):
 			assert self.parent
 
-			if self.verbose:
-				print "%s%s: Checking %s --> %s" % (self.indentation(), self.symbol.name, token.text.replace("\n", "\\n"), "success" if token.token == self.symbol else "fail")
-
 			if token.token == self.symbol:
 				self._result = token
 				self.makeValid()
@@ -836,14 +3936,20 @@ class token(symbol):
 
 			return
 
+		def lastToken(self):
+			return self._result
+
 		def result(self, context):
 			assert self.parent
 			assert not self._result is None
 
-			if self.symbol.merger:
-				return self.symbol.merger(self._result.result, **context)
-			
-			return self._result.result
+			return self.merge(self._result.result, context)
+
+		def children(self):
+			return []
+
+		def lexeme(self):
+			return self._result.text
 
 
 class chain(containsSymbols):
@@ -866,8 +3972,8 @@ class chain(containsSymbols):
 		"""
 			The parserState type for the chain.
 		"""
-		def __init__(self, symbol, parent = None, verbose = False, indent = 0, withInitialPossibility = True):
-			super(chain.stateType, self).__init__(symbol, parent = parent, verbose = verbose, indent = indent)
+		def __init__(self, symbol, parent = None, tracer = None, indent = 0, withInitialPossibility = True):
+			super(chain.stateType, self).__init__(symbol, parent = parent, tracer = tracer, indent = indent)
 
 			# Start with -1 because currentPosition
 			# gets iterated before it is used.
@@ -878,29 +3984,12 @@ class chain(containsSymbols):
 			self.currentlyWorksOn = None
 
 			if withInitialPossibility:
-				initialPossibility = self.symbol.symbols[0].getState(parent = self, verbose = self.verbose, indent = self.indent + 1)
+				initialPossibility = self.symbol.symbols[0].getState(parent = self, tracer = self.tracer, indent = self.indent + 1)
 				self.addPossibility(initialPossibility)
 
 			assert self.parent
 
-		def pushToken(self, token):
-			if self.verbose:
-				print "%sIn %s:" % (self.indentation(), self.symbol.name)
-			assert self.currentlyWorksOn is None
-			assert self.parent
-
-			for p in self.possibilities():
-				assert p in self.currentPositions
-				assert p in self.results
-				self.currentlyWorksOn = p 
-				p.pushToken(token)
-
-			self.currentlyWorksOn = None
-
 		def setValidPossibility(self, state):
-			if self.verbose:
-				print "%s%s: Valid subsymbol %s at position %d found" % (self.indentation(), self.symbol.name, self.symbol.symbols[self.currentPositions[state]].name, self.currentPositions[state])
-
 			assert state in self.results
 
 			self.results[state].append(state)
@@ -925,12 +4014,8 @@ class chain(containsSymbols):
 			curWorksOn = self.currentlyWorksOn
 			self.currentlyWorksOn = validState
 	
-			nextState = self.symbol.symbols[self.currentPositions[validState]].getState(parent = self, verbose = self.verbose, indent = self.indent + 1)
-
-			if not validState in self._possibilities or not curWorksOn or self._possibilities.index(validState) <= self._possibilities.index(curWorksOn):
-				self.addPossibility(nextState)
-			else:
-				self.addPossibilityNow(nextState)
+			nextState = self.symbol.symbols[self.currentPositions[validState]].getState(parent = self, tracer = self.tracer, indent = self.indent + 1)
+			self.addPossibility(nextState)
 
 			# Set back to original state we was working on
 			self.currentlyWorksOn = curWorksOn
@@ -943,7 +4028,10 @@ class chain(containsSymbols):
 			if not self.parent:
 				raise RuntimeError("No parent to fork.")
 
-			copy = self.__class__(self.symbol, parent = self.parent, verbose = self.verbose, withInitialPossibility = False)
+			copy = self.__class__(self.symbol, parent = self.parent, tracer = self.tracer, withInitialPossibility = False)
+
+			if self.tracer is not None:
+				self.tracer.stateForked(self, copy)
 
 			copy.results = { validState : self.results[validState]}
 			copy.currentPositions = { validState : self.currentPositions[validState]}
@@ -979,15 +4067,6 @@ class chain(containsSymbols):
 			assert state in self.results
 			assert state in self.currentPositions
 
-		def addPossibilityNow(self, state):
-			assert self.parent
-
-			super(chain.stateType, self).addPossibilityNow(state)
-			self.copyResAndCurPosFor(state)
-
-			assert state in self.results
-			assert state in self.currentPositions
-
 		def removePossibility(self, state):
 			super(chain.stateType, self).removePossibility(state)
 
@@ -996,7 +4075,14 @@ class chain(containsSymbols):
 			if state in self.currentPositions:
 				del self.currentPositions[state]
 
-		def result(self, context):
+		def removePossibilities(self, states):
+			super(chain.stateType, self).removePossibilities(states)
+
+			for state in states:
+				self.results.pop(state, None)
+				self.currentPositions.pop(state, None)
+
+		def children(self):
 			assert self.parent
 
 			posResults = []
@@ -1011,20 +4097,25 @@ class chain(containsSymbols):
 			if len(posResults) > 1:
 				raise AmbigiousResults(self)
 
-			l = [i.result(context) for i in posResults[0]]
+			return posResults[0]
 
-			if self.symbol.merger:
-				return self.symbol.merger(l, **context)
-			
-			return l
+		def result(self, context):
+			l = [i.result(context) for i in self.children()]
+
+			return self.merge(l, context)
 
 
 
 class repeat(containsSymbols):
 	"""
 		A repetition of n to m times a symbol.
+
+		If the repetition or the repeated symbol has a bulkMerger, it 
+		is called once with a list of the texts of all items, instead 
+		of building the result of every item. Its result is passed to 
+		the merger of the repetition then.
 	"""
-	def __init__(self, symbol, From = 0, To = -1, merger = None, name = None):
+	def __init__(self, symbol, From = 0, To = -1, merger = None, name = None, bulkMerger = None):
 		super(repeat, self).__init__(merger, name)
 
 		if isinstance(symbol, basestring):
@@ -1033,13 +4124,19 @@ class repeat(containsSymbols):
 		self.symbols = [symbol]
 		self.From = From
 		self.To = To
+		self.bulkMerger = bulkMerger
 
 	def __copy__(self):
-		return repeat(self.symbols[0].__copy__(), self.From, self.To, self.merger, name = self.name)
+		return repeat(self.symbols[0].__copy__(), self.From, self.To, self.merger, name = self.name, bulkMerger = self.bulkMerger)
 
 	class stateType(chain.stateType):
-		def __init__(self, symbol, parent = None, verbose = False, indent = 0, withEmptyResult = False, *args, **kwargs):
-			super(repeat.stateType, self).__init__(symbol, parent = parent, verbose = verbose, indent = indent, *args, **kwargs)
+		def __init__(self, symbol, parent = None, tracer = None, indent = 0, withEmptyResult = False, *args, **kwargs):
+			# Number of items found and dropped from the start of 
+			# the results while streaming. Set before the chain 
+			# creates the first item, which may be valid at once.
+			self.dropped = 0
+
+			super(repeat.stateType, self).__init__(symbol, parent = parent, tracer = tracer, indent = indent, *args, **kwargs)
 
 			if withEmptyResult:
 				self.results[None] = []
@@ -1049,35 +4146,43 @@ class repeat(containsSymbols):
 		def _addEmptyResultToParentEventually(self):
 			if len(self.results) == 1 and len(self.results[self.results.keys()[0]]) == 0 and self.symbol.From == 0:
 				self.addedEmptyResult = True
-				emptyResult = self.__class__(self.symbol, parent = self.parent, verbose = self.verbose, withInitialPossibility = False, withEmptyResult = True)
+				emptyResult = self.__class__(self.symbol, parent = self.parent, tracer = self.tracer, withInitialPossibility = False, withEmptyResult = True)
 				self.parent.addPossibility(emptyResult)
 				emptyResult.makeValid()
 
 		def setValidPossibility(self, state):
 			assert self.parent
 
-			if self.verbose:
-				print "%s%s: Valid symbol %s found for the %d'th time." % (self.indentation(), self.symbol.name, self.symbol.symbols[0].name, len(self.results[state]) + 1)
-
-				
 			self.results[state].append(state)
 
-			if len(self.results[state]) < self.symbol.To or self.symbol.To == -1:
+			found = self.dropped + len(self.results[state])
+
+			if found < self.symbol.To or self.symbol.To == -1:
 				self.createNextState(state)
 
-			if len(self.results[state]) >= self.symbol.From:
+			if found >= self.symbol.From:
 				newState = self.fork(state)
 				newState.makeValid()
 			else:
 				self.removePossibility(state)
 
-		def result(self, context):
+		def fork(self, validState):
+			copy = super(repeat.stateType, self).fork(validState)
+			copy.dropped = self.dropped
+			return copy
+
+		def items(self):
+			"""
+				The states of the items found, without the ones dropped
+				while streaming.
+			"""
 			assert self.parent
 
 			posResults = []
 
 			for res in self.results.viewvalues():
-				if len(res) >= self.symbol.From and (len(res) <= self.symbol.To or self.symbol.To == -1):
+				found = self.dropped + len(res)
+				if found >= self.symbol.From and (found <= self.symbol.To or self.symbol.To == -1):
 					posResults.append(res)
 
 			if len(posResults) == 0:
@@ -1089,12 +4194,20 @@ class repeat(containsSymbols):
 				if len(r) > len(res):
 					res = r
 
-			l = [i.result(context) for i in res]
+			return res
+
+		def children(self):
+			return self.items()
+
+		def result(self, context):
+			bulkMerger = self.symbol.bulkMerger or self.symbol.symbols[0].bulkMerger
 
-			if self.symbol.merger:
-				return self.symbol.merger(l, **context)
+			if bulkMerger is None:
+				l = [i.result(context) for i in self.items()]
+			else:
+				l = self.merge([i.lexeme() for i in self.items()], context, bulkMerger)
 
-			return l
+			return self.merge(l, context)
 			
 class optional(repeat):
 	def __init__(self, symbol, merger = None, name = None):
@@ -1103,70 +4216,255 @@ class optional(repeat):
 		return optional(self.symbols[0].__copy__(), self.merger, name = self.name)
 
 
-class oneOf(containsSymbols):
-	"""
-		Match one of the given symbols.
-	"""
-	def __init__(self, symbols, merger = None, name = None):
-		super(oneOf, self).__init__(merger, name)
-		self.symbols = symbols
+class oneOf(containsSymbols):
+	"""
+		Match one of the given symbols.
+
+		If ordered, the first alternative wins: once an alternative is
+		complete, the states of the alternatives after it are dropped.
+		An alternative that completes while an earlier one is still
+		possible is kept.
+	"""
+	def __init__(self, symbols, merger = None, name = None, ordered = False):
+		super(oneOf, self).__init__(merger, name)
+		self.symbols = symbols
+		self.ordered = ordered
+
+		for pos, sym in enumerate(self.symbols):
+			if isinstance(sym, basestring):
+				self.symbols[pos] = definedLater(sym.strip())
+
+	def __copy__(self):
+		return oneOf([i.__copy__() for i in self.symbols], self.merger, name = self.name, ordered = self.ordered)
+	
+	class stateType(chain.stateType):
+		"""
+			The parserState for oneOf.
+
+			The current position of a possibility is the index of the
+			alternative it belongs to.
+		"""
+		def __init__(self, symbol, parent = None, tracer = None, indent = 0, withInitialPossibility = True, *args, **kwargs):
+			super(oneOf.stateType, self).__init__(symbol, parent = parent, tracer = tracer, indent = indent, withInitialPossibility = False, *args, **kwargs)
+
+			# Index of the alternative whose state is created.
+			self.alternative = 0
+
+			if withInitialPossibility:
+				for alternative, sym in enumerate(self.symbol.symbols):
+					self.alternative = alternative
+					poss = sym.getState(parent = self, tracer = self.tracer, indent = self.indent + 1)
+					self.addPossibility(poss)
+
+		def copyResAndCurPosFor(self, state):
+			super(oneOf.stateType, self).copyResAndCurPosFor(state)
+
+			if self.currentlyWorksOn is None:
+				self.currentPositions[state] = self.alternative
+
+		def setValidPossibility(self, state):
+			self.results[state].append(state)
+
+			if self.symbol.ordered:
+				# Wait for the other alternatives complete with the
+				# same token, see resolve.
+				self.root.completed.append((self, state))
+				return
+
+			newState = self.fork(state)
+			newState.makeValid()
+
+		def resolve(self, completed):
+			"""
+				Drop the alternatives after the first of the completed
+				states and make the completed states of that alternative
+				valid.
+			"""
+			completed = [c for c in completed if c in self.currentPositions]
+			if not completed:
+				return
+
+			first = min(self.currentPositions[c] for c in completed)
+
+			for state in list(self._possibilities):
+				if self.currentPositions[state] > first:
+					self.removePossibility(state)
+
+			for state in completed:
+				if state in self.currentPositions:
+					newState = self.fork(state)
+					newState.makeValid()
+
+		def children(self):
+			posResults = []
+
+			for res in self.results.viewvalues():
+				assert len(res) <= 1
+				if len(res) == 1:
+					posResults.append(res)
+
+			if len(posResults) == 0:
+				raise NotCompleted(self)
+
+			if len(posResults) > 1:
+				raise AmbigiousResults(self)
+
+			return posResults[0]
+
+		def result(self, context):
+			l = self.children()[0].result(context)
+
+			return self.merge(l, context)
+
+
+class operators(chain):
+	"""
+		An operand followed by any number of operators, each followed
+		by another operand, like 1 + 2 * 3 ^ 4.
+
+		The table lists the levels of the operators from the tightest
+		binding to the loosest, every level is (associativity, operators)
+		or (associativity, operators, merger), where associativity is 
+		"left" or "right" and operators are symbols or their names.
+
+		The text is parsed flat, so there is no ambiguity between the
+		ways to group it. The operators are grouped by their levels when
+		the result is built, every operator is passed as [left, operator,
+		right] to the merger of its level, or to the merger of the 
+		symbol if its level has none. Without operators, the result is 
+		the result of the operand.
+	"""
+	def __init__(self, operand, table, merger = None, name = None):
+		# Associativity and merger per level, and level per operator.
+		self.levels = []
+		self.operatorLevels = []
+
+		ops = []
+		for level, entry in enumerate(table):
+			if not entry[0] in ("left", "right"):
+				raise ValueError("Unknown associativity %s." % entry[0])
+
+			self.levels.append((entry[0], entry[2] if len(entry) > 2 else None))
+
+			for op in entry[1]:
+				ops.append(op)
+				self.operatorLevels.append(level)
+
+		if len(ops) == 0:
+			raise ValueError("No operators.")
+
+		super(operators, self).__init__([operand, oneOf(ops)], merger, name)
+
+	def __copy__(self):
+		ops = self.symbols[1].symbols
+
+		table = []
+		for level, (associativity, merger) in enumerate(self.levels):
+			table.append((associativity, [op.__copy__() for op, l in zip(ops, self.operatorLevels) if l == level], merger))
 
-		for pos, sym in enumerate(self.symbols):
-			if isinstance(sym, basestring):
-				self.symbols[pos] = definedLater(sym.strip())
+		return operators(self.symbols[0].__copy__(), table, self.merger, name = self.name)
 
-	def __copy__(self):
-		return oneOf([i.__copy__() for i in self.symbols], self.merger, name = self.name)
-	
 	class stateType(chain.stateType):
 		"""
-			The parserState for oneOf.
+			The parserState for operators.
+
+			Alternates between the operand and the operators. The 
+			results are linked lists (state, previous) from the last
+			state found, which the possibilities share, so going on 
+			after an operand costs the same however long the 
+			expression is.
 		"""
-		def __init__(self, symbol, parent = None, verbose = False, indent = 0, withInitialPossibility = True, *args, **kwargs):
-			super(oneOf.stateType, self).__init__(symbol, parent = parent, verbose = verbose, indent = indent, withInitialPossibility = False, *args, **kwargs)
+		def copyResAndCurPosFor(self, state):
+			assert self.parent
 
-			if withInitialPossibility:
-				for sym in self.symbol.symbols:
-					poss = sym.getState(parent = self, verbose = self.verbose, indent = self.indent + 1)
-					self.addPossibility(poss)
+			if self.currentlyWorksOn is None:
+				self.results[state] = None
+				self.currentPositions[state] = 0
+				return
+
+			self.results[state] = self.results[self.currentlyWorksOn]
+			self.currentPositions[state] = self.currentPositions[self.currentlyWorksOn]
 
 		def setValidPossibility(self, state):
-			if self.verbose:
-				print "%s%s: Option %s found" % (self.indentation(), self.symbol.name, state.symbol.name)
+			assert state in self.results
 
-			self.results[state].append(state)
+			self.results[state] = (state, self.results[state])
+
+			if self.currentPositions[state] == 1:
+				self.currentPositions[state] = 0
+				self.createNextState(state)
+				self.removePossibility(state)
+				return
+
+			# An operand ends the expression or is followed by an
+			# operator.
+			self.currentPositions[state] = 1
+			self.createNextState(state)
 
 			newState = self.fork(state)
 			newState.makeValid()
 
-			self.removePossibility(state)
-
-		def result(self, context):
-			posResults = []
+		def children(self):
+			assert self.parent
 
-			for res in self.results.viewvalues():
-				assert len(res) <= 1
-				if len(res) == 1:
-					posResults.append(res)
+			posResults = [res for res in self.results.viewvalues() if res is not None]
 
-			if len(posResults) == 0:
+			if len(posResults) == 0: 
 				raise NotCompleted(self)
 
 			if len(posResults) > 1:
 				raise AmbigiousResults(self)
 
-			l = posResults[0][0].result(context)
+			states = []
+			res = posResults[0]
+			while res is not None:
+				states.append(res[0])
+				res = res[1]
 
-			if self.symbol.merger:
-				return self.symbol.merger(l, **context)
-			
-			return l
+			states.reverse()
+			return states
+
+		def lastToken(self):
+			for state in reversed(self.children()):
+				last = state.lastToken()
+				if last is not None:
+					return last
+
+			return None
+
+		def result(self, context):
+			states = self.children()
+			levels = self.symbol.levels
+			operatorLevels = self.symbol.operatorLevels
+
+			values = [states[0].result(context)]
+			pending = []
+
+			def reduce():
+				op, level = pending.pop()
+				right = values.pop()
+				values[-1] = self.merge([values[-1], op, right], context, levels[level][1])
+
+			for i in range(1, len(states), 2):
+				opState = states[i]
+				level = operatorLevels[opState.currentPositions[opState.children()[0]]]
+
+				while pending and (pending[-1][1] < level or (pending[-1][1] == level and levels[level][0] == "left")):
+					reduce()
+
+				pending.append((opState.result(context), level))
+				values.append(states[i + 1].result(context))
+
+			while pending:
+				reduce()
+
+			return values[0]
 
 
 class bnfGrammar(grammar):
 
-	def parse(self, text):
-		return super(bnfGrammar, self).parse(text, context = {"parser" : self})
+	def parse(self, text, stats = None, tracer = None):
+		return super(bnfGrammar, self).parse(text, context = {"parser" : self}, stats = stats, tracer = tracer)
 
 	_empty = token("[ ]+")
 
@@ -1180,6 +4478,7 @@ class bnfGrammar(grammar):
 	_qumark = token("[?]")
 	_star = token("[*]")
 	_bar = token("[|]")
+	_slash = token("/")
 
 	lexerStartState = lexState([
 						"_number",
@@ -1191,7 +4490,8 @@ class bnfGrammar(grammar):
 						"_delim", 
 						"_qumark",
 						"_star",
-						"_bar"
+						"_bar",
+						"_slash"
 					], [
 						"_empty"
 					])
@@ -1214,7 +4514,7 @@ class bnfGrammar(grammar):
 			if len(res[1]) == 0 and len(res[3]) == 0:
 				return (0, -1)
 			else:
-				return (0, int(res[2][0]))
+				return (0, int(res[3][0]))
 
 	@chain([optional("_fromToPart"), "_star", " _simpleSymbol"])
 	def _repeat(res, parser):
@@ -1243,6 +4543,11 @@ class bnfGrammar(grammar):
 
 		return oneOf(temp)
 
+	@chain([repeat(chain(["_noOneOfSymbol", "_slash"])), "_noOneOfSymbol", "_slash", "_noOneOfSymbol"])
+	def _orderedOneOf(res, parser):
+		sym = parser._oneOf.merger(res, parser)
+		sym.ordered = True
+		return sym
 	
 	@chain(["_leftP", repeat("symbol", From = 1), "_rightP"]) 
 	def _chain(res, parser):
@@ -1250,7 +4555,7 @@ class bnfGrammar(grammar):
 
 		return chain(res)
 
-	symbol = oneOf(["_repeat", "_optional", "_chain", "_oneOf", "_name"])
+	symbol = oneOf(["_repeat", "_optional", "_chain", "_oneOf", "_orderedOneOf", "_name"])
 
 
 	@repeat("symbol", From = 1)
@@ -1260,10 +4565,787 @@ class bnfGrammar(grammar):
 
 		return parser._chain.merger([None, res, None], parser)
 
-_bnfParser = bnfGrammar()
+# The bnfGrammar instance is only created on first use,
+# see referenceBnfParser.
+_bnfParser = None
+
+# Types of objects that are shared between parses.
+_sharedTypes = (symbol, lexerState, grammar, tracer, type, types.FunctionType,
+				types.MethodType, types.BuiltinFunctionType, type(re.compile("")))
+
+def referenceBnfParser():
+	"""
+		Get the shared instance of bnfGrammar.
+	"""
+	global _bnfParser
+
+	if _bnfParser is None:
+		_bnfParser = bnfGrammar()
+
+	return _bnfParser
+
+
+class fastBnfParser(object):
+	"""
+		Deterministic parser for the BNF-like syntax of symbol.
+
+		Produces the same symbols as bnfGrammar, but reads the
+		text by recursive descent, since the syntax needs only
+		one token of lookahead. bnfGrammar is kept as reference.
+	"""
+	tokenRegexp = re.compile(r"[ ]+|(\d+)|(\w+)|([(){},?*|/])")
+
+	def __init__(self, text):
+		self.text = text
+		self.tokens = []
+		self.pos = 0
+
+		pos = 0
+		while pos < len(text):
+			match = self.tokenRegexp.match(text, pos)
+			if not match:
+				raise BNFError(text, pos, "a name or one of (){},?*|/")
+
+			if match.lastindex == 1:
+				self.tokens.append(("number", match.group(1), pos))
+			elif match.lastindex == 2:
+				self.tokens.append(("name", match.group(2), pos))
+			elif match.lastindex == 3:
+				self.tokens.append((match.group(3), match.group(3), pos))
+
+			pos = match.end()
+
+	def peek(self):
+		if self.pos < len(self.tokens):
+			return self.tokens[self.pos][0]
+		return None
+
+	def expect(self, kind, description = None):
+		if self.peek() != kind:
+			self.fail(description or "'%s'" % kind)
+		self.pos += 1
+		return self.tokens[self.pos - 1][1]
+
+	def fail(self, expected):
+		if self.pos < len(self.tokens):
+			raise BNFError(self.text, self.tokens[self.pos][2], expected)
+		raise BNFError(self.text, len(self.text), expected)
+
+	def parse(self):
+		symbols = self.parseSymbols()
+
+		if self.pos < len(self.tokens):
+			self.fail("end of text")
+
+		return chain(symbols)
+
+	def parseSymbols(self):
+		symbols = [self.parseOneOf()]
+
+		while self.peek() in ("name", "(", "{", "*", "?"):
+			symbols.append(self.parseOneOf())
+
+		return symbols
+
+	def parseOneOf(self):
+		symbols = [self.parseNoOneOf()]
+		separator = self.peek()
+
+		if separator != "|" and separator != "/":
+			return symbols[0]
+
+		while self.peek() == separator:
+			self.pos += 1
+			symbols.append(self.parseNoOneOf())
+
+		return oneOf(symbols, ordered = separator == "/")
+
+	def parseNoOneOf(self):
+		kind = self.peek()
+
+		if kind == "?":
+			self.pos += 1
+			return optional(self.parseSimple())
+
+		if kind == "{" or kind == "*":
+			From, To = self.parseFromTo()
+			self.expect("*")
+			return repeat(self.parseSimple(), From = From, To = To)
+
+		return self.parseSimple()
+
+	def parseFromTo(self):
+		if self.peek() != "{":
+			return (0, -1)
+
+		self.pos += 1
+		From = 0
+		To = -1
+
+		if self.peek() == "number":
+			From = int(self.expect("number"))
+		self.expect(",")
+		if self.peek() == "number":
+			To = int(self.expect("number"))
+		self.expect("}")
+
+		return (From, To)
+
+	def parseSimple(self):
+		kind = self.peek()
+
+		if kind == "name":
+			return definedLater(self.expect("name"))
+
+		if kind == "(":
+			self.pos += 1
+			symbols = self.parseSymbols()
+			self.expect(")")
+			return chain(symbols)
+
+		self.fail("a name or '('")
 
 def createSymbolFromBNF(text):
-	return _bnfParser.parse(text)
+	return fastBnfParser(text).parse()
+
+
+class parserGenerator(object):
+	"""
+		Writes the source of a python module that parses like a
+		grammar, get it by grammar.generateParser.
+
+		Every symbol becomes a function that returns all the ways the
+		symbol matches the tokens from a position on, as a list of
+		(end, node), and the furthest position its tokens reached.
+		The functions remember their results per position, chains are
+		unrolled into nested loops and tokens are checked inline. The
+		result is built from the one complete node by another function
+		per symbol, which calls the mergers directly. The lexer matches
+		all tokens of a lexer state with one regexp where they allow it.
+
+		Mergers are looked up by their place in the grammar class, like
+		loads does, or by their name in their module.
+
+		The functions call each other once per symbol nested in the 
+		text, so text that nests deeper than the recursion limit allows
+		raises a RuntimeError. Left recursive grammars would recurse
+		without end and raise a GrammarError when generating.
+	"""
+	def __init__(self, gr):
+		issues = [i for i in gr.issues if i.kind == "leftRecursion"]
+		if issues:
+			raise GrammarError(issues)
+
+		self.grammar = gr
+		self.cls = gr.__class__
+		self.mergers = gr.mergerReferences()
+
+		# Symbols and tokens by number, and the numbers by id.
+		self.symbols = []
+		self.symbolIds = {}
+		self.tokens = []
+		self.tokenIds = {}
+
+		# Names and expressions of the variables holding the mergers.
+		self.references = []
+		self.referenceIds = {}
+
+		self.lines = []
+
+		self.collect(gr.startSymbol)
+
+		for state in gr.lexerStates:
+			for tok in state.omit + state.tokens + state.keywords:
+				self.tokenId(tok)
+			if state.popOn is not None:
+				self.tokenId(state.popOn)
+
+		for tok in gr.pushStates:
+			self.tokenId(tok)
+
+	def collect(self, start):
+		stack = [start]
+
+		while stack:
+			sym = stack.pop()
+
+			if id(sym) in self.symbolIds:
+				continue
+
+			if isinstance(sym, definedLater):
+				raise ValueError("Symbol %s is not defined." % sym.name)
+
+			if not isinstance(sym, (token, chain, repeat, oneOf)):
+				raise ValueError("Can't generate code for %s." % sym.name)
+
+			self.symbolIds[id(sym)] = len(self.symbols)
+			self.symbols.append(sym)
+
+			if isinstance(sym, token):
+				self.tokenId(sym)
+			else:
+				stack.extend(reversed(sym.symbols))
+
+	def tokenId(self, tok):
+		if not id(tok) in self.tokenIds:
+			self.tokenIds[id(tok)] = len(self.tokens)
+			self.tokens.append(tok)
+
+		return self.tokenIds[id(tok)]
+
+	def symbolId(self, sym):
+		return self.symbolIds[id(sym)]
+
+	def reference(self, merger, sym):
+		"""
+			Name of the variable in the module that holds merger.
+		"""
+		if id(merger) in self.referenceIds:
+			return self.referenceIds[id(merger)]
+
+		if id(merger) in self.mergers:
+			ref = self.mergers[id(merger)]
+			expression = "_symbol(%r, %r)" % ref[:2]
+			if len(ref) > 3:
+				expression += ".levels[%d][1]" % ref[3]
+			else:
+				expression += "." + (ref[2] if len(ref) > 2 else "merger")
+		else:
+			module = getattr(merger, "__module__", None) or "__builtin__"
+			name = getattr(merger, "__name__", None)
+
+			if name is None or getattr(sys.modules.get(module), name, None) is not merger:
+				raise ValueError("Can't reference merger %r of %s in the generated module." % (merger, sym.name))
+
+			expression = "parsr._findByName(%r, %r)" % (module, name)
+
+		name = "_f%d" % len(self.references)
+		self.references.append((name, expression))
+		self.referenceIds[id(merger)] = name
+		return name
+
+	def line(self, indent = 0, text = ""):
+		self.lines.append("\t" * indent + text if text else "")
+
+	def module(self):
+		"""
+			Get the source of the module.
+		"""
+		parser = self.parserCode()
+		results = self.resultCode()
+		lexer = self.lexerCode()
+
+		self.lines = []
+
+		if self.cls is grammar:
+			origin = "a grammar of symbols"
+		else:
+			origin = "%s.%s" % (self.cls.__module__, _qualifiedName(self.cls))
+
+		self.line(0, '"""')
+		self.line(1, "Parser for %s, generated by parsr." % origin)
+		self.line()
+		self.line(1, "parse(text, context = None) returns the results and raises the")
+		self.line(1, "errors parse of the grammar does.")
+		self.line(0, '"""')
+		self.line(0, "import re")
+		self.line()
+		self.line(0, "import parsr")
+		self.line(0, "from parsr import LexerError, StatesExhausted, NotCompleted, AmbigiousResults, InfiniteStateExpansion")
+		self.line()
+
+		if self.cls is not grammar:
+			self.line(0, "_grammar = parsr._findByName(%r, %r)" % (self.cls.__module__, _qualifiedName(self.cls)))
+			self.line()
+			self.line(0, "def _symbol(name, path):")
+			self.line(1, "sym = getattr(_grammar, name)")
+			self.line(1, "for i in path:")
+			self.line(2, "sym = sym.symbols[i]")
+			self.line(1, "return sym")
+			self.line()
+
+		for name, expression in self.references:
+			self.line(0, "%s = %s" % (name, expression))
+
+		head = self.lines
+		self.lines = []
+
+		self.line(0, "def parse(text, context = None):")
+		self.line(1, "if context is None:")
+		self.line(2, "context = {}")
+		self.line()
+		self.line(1, "kinds, texts, values = _lex(text)")
+		self.line()
+		self.line(1, "parses, reach = _parser(kinds)(0)")
+		self.line()
+		self.line(1, "if reach < len(kinds):")
+		self.line(2, "raise StatesExhausted(None)")
+		self.line()
+		self.line(1, "complete = [node for end, node in parses if end == len(kinds)]")
+		self.line()
+		self.line(1, "if len(complete) == 0:")
+		self.line(2, "raise NotCompleted(None)")
+		self.line()
+		self.line(1, "if len(complete) > 1:")
+		self.line(2, "raise AmbigiousResults(None)")
+		self.line()
+		self.line(1, "return _results(context, texts, values)(complete[0])")
+
+		return "\n".join(head + [""] + lexer + [""] + parser + [""] + results + [""] + self.lines) + "\n"
+
+	def lexerCode(self):
+		gr = self.grammar
+		stateIds = dict((id(s), i) for i, s in enumerate(gr.lexerStates))
+
+		regexps = []
+		groups = []
+		candidates = []
+		keywords = []
+
+		for state in gr.lexerStates:
+			ordered = [(True, state.omit), (False, state.tokens)]
+
+			candidates.append([(omit, [self.tokenId(t) for t in toks]) for omit, toks in ordered])
+
+			combined = None
+			if not state.longestMatch:
+				combined = self.combine([(omit, t) for omit, toks in ordered for t in toks])
+
+			if combined is None:
+				regexps.append("None")
+				groups.append("None")
+			else:
+				regexps.append("re.compile(%r)" % combined[0])
+				groups.append(repr(combined[1]))
+
+			kw = {}
+			for tok in state.keywords:
+				kw.setdefault(_literal(tok.origRegexp), self.tokenId(tok))
+			keywords.append(repr(kw))
+
+		pushes = dict((self.tokenId(tok), stateIds[id(state)]) for tok, state in gr.pushStates.items())
+		popOn = [self.tokenId(s.popOn) if s.popOn is not None else None for s in gr.lexerStates]
+
+		self.lines = []
+
+		self.line(0, "class _named(object):")
+		self.line(1, "def __init__(self, name):")
+		self.line(2, "self.name = name")
+		self.line()
+		self.line(0, "class _lexerState(object):")
+		self.line(1, "\"\"\"")
+		self.line(2, "The names of the tokens of a lexer state, for LexerError.")
+		self.line(1, "\"\"\"")
+		self.line(1, "def __init__(self, name, tokens, omit):")
+		self.line(2, "self.name = name")
+		self.line(2, "self.tokens = [_named(t) for t in tokens]")
+		self.line(2, "self.omit = [_named(t) for t in omit]")
+		self.line()
+		self.line(0, "_lexerStates = [")
+		for state in gr.lexerStates:
+			self.line(1, "_lexerState(%r, %r, %r)," % (state.name, [t.name for t in state.tokens], [t.name for t in state.omit]))
+		self.line(0, "]")
+		self.line()
+		self.line(0, "# The regexp of every token and weather it has named groups.")
+		self.line(0, "_tokens = [")
+		for tok in self.tokens:
+			self.line(1, "(re.compile(%r), %r)," % (tok.origRegexp, len(tok.regexp.groupindex) > 0))
+		self.line(0, "]")
+		self.line()
+		self.line(0, "# Per lexer state: one regexp for all its tokens and the token")
+		self.line(0, "# and weather it is omitted per group, or None if the tokens are")
+		self.line(0, "# tried one by one, the tokens to try, weather the longest match")
+		self.line(0, "# wins, the keywords and the token that pops the state.")
+		self.line(0, "_regexps = [%s]" % ", ".join(regexps))
+		self.line(0, "_groups = [%s]" % ", ".join(groups))
+		self.line(0, "_candidates = %r" % candidates)
+		self.line(0, "_longest = %r" % [bool(s.longestMatch) for s in gr.lexerStates])
+		self.line(0, "_keywords = [%s]" % ", ".join(keywords))
+		self.line(0, "_popOn = %r" % popOn)
+		self.line()
+		self.line(0, "# The lexer states pushed by tokens.")
+		self.line(0, "_push = %r" % pushes)
+		self.line(0, "_start = %d" % stateIds[id(gr.lexerStartState)])
+		self.line()
+		self.line(0, "def _match(current, text, pos):")
+		self.line(1, "\"\"\"")
+		self.line(2, "Try the tokens of a lexer state one by one, return the token,")
+		self.line(2, "weather it is omitted and the end of its match, or None.")
+		self.line(1, "\"\"\"")
+		self.line(1, "for omit, kinds in _candidates[current]:")
+		self.line(2, "best = None")
+		self.line()
+		self.line(2, "for kind in kinds:")
+		self.line(3, "match = _tokens[kind][0].match(text, pos)")
+		self.line(3, "if match is None:")
+		self.line(4, "continue")
+		self.line()
+		self.line(3, "if match.end() == pos:")
+		self.line(4, "raise ValueError(\"Don't use tokens that match strings with zero length.\")")
+		self.line()
+		self.line(3, "if not _longest[current]:")
+		self.line(4, "return kind, omit, match.end()")
+		self.line()
+		self.line(3, "if best is None or match.end() > best[2]:")
+		self.line(4, "best = (kind, omit, match.end())")
+		self.line()
+		self.line(2, "if best is not None:")
+		self.line(3, "return best")
+		self.line()
+		self.line(1, "return None")
+		self.line()
+		self.line(0, "def _lex(text):")
+		self.line(1, "\"\"\"")
+		self.line(2, "Return the tokens, lexemes and token results of text.")
+		self.line(1, "\"\"\"")
+		self.line(1, "kinds = []")
+		self.line(1, "texts = []")
+		self.line(1, "values = []")
+		self.line()
+		self.line(1, "states = [_start]")
+		self.line(1, "pos = 0")
+		self.line()
+		self.line(1, "while pos < len(text):")
+		self.line(2, "if not states:")
+		self.line(3, "states.append(_start)")
+		self.line()
+		self.line(2, "current = states[-1]")
+		self.line(2, "regexp = _regexps[current]")
+		self.line()
+		self.line(2, "if regexp is not None:")
+		self.line(3, "match = regexp.match(text, pos)")
+		self.line(3, "if match is None:")
+		self.line(4, "raise LexerError(text, pos, _lexerStates[current])")
+		self.line()
+		self.line(3, "kind, omit = _groups[current][match.lastgroup]")
+		self.line(3, "end = match.end()")
+		self.line()
+		self.line(3, "if end == pos:")
+		self.line(4, "raise ValueError(\"Don't use tokens that match strings with zero length.\")")
+		self.line(2, "else:")
+		self.line(3, "found = _match(current, text, pos)")
+		self.line(3, "if found is None:")
+		self.line(4, "raise LexerError(text, pos, _lexerStates[current])")
+		self.line()
+		self.line(3, "kind, omit, end = found")
+		self.line()
+		self.line(2, "if not omit:")
+		self.line(3, "lexeme = text[pos:end]")
+		self.line()
+		self.line(3, "if lexeme in _keywords[current]:")
+		self.line(4, "kind = _keywords[current][lexeme]")
+		self.line(4, "value = lexeme")
+		self.line(3, "elif _tokens[kind][1]:")
+		self.line(4, "value = _tokens[kind][0].match(text, pos).groupdict()")
+		self.line(3, "else:")
+		self.line(4, "value = lexeme")
+		self.line()
+		self.line(3, "kinds.append(kind)")
+		self.line(3, "texts.append(lexeme)")
+		self.line(3, "values.append(value)")
+		self.line()
+		self.line(2, "if _popOn[current] == kind:")
+		self.line(3, "states.pop()")
+		self.line(2, "if kind in _push:")
+		self.line(3, "states.append(_push[kind])")
+		self.line()
+		self.line(2, "pos = end")
+		self.line()
+		self.line(1, "return kinds, texts, values")
+
+		return self.lines
+
+	def combine(self, candidates):
+		"""
+			One regexp with a named group per token, which matches like
+			trying the tokens in order, and a dict from the names of the
+			groups to the token and weather it is omitted. None if a
+			regexp uses flags or refers to its groups.
+		"""
+		parts = []
+		names = {}
+
+		for omit, tok in candidates:
+			try:
+				parsed = sre_parse.parse(tok.origRegexp)
+			except (sre_constants.error, ValueError):
+				return None
+
+			if parsed.pattern.flags & ~sre_parse.SRE_FLAG_UNICODE or _refersToGroups(parsed):
+				return None
+
+			name = "_t%d" % len(parts)
+			names[name] = (self.tokenId(tok), omit)
+			parts.append("(?P<%s>%s)" % (name, tok.origRegexp))
+
+		if not parts:
+			return None
+
+		regexp = "|".join(parts)
+
+		try:
+			re.compile(regexp)
+		except Exception:
+			return None
+
+		return regexp, names
+
+	def parserCode(self):
+		self.lines = []
+
+		self.line(0, "_nothing = ()")
+		self.line()
+		self.line(0, "def _parser(kinds):")
+		self.line(1, "\"\"\"")
+		self.line(2, "Get the function of the start symbol for a list of tokens.")
+		self.line(1, "\"\"\"")
+		self.line(1, "n = len(kinds)")
+
+		for i, sym in enumerate(self.symbols):
+			if not isinstance(sym, token):
+				self.line(1, "_m%d = {}" % i)
+
+		for i, sym in enumerate(self.symbols):
+			self.line()
+			self.line(1, "# %s" % _oneLine(sym.name))
+			self.line(1, "def _p%d(pos):" % i)
+
+			if isinstance(sym, token):
+				self.line(2, "if pos < n and kinds[pos] == %d:" % self.tokenId(sym))
+				self.line(3, "return [(pos + 1, pos)], pos + 1")
+				self.line(2, "return _nothing, pos")
+				continue
+
+			self.line(2, "memo = _m%d.get(pos)" % i)
+			self.line(2, "if memo is not None:")
+			self.line(3, "return memo")
+			self.line()
+			self.line(2, "out = []")
+			self.line(2, "reach = pos")
+
+			if isinstance(sym, operators):
+				self.operatorsCode(sym)
+			elif isinstance(sym, chain):
+				self.chainCode(sym)
+			elif isinstance(sym, repeat):
+				self.repeatCode(sym)
+			elif sym.ordered:
+				self.orderedCode(sym)
+			else:
+				self.oneOfCode(sym)
+
+			self.line()
+			self.line(2, "memo = _m%d[pos] = (out, reach)" % i)
+			self.line(2, "return memo")
+
+		self.line()
+		self.line(1, "return _p%d" % self.symbolId(self.grammar.startSymbol))
+
+		return self.lines
+
+	def each(self, sym, pos, end, node, indent, depth):
+		"""
+			Write the head of a loop over the matches of sym at pos,
+			binding end and node. Returns the indent of the body.
+		"""
+		if isinstance(sym, token):
+			self.line(indent, "if %s < n and kinds[%s] == %d:" % (pos, pos, self.tokenId(sym)))
+			self.line(indent + 1, "%s = %s + 1" % (end, pos))
+			self.line(indent + 1, "%s = %s" % (node, pos))
+			self.line(indent + 1, "if %s > reach:" % end)
+			self.line(indent + 2, "reach = %s" % end)
+			return indent + 1
+
+		self.line(indent, "parses%d, r = _p%d(%s)" % (depth, self.symbolId(sym), pos))
+		self.line(indent, "if r > reach:")
+		self.line(indent + 1, "reach = r")
+		self.line(indent, "for %s, %s in parses%d:" % (end, node, depth))
+		return indent + 1
+
+	def chainCode(self, sym):
+		indent = 2
+		pos = "pos"
+
+		for k, sub in enumerate(sym.symbols):
+			indent = self.each(sub, pos, "e%d" % k, "n%d" % k, indent, k)
+			pos = "e%d" % k
+
+		nodes = ", ".join("n%d" % k for k in range(len(sym.symbols)))
+		if len(sym.symbols) == 1:
+			nodes += ","
+		self.line(indent, "out.append((%s, (%s)))" % (pos, nodes))
+
+	def oneOfCode(self, sym):
+		for k, sub in enumerate(sym.symbols):
+			indent = self.each(sub, "pos", "e", "node", 2, 0)
+			self.line(indent, "out.append((e, (%d, node)))" % k)
+
+	def orderedCode(self, sym):
+		# Once an alternative is complete, the alternatives after it
+		# only count up to where it ended.
+		self.line(2, "cut = None")
+
+		for k, sub in enumerate(sym.symbols):
+			self.line()
+			self.line(2, "parses, r = _p%d(pos)" % self.symbolId(sub))
+			self.line(2, "if cut is not None and r > cut:")
+			self.line(3, "r = cut")
+			self.line(2, "if r > reach:")
+			self.line(3, "reach = r")
+			self.line(2, "ends = [e for e, node in parses if cut is None or e < cut]")
+			self.line(2, "for e, node in parses:")
+			self.line(3, "if cut is None or e < cut:")
+			self.line(4, "out.append((e, (%d, node)))" % k)
+			self.line(2, "if ends:")
+			self.line(3, "cut = min(ends)")
+
+	def repeatCode(self, sym):
+		# Items are linked lists (node, start, end, previous).
+		if sym.From == 0:
+			self.line(2, "out.append((pos, None))")
+
+		self.line(2, "frontier = [(pos, None)]")
+		self.line(2, "count = 0")
+		self.line()
+
+		if sym.To == -1:
+			self.line(2, "while frontier:")
+		else:
+			self.line(2, "while frontier and count < %d:" % sym.To)
+
+		self.line(3, "count += 1")
+		self.line(3, "found = []")
+		self.line(3, "for start, items in frontier:")
+		indent = self.each(sym.symbols[0], "start", "e", "node", 4, 0)
+
+		if sym.To == -1:
+			self.line(indent, "if e == start:")
+			self.line(indent + 1, "raise InfiniteStateExpansion(None)")
+
+		self.line(indent, "cell = (node, start, e, items)")
+		self.line(indent, "found.append((e, cell))")
+		if sym.From > 1:
+			self.line(indent, "if count >= %d:" % sym.From)
+			self.line(indent + 1, "out.append((e, cell))")
+		else:
+			self.line(indent, "out.append((e, cell))")
+		self.line(3, "frontier = found")
+
+	def operatorsCode(self, sym):
+		# Operands are linked lists (node, None) for the first and
+		# (node, (operator, previous)) for the others.
+		self.line(2, "frontier = []")
+		indent = self.each(sym.symbols[0], "pos", "e", "node", 2, 0)
+		self.line(indent, "cell = (node, None)")
+		self.line(indent, "frontier.append((e, cell))")
+		self.line(indent, "out.append((e, cell))")
+		self.line()
+		self.line(2, "while frontier:")
+		self.line(3, "found = []")
+		self.line(3, "for start, items in frontier:")
+		indent = self.each(sym.symbols[1], "start", "e0", "op", 4, 0)
+		indent = self.each(sym.symbols[0], "e0", "e", "node", indent, 1)
+		self.line(indent, "if e == start:")
+		self.line(indent + 1, "raise InfiniteStateExpansion(None)")
+		self.line(indent, "cell = (node, (op, items))")
+		self.line(indent, "found.append((e, cell))")
+		self.line(indent, "out.append((e, cell))")
+		self.line(3, "frontier = found")
+
+	def resultCode(self):
+		self.lines = []
+
+		self.line(0, "def _results(context, texts, values):")
+		self.line(1, "\"\"\"")
+		self.line(2, "Get the function that builds the result of the start symbol")
+		self.line(2, "from its node.")
+		self.line(1, "\"\"\"")
+
+		for i, sym in enumerate(self.symbols):
+			self.line()
+			self.line(1, "# %s" % _oneLine(sym.name))
+			self.line(1, "def _r%d(node):" % i)
+
+			if isinstance(sym, operators):
+				self.operatorsResult(sym)
+				continue
+
+			if isinstance(sym, token):
+				self.line(2, "res = values[node]")
+			elif isinstance(sym, chain):
+				self.line(2, "res = [%s]" % ", ".join("_r%d(node[%d])" % (self.symbolId(s), k) for k, s in enumerate(sym.symbols)))
+			elif isinstance(sym, repeat):
+				self.repeatResult(sym)
+			else:
+				self.line(2, "alternative, node = node")
+				for k, sub in enumerate(sym.symbols):
+					self.line(2, "%s alternative == %d:" % ("if" if k == 0 else "elif", k))
+					self.line(3, "res = _r%d(node)" % self.symbolId(sub))
+
+			if sym.merger:
+				self.line(2, "return %s(res, **context)" % self.reference(sym.merger, sym))
+			else:
+				self.line(2, "return res")
+
+		self.line()
+		self.line(1, "return _r%d" % self.symbolId(self.grammar.startSymbol))
+
+		return self.lines
+
+	def repeatResult(self, sym):
+		self.line(2, "items = []")
+		self.line(2, "while node is not None:")
+		self.line(3, "items.append(node)")
+		self.line(3, "node = node[3]")
+		self.line(2, "items.reverse()")
+
+		bulkMerger = sym.bulkMerger or sym.symbols[0].bulkMerger
+
+		if bulkMerger:
+			self.line(2, "res = %s([\"\".join(texts[item[1]:item[2]]) for item in items], **context)" % self.reference(bulkMerger, sym))
+		else:
+			self.line(2, "res = [_r%d(item[0]) for item in items]" % self.symbolId(sym.symbols[0]))
+
+	def operatorsResult(self, sym):
+		mergers = [merger or sym.merger for associativity, merger in sym.levels]
+
+		self.line(2, "nodes = []")
+		self.line(2, "while True:")
+		self.line(3, "nodes.append(node[0])")
+		self.line(3, "if node[1] is None:")
+		self.line(4, "break")
+		self.line(3, "op, node = node[1]")
+		self.line(3, "nodes.append(op)")
+		self.line(2, "nodes.reverse()")
+		self.line()
+		self.line(2, "levels = %r" % sym.operatorLevels)
+		self.line(2, "left = %r" % [associativity == "left" for associativity, merger in sym.levels])
+		self.line(2, "mergers = [%s]" % ", ".join(self.reference(m, sym) if m else "None" for m in mergers))
+		self.line()
+		self.line(2, "values = [_r%d(nodes[0])]" % self.symbolId(sym.symbols[0]))
+		self.line(2, "pending = []")
+		self.line()
+		self.line(2, "def reduce():")
+		self.line(3, "op, level = pending.pop()")
+		self.line(3, "right = values.pop()")
+		self.line(3, "if mergers[level] is None:")
+		self.line(4, "values[-1] = [values[-1], op, right]")
+		self.line(3, "else:")
+		self.line(4, "values[-1] = mergers[level]([values[-1], op, right], **context)")
+		self.line()
+		self.line(2, "for i in range(1, len(nodes), 2):")
+		self.line(3, "level = levels[nodes[i][0]]")
+		self.line()
+		self.line(3, "while pending and (pending[-1][1] < level or (pending[-1][1] == level and left[level])):")
+		self.line(4, "reduce()")
+		self.line()
+		self.line(3, "pending.append((_r%d(nodes[i]), level))" % self.symbolId(sym.symbols[1]))
+		self.line(3, "values.append(_r%d(nodes[i + 1]))" % self.symbolId(sym.symbols[0]))
+		self.line()
+		self.line(2, "while pending:")
+		self.line(3, "reduce()")
+		self.line()
+		self.line(2, "return values[0]")
 
 
 # Utils
@@ -1282,6 +5364,269 @@ def flatten(lists):
 
 	return res
 
+def _qualifiedName(cls):
+	"""
+		Get the dotted name of a class within its module, also for
+		classes nested in other classes.
+	"""
+	if hasattr(cls, "__qualname__"):
+		return cls.__qualname__
+
+	module = sys.modules[cls.__module__]
+
+	if getattr(module, cls.__name__, None) is cls:
+		return cls.__name__
+
+	for name, item in vars(module).items():
+		if isinstance(item, type) and getattr(item, cls.__name__, None) is cls:
+			return "%s.%s" % (name, cls.__name__)
+
+	raise TypeError("Can't find class %s in module %s." % (cls.__name__, cls.__module__))
+
+# Grammars loaded in the processes of parallelParse, by their data.
+_segmentGrammars = {}
+
+def _parseSegment(task):
+	"""
+		Parse the items of a segment for grammar.parallelParse, None if
+		the segment doesn't end where a token of the whole text ends, 
+		unless it is the last one.
+	"""
+	data, text, context, last = task
+
+	gr = _segmentGrammars.get(data)
+	if gr is None:
+		gr = _segmentGrammars[data] = grammar.loads(data)
+
+	# Errors are not passed on, since they can't be pickled. The 
+	# text is parsed again to raise them then.
+	try:
+		if not last and not gr.segmentLexes(text):
+			return None
+		return list(gr.iterparse(text, context))
+	except Exception:
+		return None
+
+def _cellContents(cell):
+	"""
+		The object in a closure cell, None if it is empty.
+	"""
+	try:
+		return cell.cell_contents
+	except ValueError:
+		return None
+
+def _globalNames(code):
+	"""
+		The names code and the code nested in it could look up as 
+		globals.
+	"""
+	names = set(code.co_names)
+
+	for const in code.co_consts:
+		if isinstance(const, types.CodeType):
+			names |= _globalNames(const)
+
+	return names
+
+def _dottedName(obj):
+	"""
+		The qualified name of a class, the name of anything else.
+	"""
+	if isinstance(obj, (type, types.ClassType)):
+		try:
+			return _qualifiedName(obj)
+		except (TypeError, KeyError):
+			pass
+
+	return getattr(obj, "__name__", None)
+
+def _fingerprint(gr):
+	"""
+		Hash the symbols, lexer states and mergers of a grammar, to
+		tell grammars apart in a parseCache across processes.
+
+		Functions are described by their code, defaults, the contents
+		of their closures and the globals they use, types and builtins
+		by their module and name.
+	"""
+	seen = {}
+	described = []
+
+	def describe(obj):
+		if isinstance(obj, (basestring, int, long, float, bool, type(None))):
+			return obj
+		if isinstance(obj, (list, tuple)):
+			return tuple(describe(i) for i in obj)
+		if isinstance(obj, dict):
+			return tuple(sorted((describe(k), describe(v)) for k, v in obj.items()))
+		if isinstance(obj, types.ModuleType):
+			return ("module", obj.__name__)
+
+		if not id(obj) in seen:
+			seen[id(obj)] = len(seen)
+			described.append(None)
+			described[seen[id(obj)]] = describeObject(obj)
+
+		return ("ref", seen[id(obj)])
+
+	def describeObject(obj):
+		if isinstance(obj, (symbol, lexerState)):
+			return (obj.__class__.__name__, [(k, describe(v)) for k, v in sorted(vars(obj).items()) if k != "regexp"])
+
+		if isinstance(obj, types.FunctionType):
+			code = hashlib.sha1(marshal.dumps(obj.__code__)).hexdigest()
+			cells = [describe(_cellContents(c)) for c in obj.__closure__ or ()]
+			used = sorted((name, describe(obj.__globals__[name])) for name in _globalNames(obj.__code__) if name in obj.__globals__)
+			return ("function", obj.__module__, obj.__name__, code, describe(obj.__defaults__), cells, used)
+
+		if isinstance(obj, types.MethodType):
+			return ("method", describe(obj.im_func), describe(obj.im_self))
+
+		if isinstance(obj, (type, types.ClassType, types.BuiltinFunctionType)):
+			return ("named", getattr(obj, "__module__", None), _dottedName(obj))
+
+		if hasattr(obj, "__dict__"):
+			return (obj.__class__.__module__, _dottedName(obj.__class__), describe(vars(obj)))
+
+		return (obj.__class__.__module__, _dottedName(obj.__class__), repr(obj))
+
+	describe([gr.startSymbol, gr.lexerStartState, gr.lexerStates])
+	return hashlib.sha1(repr((_qualifiedName(gr.__class__), described))).hexdigest()
+
+def _oneLine(text):
+	"""
+		Text on one line, for comments in generated code.
+	"""
+	return " ".join(text.split())
+
+def _refersToGroups(parsed):
+	"""
+		Weather a parsed regexp refers to its groups by number or
+		name, which breaks when it is combined with others.
+	"""
+	stack = [parsed]
+
+	while stack:
+		item = stack.pop()
+
+		if isinstance(item, sre_parse.SubPattern):
+			stack.extend(item.data)
+		elif isinstance(item, (list, tuple)):
+			if len(item) == 2 and item[0] in (sre_constants.GROUPREF, sre_constants.GROUPREF_EXISTS):
+				return True
+			stack.extend(item)
+
+	return False
+
+def _findByName(module, name):
+	"""
+		Get an object by its module and dotted name.
+	"""
+	__import__(module)
+	obj = sys.modules[module]
+
+	for part in name.split("."):
+		obj = getattr(obj, part)
+
+	return obj
+
+# numpy is only imported on first use, since that takes longer
+# than importing this module, see _numpy.
+_numpyModule = False
+
+def _numpy():
+	"""
+		Get the numpy module, None if it is not installed.
+	"""
+	global _numpyModule
+
+	if _numpyModule is False:
+		try:
+			import numpy
+		except ImportError:
+			numpy = None
+		_numpyModule = numpy
+
+	return _numpyModule
+
+# Weather numpy is installed, see _numpyInstalled.
+_numpyFound = None
+
+def _numpyInstalled():
+	"""
+		Check weather numpy is installed without importing it.
+	"""
+	global _numpyFound
+
+	if _numpyModule is not False:
+		return _numpyModule is not None
+
+	if _numpyFound is None:
+		_numpyFound = pkgutil.find_loader("numpy") is not None
+
+	return _numpyFound
+
+def numericArray(lexemes, dtype = float, **context):
+	"""
+		Convert the texts of numbers to an array of dtype at once, to
+		be used as bulkMerger. Returns a list if numpy is missing. The
+		context of the parse is ignored.
+	"""
+	numpy = _numpy()
+
+	if numpy is None:
+		return [dtype(l) for l in lexemes]
+
+	if len(lexemes) == 0:
+		return numpy.zeros(0, dtype = dtype)
+
+	return numpy.array(lexemes).astype(dtype)
+
+def _adjustCodeOutput(text, pos = 0, width = None):
+	"""
+		Show the first line of text from pos, with leading empty lines 
+		as \\n. Lines are cut after width characters.
+	"""
+	end = len(text) if width is None else min(len(text), pos + width)
+	newLinePos = text.find("\n", pos, end)
+	if newLinePos == -1:
+		return text[pos:end]
+
+	if text[pos:newLinePos].strip() == "":
+		return "\\n" + _adjustCodeOutput(text, newLinePos + 1, width)
+
+	return text[pos:newLinePos]
+
+def _deepSize(obj, seen, exclude = None):
+	"""
+		Estimate the bytes used by obj and the objects it references,
+		without the objects of grammars and tracers. Ids of the objects 
+		counted are added to seen, ids in exclude are not counted.
+	"""
+	size = 0
+	stack = [obj]
+
+	while stack:
+		o = stack.pop()
+
+		if id(o) in seen or (exclude and id(o) in exclude) or isinstance(o, _sharedTypes):
+			continue
+
+		seen.add(id(o))
+		size += sys.getsizeof(o)
+
+		if isinstance(o, dict):
+			stack.extend(o.iterkeys())
+			stack.extend(o.itervalues())
+		elif isinstance(o, (list, tuple, set, frozenset)):
+			stack.extend(o)
+
+		if hasattr(o, "__dict__"):
+			stack.append(o.__dict__)
+
+	return size
+
 def flattenIter(lists):
 	"""
 		Iterate over the flattened lists.
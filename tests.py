@@ -1,5 +1,19 @@
 from parsr import *
 import unittest
+import imp
+import math
+import os
+import sys
+import subprocess
+import tempfile
+import time
+import warnings
+from StringIO import StringIO
+
+try:
+	import numpy
+except ImportError:
+	numpy = None
 
 class myTestCase(unittest.TestCase):
 	@classmethod
@@ -226,7 +240,7 @@ class omitTests(tokenTests):
 
 
 class stateTests(myTestCase):
-	tests = ["parse"]
+	tests = ["parse", "frontier", "sweep"]
 
 	def parse(self):
 		t1 = token("a")
@@ -249,6 +263,45 @@ class stateTests(myTestCase):
 
 		self.assertRaises(SyntaxError, t.parse, "a b c /ba")
 		self.assertRaises(SyntaxError, t.parse, "ab c /b a")
+
+	def frontier(self):
+		a, b, c = token("a"), token("b"), token("c")
+		gr = grammar.fromSymbol(oneOf([chain([a, b]), chain([a, c]), chain([b, c])]))
+		root = parserRootState(gr.startSymbol)
+
+		self.assertEqual(sorted(len(l) for l in root.waiting.values()), [1, 2])
+
+		root.pushToken(gr.lex("a")[0])
+		self.assertEqual(sorted(root.waiting.keys()), sorted([b, c]))
+		self.assertEqual(len(root.lastTokens), 3)
+
+		root.pushToken(gr.lex("c")[0])
+		self.assertEqual(root.waiting, {})
+		self.assertEqual(root.result({}), ["a", "c"])
+
+		with self.assertRaises(StatesExhausted) as cm:
+			root.pushToken(gr.lex("c")[0])
+		self.assertEqual(set(l.symbol for l in cm.exception.expectedTokens), set([b, c]))
+
+	def sweep(self):
+		class counter(tracer):
+			def __init__(self):
+				self.invalid = []
+			def stateInvalid(self, state):
+				self.invalid.append(state)
+
+		a, b = token("a"), token("b")
+		gr = grammar.fromSymbol(oneOf([chain([a, a]) for i in range(5)] + [chain([b, a])]))
+		rec = counter()
+		root = parserRootState(gr.startSymbol, tracer = rec)
+
+		root.pushToken(gr.lex("b")[0])
+
+		alternatives = root._possibilities[0]._possibilities
+		self.assertEqual([s.symbol.symbols[0] for s in alternatives], [b])
+		self.assertEqual(len(rec.invalid), 10)
+		self.assertTrue(all(s.detached for s in rec.invalid))
+		self.assertFalse(any(s.detached for s in alternatives))
 		
 
 
@@ -362,17 +415,1669 @@ class grammarTests(myTestCase):
 		self.assertEqual(self.parser.parse("1 + 2 /* foobar */"), 3)
 
 class generalTests(myTestCase):
-	tests = ["infiniteExpansion"]
+	tests = ["infiniteExpansion", "nestedOptional", "repeatedOptional"]
 
 	def infiniteExpansion(self):
 		a = repeat(definedLater("b"))
 		b = repeat(a)
 		a.define("b", b)
 
-		gr = grammar.fromSymbol(a)
+		with warnings.catch_warnings():
+			warnings.simplefilter("ignore", GrammarWarning)
+			gr = grammar.fromSymbol(a)
 
 		self.assertRaises(InfiniteStateExpansion, gr.parse, "")
 
+	def nestedOptional(self):
+		a = token("a")
+		b = token("b")
+
+		self.assertEqual(grammar.fromSymbol(optional(optional(a))).parse("a"), [["a"]])
+		self.assertEqual(grammar.fromSymbol(chain([optional(optional(a)), b])).parse("ab"), [[["a"]], "b"])
+
+	def repeatedOptional(self):
+		b = token("b")
+
+		self.assertEqual(grammar.fromSymbol(repeat(optional(b), 0, 1)).parse("b"), [["b"]])
+		self.assertEqual(grammar.fromSymbol(chain([repeat(optional(b), 0, 1), b])).parse("bb"), [[["b"]], "b"])
+		self.assertEqual(grammar.fromSymbol(repeat(repeat(b, 0), 1, 1)).parse("bb"), [["b", "b"]])
+
+class bnfTests(myTestCase):
+	tests = ["differential", "fromTo", "errors", "decorator"]
+
+	valid = ["a", "a b", "(a b)", "a|b c", "a b|c", "?a", "*a", "{1,}*a",
+			"{,3}*a", "{1,2}*a", "{,}*a", "?a|b", "*a|(b c)", "a|b|c",
+			"((a))", "a1 b_2", " a  b ", "*(a|b)", "?(a b)|c d",
+			"lp operator expr expr rp", "mulOperation | addOperation ?comment",
+			"?minus {1,}*oneNumber", "a/b", "a/b/c", "?a/(b c) d", "(a|b)/c"]
+
+	invalid = ["", "*?a", "a||b", "(a", "a)", "1", "a\tb", "{2}*a", "??a",
+			"|a", "a|", "a,b", "{a,}*b", "a/", "a//b", "a|b/c", "a/b|c"]
+
+	def describe(self, sym):
+		if isinstance(sym, definedLater):
+			return sym.name
+		if isinstance(sym, optional):
+			return ("?", self.describe(sym.symbols[0]))
+		if isinstance(sym, repeat):
+			return ("*", sym.From, sym.To, self.describe(sym.symbols[0]))
+		if isinstance(sym, oneOf):
+			return ("/" if sym.ordered else "|",) + tuple(self.describe(i) for i in sym.symbols)
+		if isinstance(sym, chain):
+			return ("()",) + tuple(self.describe(i) for i in sym.symbols)
+		self.fail("Unexpected symbol %s" % sym)
+
+	def differential(self):
+		for text in self.valid:
+			self.assertEqual(self.describe(fastBnfParser(text).parse()),
+							self.describe(referenceBnfParser().parse(text)))
+
+	def fromTo(self):
+		self.assertEqual(self.describe(symbol("{,3}*a")), ("()", ("*", 0, 3, "a")))
+		self.assertEqual(self.describe(symbol("{2,}*a")), ("()", ("*", 2, -1, "a")))
+
+	def errors(self):
+		reference = referenceBnfParser()
+
+		for text in self.invalid:
+			self.assertRaises(BNFError, symbol, text)
+			self.assertRaises(SyntaxError, reference.parse, text)
+
+	def decorator(self):
+		@symbol("a b")
+		def ab(res):
+			return "AB"
+
+		self.assertTrue(isinstance(ab, chain))
+		self.assertEqual(ab.merger([]), "AB")
+
+class statsTests(myTestCase):
+	tests = ["counts", "mergers", "times", "report"]
+
+	def counts(self):
+		stats = parseStats()
+		gr = grammar.fromSymbol(repeat(oneOf([token("a"), token("[ab]")])))
+
+		self.assertEqual(gr.parse("ab", stats = stats), ["a", "b"])
+		self.assertEqual(stats.tokens, 2)
+		self.assertEqual(len(stats.liveStates), 2)
+		self.assertEqual(stats.byType(stats.created)["token"], 6)
+		self.assertEqual(stats.invalidated['"a"'], 1)
+		self.assertTrue(stats.byType(stats.forked)["oneOf"] > 0)
+		self.assertTrue(stats.peakTreeSize >= max(stats.liveStates))
+
+	def mergers(self):
+		stats = parseStats()
+		self.assertEqual(grammarTests.lang().parse("1 + 2", stats = stats), 3)
+
+		self.assertEqual(stats.mergerCalls["number"], 2)
+		self.assertEqual(stats.mergerCalls["startSymbol"], 1)
+		self.assertFalse("oneNumber" in stats.mergerCalls)
+		self.assertEqual(set(stats.mergerTime), set(stats.mergerCalls))
+
+	def times(self):
+		stats = parseStats()
+		grammarTests.lang().parse("1 + 2", stats = stats)
+
+		self.assertTrue(stats.lexTime > 0)
+		self.assertTrue(stats.parseTime > 0)
+		self.assertTrue(stats.resultTime >= sum(stats.mergerTime.values()))
+
+	def report(self):
+		stats = parseStats()
+		grammarTests.lang().parse("1 + 2", stats = stats)
+
+		self.assertTrue("3 tokens" in str(stats))
+
+class tracerTests(myTestCase):
+	tests = ["verbose", "events", "binary", "combined", "noTracer"]
+
+	def verbose(self):
+		out = StringIO()
+		gr = grammar.fromSymbol(chain([token("a"), token("b")]))
+		gr.parse("ab", tracer = verboseTracer(out))
+		lines = out.getvalue().split("\n")
+
+		self.assertTrue("---> 2 tokens found." in lines)
+		self.assertTrue("--> Push result from token \"b\" at position 2: b" in lines)
+		self.assertTrue("In chain:" in lines)
+		self.assertTrue("|   \"a\": Checking a --> success" in lines)
+		self.assertTrue("chain: Valid subsymbol \"b\" at position 1 found" in lines)
+
+		# Only the start of the remaining text is shown.
+		out = StringIO()
+		a = token("a")
+		gr = grammar.fromSymbol(repeat(a), lexerStates = [lexerState([a], [token("\\s+")])])
+		gr.parse("\n" + "a" * 1000, tracer = verboseTracer(out))
+		lines = out.getvalue().split("\n")
+
+		self.assertTrue("Remaining Text starts at: '\\n%s'" % ("a" * 80) in lines)
+		self.assertTrue("Remaining Text starts at: '%s'" % ("a" * 80) in lines)
+		self.assertTrue(max(len(l) for l in lines) < 200)
+
+	def events(self):
+		class recorder(tracer):
+			def __init__(self):
+				self.events = []
+			def tokenPushed(self, match, index):
+				self.events.append(("token", match.text, index))
+			def stateValid(self, state):
+				self.events.append(("valid", state.symbol.name))
+			def stateInvalid(self, state):
+				self.events.append(("invalid", state.symbol.name))
+
+		rec = recorder()
+		gr = grammar.fromSymbol(oneOf([token("a"), token("b")]))
+		self.assertEqual(gr.parse("b", tracer = rec), "b")
+		self.assertEqual(rec.events, [("token", "b", 0), ("valid", '"b"'), ("valid", "oneOf"), ("invalid", '"a"'), ("invalid", "oneOf")])
+
+	def binary(self):
+		out = StringIO()
+		stats = parseStats()
+		grammarTests.lang().parse("1 + 2", stats = stats, tracer = binaryTracer(out))
+
+		records = list(readTrace(StringIO(out.getvalue())))
+		kinds = [r[0] for r in records]
+
+		self.assertEqual(kinds.count("token"), stats.tokens)
+		self.assertEqual(kinds.count("spawned"), sum(stats.created.values()))
+		self.assertEqual(kinds.count("forked"), sum(stats.forked.values()))
+		self.assertEqual(kinds.count("invalid"), sum(stats.invalidated.values()))
+		self.assertEqual(kinds.count("merged"), sum(stats.mergerCalls.values()))
+		self.assertEqual(records[0], ("spawned", 1, 0, "startSymbol"))
+		self.assertTrue(("token", 1, "plus", 2, 3) in records)
+
+	def combined(self):
+		out = StringIO()
+		gr = grammarTests.lang()
+		gr.verbose = True
+
+		stdout = sys.stdout
+		sys.stdout = out
+		try:
+			stats = parseStats()
+			self.assertEqual(gr.parse("1 + 2", stats = stats), 3)
+		finally:
+			sys.stdout = stdout
+
+		self.assertEqual(stats.tokens, 3)
+		self.assertTrue("== Start parsing. ==" in out.getvalue())
+
+	def noTracer(self):
+		gr = grammar.fromSymbol(token("a"))
+		self.assertTrue(gr.getTracer() is None)
+		self.assertTrue(gr.getTracer(None, None) is None)
+
+		t = tracer()
+		self.assertTrue(gr.getTracer(None, t) is t)
+		self.assertTrue(isinstance(gr.getTracer(t, tracer()), multiTracer))
+
+class streamTests(myTestCase):
+	tests = ["items", "bounded", "lazy", "ambiguity", "fromTo", "errors"]
+
+	class statements(grammar):
+		space = token("[ ]+")
+		name = token("[a-z]+")
+		number = token("[0-9]+")
+		equals = token("=")
+		semicolon = token(";")
+
+		lexerStartState = lexState(["name", "number", "equals", "semicolon"], ["space"])
+
+		@symbol("name equals number semicolon")
+		def statement(res):
+			return (res[0], int(res[2]))
+
+		startSymbol = symbol("{,}*statement")
+
+	class longestList(tracer):
+		"""
+			Longest list of items kept by the repetition.
+		"""
+		def __init__(self):
+			self.longest = 0
+
+		def tokenProcessed(self, root):
+			for s in root._possibilities + root.validPossibilities:
+				for l in s.results.itervalues():
+					self.longest = max(self.longest, len(l))
+
+	def items(self):
+		gr = self.statements()
+		text = "a = 1; b = 2; c = 3;"
+
+		self.assertEqual(list(gr.iterparse(text)), [("a", 1), ("b", 2), ("c", 3)])
+		self.assertEqual(gr.parse(text), [[("a", 1), ("b", 2), ("c", 3)]])
+		self.assertEqual(list(gr.iterparse("")), [])
+
+	def bounded(self):
+		probe = self.longestList()
+		count = 0
+
+		for item in self.statements().iterparse("x = 1; " * 200, tracer = probe):
+			count += 1
+
+		self.assertEqual(count, 200)
+		self.assertEqual(probe.longest, 1)
+
+	def lazy(self):
+		items = self.statements().iterparse("a = 1; b = 2; c = ")
+
+		self.assertEqual(items.next(), ("a", 1))
+		self.assertEqual(items.next(), ("b", 2))
+		self.assertRaises(NotCompleted, items.next)
+
+		items = self.statements().iterparse("a = 1; b ! 2;")
+		self.assertEqual(items.next(), ("a", 1))
+		self.assertRaises(LexerError, items.next)
+
+	def ambiguity(self):
+		a = token("a")
+		b = token("b")
+		gr = grammar.fromSymbol(repeat(oneOf([chain([a, b], lambda r: "ab"), a])))
+		probe = self.longestList()
+
+		# Every a could be an item or the start of one, so one
+		# item is kept until the next token decides.
+		self.assertEqual(list(gr.iterparse("aabab", tracer = probe)), ["a", "ab", "ab"])
+		self.assertEqual(probe.longest, 2)
+
+		gr = grammar.fromSymbol(repeat(oneOf([a, a])))
+		self.assertRaises(AmbigiousResults, list, gr.iterparse("aa"))
+
+	def fromTo(self):
+		gr = grammar.fromSymbol(repeat(token("a"), From = 2, To = 3))
+
+		self.assertEqual(list(gr.iterparse("aaa")), ["a", "a", "a"])
+		self.assertRaises(StatesExhausted, list, gr.iterparse("aaaa"))
+		self.assertRaises(NotCompleted, list, gr.iterparse("a"))
+
+	def errors(self):
+		gr = grammar.fromSymbol(chain([token("a"), token("b")]))
+		self.assertRaises(TypeError, gr.iterparse("ab").next)
+
+class incrementalTests(myTestCase):
+	tests = ["edits", "reuse", "successive", "shared", "errors", "limited"]
+
+	def document(self, count):
+		return "".join("v = %d; " % i for i in range(count))
+
+	def check(self, gr, previous, start, end, replacement):
+		parse = gr.reparse(previous, start, end, replacement)
+		text = previous.text[:start] + replacement + previous.text[end:]
+		full = gr.parseIncremental(text)
+
+		self.assertEqual(parse.text, text)
+		self.assertEqual(parse.items, full.items)
+		self.assertEqual(parse.checkpoints, full.checkpoints)
+		return parse
+
+	def edits(self):
+		gr = streamTests.statements()
+		previous = gr.parseIncremental(self.document(20))
+		middle = previous.checkpoints[10][0]
+
+		self.check(gr, previous, middle, middle, "new = 1; ")
+		self.check(gr, previous, middle, previous.checkpoints[12][0], "")
+		self.check(gr, previous, middle + 5, middle + 6, "17")
+		self.check(gr, previous, 0, 0, "first = 0; ")
+		self.check(gr, previous, len(previous.text), len(previous.text), "last = 0;")
+		self.check(gr, previous, 0, len(previous.text), "")
+
+	def reuse(self):
+		gr = streamTests.statements()
+
+		for count in (50, 500):
+			previous = gr.parseIncremental(self.document(count))
+			middle = previous.checkpoints[count // 2][0]
+			parse = self.check(gr, previous, middle + 4, middle + 5, "42")
+
+			self.assertEqual(previous.reparsed, count)
+			self.assertTrue(parse.reparsed <= 3)
+
+	def successive(self):
+		gr = streamTests.statements()
+		parse = gr.parseIncremental(self.document(10))
+
+		for i in range(10):
+			pos = parse.checkpoints[i][0]
+			parse = self.check(gr, parse, pos, pos, "x = %d; " % i)
+
+		self.assertEqual(len(parse.items), 20)
+
+	def shared(self):
+		# Edits share the text, items and checkpoints of the first
+		# parse instead of copying or shifting them.
+		gr = streamTests.statements()
+		parse = first = gr.parseIncremental(self.document(1000))
+
+		for i in range(100):
+			pos = parse.pieces[2][500][0]
+			parse = gr.reparse(parse, pos + 4, pos + 5 + i % 2, "%d" % (i * 7))
+
+		for pieces, firstPieces in zip(parse.pieces, first.pieces):
+			self.assertTrue(len(pieces.slices) <= 3)
+			self.assertTrue(pieces.slices[0][0] is firstPieces.slices[0][0])
+			self.assertTrue(pieces.slices[-1][0] is firstPieces.slices[0][0])
+
+		full = gr.parseIncremental(parse.text)
+		self.assertEqual((parse.items, parse.checkpoints), (full.items, full.checkpoints))
+
+	def errors(self):
+		gr = streamTests.statements()
+		previous = gr.parseIncremental(self.document(10))
+		middle = previous.checkpoints[5][0]
+
+		self.assertRaises(StatesExhausted, gr.reparse, previous, middle, middle, "= ;")
+		self.assertRaises(LexerError, gr.reparse, previous, middle, middle, "!")
+		self.assertRaises(NotCompleted, gr.reparse, previous, len(previous.text), len(previous.text), "x =")
+
+	def limited(self):
+		gr = grammar.fromSymbol(repeat(token("[ab]"), To = 5))
+		previous = gr.parseIncremental("ababa")
+
+		self.assertEqual(self.check(gr, previous, 4, 5, "b").items, list("ababb"))
+		self.assertRaises(StatesExhausted, gr.reparse, previous, 2, 2, "a")
+
+class sessionTests(myTestCase):
+	tests = ["chunks", "positions", "comments", "split", "farAhead", "errors", "closed"]
+
+	class numbers(grammar):
+		space = token("[ ]+")
+		comma = token(",")
+		lBracket = token("\\[")
+		rBracket = token("\\]")
+		dot = token("[.]")
+
+		@token("-?\d+([.]\d+)?")
+		def number(res):
+			return float(res)
+
+		lexerStartState = lexState(["comma", "lBracket", "rBracket", "number", "dot"], ["space"])
+
+		@symbol("{,}*(lBracket | comma | number | rBracket | dot)")
+		def startSymbol(res):
+			return [r[0] for r in res[0] if isinstance(r[0], float)]
+
+	def feed(self, gr, text, size):
+		session = gr.session()
+		for i in range(0, len(text), size):
+			session.feed(text[i:i + size])
+		return session.close()
+
+	def chunks(self):
+		gr = streamTests.statements()
+		text = "abc = 123; de = 45;  f = 6;"
+
+		for size in (1, 2, 3, 7, len(text)):
+			self.assertEqual(self.feed(gr, text, size), gr.parse(text))
+
+		gr = grammarTests.lang()
+		self.assertEqual(self.feed(gr, "12 + 34", 1), gr.parse("12 + 34"))
+
+	def positions(self):
+		class positions(tracer):
+			def __init__(self):
+				self.spans = []
+			def tokenPushed(self, match, index):
+				self.spans.append((index, match.start, match.end))
+
+		gr = streamTests.statements()
+		text = "a = 1; " * 20
+		probe = positions()
+		session = gr.session(tracer = probe)
+
+		for c in text:
+			session.feed(c)
+		session.close()
+
+		self.assertEqual(probe.spans[-1], (79, len(text) - 2, len(text) - 1))
+		self.assertTrue(len(session.buffer) <= session.lookBehind + 1)
+
+	def comments(self):
+		# Lexer states and tokens looking behind survive the chunks.
+		text = "1 + 2 /* a * b / c */"
+		self.assertEqual(self.feed(grammarTests.lang(), text, 1), 3)
+
+	def split(self):
+		# More text could make a token longer or let an earlier one 
+		# match, even if the token doesn't reach the end of the chunk.
+		gr = self.numbers()
+
+		session = gr.session()
+		session.feed("[1.")
+		self.assertEqual(session.tokens, 1)
+		session.feed("5, 2]")
+		self.assertEqual(session.close(), gr.parse("[1.5, 2]"))
+
+		text = "[1.5, 22, -3.25, 4]"
+		for size in range(1, len(text)):
+			self.assertEqual(self.feed(gr, text, size), [1.5, 22, -3.25, 4])
+
+		# Tokens not looking past the end are parsed right away.
+		session = gr.session()
+		session.feed("[1.5, 22, ")
+		self.assertEqual(session.tokens, 5)
+
+	def farAhead(self):
+		class lazy(grammar):
+			a = token("a")
+			ab = token("a*b")
+			lexerStartState = lexState(["ab", "a"])
+			startSymbol = symbol("{1,}*(a | ab)")
+
+		# a*b could look ahead past any number of a.
+		session = lazy().session()
+		session.feed("aaaa")
+		self.assertEqual(session.tokens, 0)
+		session.feed("ab")
+		self.assertEqual(session.close(), lazy().parse("aaaaab"))
+
+	def errors(self):
+		gr = streamTests.statements()
+
+		session = gr.session()
+		session.feed("a = 1;")
+		self.assertRaises(StatesExhausted, session.feed, " = ")
+
+		session = gr.session()
+		session.feed("a = 1; !")
+		self.assertRaises(LexerError, session.close)
+
+		session = gr.session()
+		session.feed("a = 1; b =")
+		self.assertRaises(NotCompleted, session.close)
+
+	def closed(self):
+		session = streamTests.statements().session()
+		session.feed("a = 1;")
+		self.assertEqual(session.close(), [[("a", 1)]])
+		self.assertRaises(ValueError, session.feed, "b = 2;")
+		self.assertRaises(ValueError, session.close)
+
+class spanTests(myTestCase):
+	tests = ["tree", "noMergers", "empty", "deep", "ambiguous"]
+
+	def walk(self, tree, node = 0):
+		return (tree.name(node), tree.lexeme(node), [self.walk(tree, c) for c in tree.children(node)])
+
+	def tree(self):
+		text = "a = 1;  bc = 23;"
+		tree = streamTests.statements().parseSpans(text)
+
+		self.assertEqual(tree.name(0), "startSymbol")
+		self.assertEqual(tree.lexeme(0), text)
+		self.assertEqual(list(tree.tokenStart), [0, 2, 4, 5, 8, 11, 13, 15])
+
+		statements = list(tree.children(list(tree.children(0))[0]))
+		self.assertEqual([tree.name(n) for n in statements], ["statement", "statement"])
+		self.assertEqual([tree.span(n) for n in statements], [(0, 6), (8, 16)])
+		self.assertEqual(self.walk(tree, statements[1]), ("statement", "bc = 23;", [
+							("name", "bc", []), ("equals", "=", []), ("number", "23", []), ("semicolon", ";", [])]))
+
+	def noMergers(self):
+		def fail(res):
+			raise AssertionError("Merger called.")
+
+		gr = grammar.fromSymbol(chain([token("a", fail), repeat(token("b"), merger = fail)], fail))
+		tree = gr.parseSpans("abb")
+
+		self.assertEqual(self.walk(tree), ("chain", "abb", [("\"a\"", "a", []), ("repeat", "bb", [("\"b\"", "b", []), ("\"b\"", "b", [])])]))
+
+	def empty(self):
+		gr = grammar.fromSymbol(chain([token("a"), repeat(token("b")), token("c")]))
+		tree = gr.parseSpans("ac")
+
+		self.assertEqual(len(tree), 4)
+		self.assertEqual(tree.span(2), (1, 1))
+		self.assertEqual(tree.lexeme(2), "")
+		self.assertEqual(list(tree.children(2)), [])
+
+	def deep(self):
+		depth = 300
+		tree = complexityTests.nesting().parseSpans("(" * depth + "a" + ")" * depth)
+
+		self.assertEqual(tree.lexeme(0), "(" * depth + "a" + ")" * depth)
+		self.assertEqual(tree.subtreeEnd[0], len(tree))
+
+	def ambiguous(self):
+		a = token("a")
+		self.assertRaises(AmbigiousResults, grammar.fromSymbol(repeat(oneOf([a, a]))).parseSpans, "a")
+
+class memoryTests(myTestCase):
+	tests = ["estimate", "growth", "failedParse", "traced"]
+
+	def parse(self, text, **kwargs):
+		memory = parseMemory(useTracemalloc = False, **kwargs)
+		self.assertEqual(grammar.fromSymbol(repeat(token("[ab]"))).parse(text, tracer = memory), list(text))
+		return memory
+
+	def estimate(self):
+		memory = self.parse("abaabbab")
+
+		self.assertEqual(memory.method, "estimate")
+		self.assertEqual(memory.inputBytes, 8)
+		self.assertTrue(memory.tokenBytes > 0)
+		self.assertTrue(memory.treeBytes > 0)
+		self.assertTrue(memory.resultBytes > 0)
+		self.assertEqual(memory.peakBytes, memory.tokenBytes + memory.treeBytes + memory.resultBytes)
+		self.assertEqual(memory.perInputByte(), memory.peakBytes / 8.0)
+		self.assertTrue("estimate" in str(memory))
+
+	def growth(self):
+		small = self.parse("ab" * 10)
+		large = self.parse("ab" * 40)
+		sampled = self.parse("ab" * 40, every = 8)
+
+		self.assertTrue(large.tokenBytes > 3 * small.tokenBytes)
+		self.assertTrue(large.peakBytes > 3 * small.peakBytes)
+		self.assertEqual(sampled.treeBytes, large.treeBytes)
+
+	def failedParse(self):
+		memory = parseMemory(useTracemalloc = False)
+		gr = grammar.fromSymbol(chain([token("a"), token("b")]))
+
+		self.assertRaises(NotCompleted, gr.parse, "a", tracer = memory)
+		self.assertTrue(memory.treeBytes > 0)
+		self.assertEqual(memory.resultBytes, 0)
+
+	def traced(self):
+		if tracemalloc is None:
+			self.skipTest("tracemalloc not available")
+
+		memory = parseMemory()
+		grammar.fromSymbol(repeat(token("[ab]"))).parse("ab" * 100, tracer = memory)
+
+		self.assertEqual(memory.method, "tracemalloc")
+		self.assertTrue(memory.peakBytes > 0)
+		self.assertFalse(tracemalloc.is_tracing())
+
+class complexityTests(myTestCase):
+	"""
+		Parse inputs of growing size for grammar shapes that are hard
+		for the parser and check that the work done grows not faster 
+		than declared.
+
+		Bounds are exponents of the size, fitted over all sizes, or 
+		factors per unit of size for shapes that are exponential.
+		Time is measured as well, but gets some slack since it is 
+		noisy on small inputs.
+	"""
+	tests = ["repeatedToken", "ambiguousOption", "optionalChain", "deepNesting", "nestedRepeat"]
+
+	# Slack for exponents fitted from time measurements.
+	timeSlack = 0.5
+
+	class nesting(grammar):
+		startSymbol = symbol("expr")
+		expr = symbol("(leftP expr rightP) | a")
+		a = token("a")
+		leftP = token("[(]")
+		rightP = token("[)]")
+		lexerStartState = lexState(["a", "leftP", "rightP"])
+
+	def measure(self, gr, text):
+		"""
+			Return states created, peak of live states and the best
+			time of some parses of text.
+		"""
+		times = []
+
+		for i in range(3):
+			stats = parseStats()
+			start = time.time()
+			try:
+				gr.parse(text, stats = stats)
+			except ParsrError:
+				pass
+			times.append(time.time() - start)
+
+		return sum(stats.created.values()), max(stats.liveStates), min(times)
+
+	@staticmethod
+	def slope(xs, ys):
+		"""
+			Least squares slope of ys over xs.
+		"""
+		mx = sum(xs) / len(xs)
+		my = sum(ys) / len(ys)
+		return sum((x - mx) * (y - my) for x, y in zip(xs, ys)) / sum((x - mx) ** 2 for x in xs)
+
+	def growth(self, shape, makeGrammar, makeText, sizes, states, seconds = None, exponential = False):
+		"""
+			Check that states created and time grow with sizes at most
+			with the exponents states and seconds, or by the factors 
+			states and seconds per unit of size if exponential.
+		"""
+		rows = []
+		for n in sizes:
+			rows.append((n,) + self.measure(makeGrammar(n), makeText(n)))
+
+		if exponential:
+			xs = [float(r[0]) for r in rows]
+			fit = lambda ys: math.exp(self.slope(xs, [math.log(max(y, 1e-6)) for y in ys]))
+			unit = "factor per unit"
+		else:
+			xs = [math.log(r[0]) for r in rows]
+			fit = lambda ys: self.slope(xs, [math.log(max(y, 1e-6)) for y in ys])
+			unit = "exponent"
+
+		fitted = { "states" : fit([r[1] for r in rows]), "seconds" : fit([r[3] for r in rows]) }
+		bounds = { "states" : states }
+		if seconds is not None:
+			bounds["seconds"] = seconds + self.timeSlack
+
+		failed = [k for k in bounds if fitted[k] > bounds[k]]
+
+		if failed:
+			report = ["Growth of %s exceeds its bounds:" % shape, "%8s %10s %8s %10s" % ("size", "states", "live", "seconds")]
+			for r in rows:
+				report.append("%8d %10d %8d %10.4f" % r)
+			for k in sorted(bounds):
+				report.append("%s %s: %.2f, bound %.2f%s" % (k, unit, fitted[k], bounds[k], " <--" if k in failed else ""))
+			self.fail("\n".join(report))
+
+	def repeatedToken(self):
+		self.growth("a*", lambda n: grammar.fromSymbol(repeat(token("a"))), lambda n: "a" * n,
+					[25, 50, 100, 200], states = 1.1, seconds = 1.0)
+
+	def ambiguousOption(self):
+		# Known to be exponential, every a could be either option and 
+		# all parses are kept, see 20 * 2 ** n - 4 states below.
+		def ambiguous(n):
+			a = token("a")
+			return grammar.fromSymbol(repeat(oneOf([a, a])))
+
+		with warnings.catch_warnings():
+			warnings.simplefilter("ignore", GrammarWarning)
+			self.growth("(a|a)*", ambiguous, lambda n: "a" * n,
+						[2, 3, 4, 5, 6, 7, 8], states = 2.1, exponential = True)
+
+			self.assertEqual([self.measure(ambiguous(n), "a" * n)[0] for n in (5, 8)], [316, 2556])
+
+	def optionalChain(self):
+		self.growth("?a ?a ... ?a", lambda n: grammar.fromSymbol(chain([optional(token("a")) for i in range(n)])), lambda n: "a" * (n // 2),
+					[8, 16, 32, 64], states = 1.1, seconds = 1.0)
+
+	def deepNesting(self):
+		# Every token walks the path down to the innermost leaf.
+		self.growth("(((a)))", lambda n: self.nesting(), lambda n: "(" * n + "a" + ")" * n,
+					[16, 32, 64, 128], states = 1.1, seconds = 2.0)
+
+	def nestedRepeat(self):
+		# Known to be exponential, every a could start a new inner
+		# repetition.
+		with warnings.catch_warnings():
+			warnings.simplefilter("ignore", GrammarWarning)
+			self.growth("(a{1,})*", lambda n: grammar.fromSymbol(repeat(repeat(token("a"), From = 1))), lambda n: "a" * n,
+						[2, 3, 4, 5, 6, 7], states = 2.1, exponential = True)
+
+class limitsTests(myTestCase):
+	tests = ["tokens", "liveStates", "states", "seconds", "grammarLimits", "stats"]
+
+	def nested(self):
+		with warnings.catch_warnings():
+			warnings.simplefilter("ignore", GrammarWarning)
+			return grammar.fromSymbol(repeat(repeat(token("a"), From = 1)))
+
+	def tokens(self):
+		gr = streamTests.statements()
+
+		with self.assertRaises(ParseLimitExceeded) as cm:
+			gr.parse("a = 1; b = 2;", limits = parseLimits(maxTokens = 7))
+
+		self.assertEqual((cm.exception.limit, cm.exception.value, cm.exception.tokens), ("maxTokens", 8, 0))
+		self.assertEqual(gr.parse("a = 1; b = 2;", limits = parseLimits(maxTokens = 8)), [[("a", 1), ("b", 2)]])
+
+		# Lexing stops at the limit, before the error in the text.
+		with self.assertRaises(ParseLimitExceeded) as cm:
+			gr.parse("a = 1; b = 2; !", limits = parseLimits(maxTokens = 4))
+
+		self.assertEqual((cm.exception.value, cm.exception.state), (5, None))
+
+	def liveStates(self):
+		with self.assertRaises(ParseLimitExceeded) as cm:
+			self.nested().parse("a" * 20, limits = parseLimits(maxLiveStates = 100))
+
+		self.assertEqual(cm.exception.limit, "maxLiveStates")
+		self.assertTrue(cm.exception.liveStates > 100)
+		self.assertTrue(cm.exception.tokens < 20)
+
+	def states(self):
+		with self.assertRaises(ParseLimitExceeded) as cm:
+			self.nested().parse("a" * 20, limits = parseLimits(maxStates = 1000))
+
+		self.assertEqual(cm.exception.limit, "maxStates")
+		self.assertTrue(cm.exception.states > 1000)
+
+	def seconds(self):
+		text = " ".join("a = %d;" % i for i in range(100))
+
+		self.assertRaises(ParseLimitExceeded, streamTests.statements().parse, text, limits = parseLimits(maxSeconds = 0.0))
+
+	def grammarLimits(self):
+		gr = streamTests.statements()
+		gr.limits = parseLimits(maxTokens = 4)
+
+		self.assertRaises(ParseLimitExceeded, gr.parse, "a = 1; b = 2;")
+		self.assertRaises(ParseLimitExceeded, gr.parseSpans, "a = 1; b = 2;")
+		self.assertEqual(gr.parse("a = 1; b = 2;", limits = parseLimits()), [[("a", 1), ("b", 2)]])
+
+	def stats(self):
+		stats = parseStats()
+
+		with self.assertRaises(ParseLimitExceeded) as cm:
+			self.nested().parse("a" * 20, stats = stats, limits = parseLimits(maxLiveStates = 100))
+
+		self.assertEqual(stats.tokens, cm.exception.tokens)
+		self.assertEqual(stats.liveStates[-1], cm.exception.liveStates)
+
+class orderedTests(myTestCase):
+	tests = ["firstWins", "sameToken", "dropsLater", "keepsEarlier", "nested", "empty", "states", "bnf"]
+
+	a = token("a")
+	b = token("b")
+
+	def gr(self, alternatives, ordered = True):
+		return grammar.fromSymbol(repeat(oneOf(alternatives, ordered = ordered)))
+
+	def firstWins(self):
+		gr = self.gr([chain([self.a], lambda res: 1), chain([self.a], lambda res: 2)])
+
+		self.assertEqual(gr.parse("aaa"), [1, 1, 1])
+		self.assertRaises(AmbigiousResults, self.gr(gr.startSymbol.symbols[0].symbols, False).parse, "aaa")
+
+	def sameToken(self):
+		# The leaf of the second alternative waits for the a before 
+		# the one of the first.
+		gr = self.gr([chain([optional(self.b), self.a], lambda res: 1), chain([self.a], lambda res: 2)])
+
+		self.assertEqual(gr.parse("aaba"), [1, 1, 1])
+
+	def dropsLater(self):
+		gr = self.gr([self.a, chain([self.a, self.b])])
+
+		self.assertRaises(StatesExhausted, gr.parse, "ab")
+		self.assertEqual(self.gr([self.a, chain([self.a, self.b])], False).parse("ab"), [["a", "b"]])
+
+	def keepsEarlier(self):
+		gr = self.gr([chain([self.a, self.b]), self.a])
+
+		self.assertEqual(gr.parse("aab"), ["a", ["a", "b"]])
+
+	def nested(self):
+		# The first alternative completes through another ordered 
+		# oneOf, with the same token as the second.
+		inner = oneOf([oneOf([self.b, self.a], ordered = True)], ordered = True)
+		gr = self.gr([inner, repeat(self.a, 1)])
+
+		self.assertEqual(gr.parse("a"), ["a"])
+
+	def empty(self):
+		with warnings.catch_warnings():
+			warnings.simplefilter("ignore", GrammarWarning)
+			gr = grammar.fromSymbol(chain([oneOf([optional(self.a), optional(self.b)], ordered = True), optional(self.b)]))
+
+		self.assertEqual(gr.parse("b"), [[], ["b"]])
+		self.assertEqual(gr.parse("ab"), [["a"], ["b"]])
+
+	def states(self):
+		stats = [parseStats(), parseStats()]
+		alternatives = [chain([self.a], lambda res: 1), chain([self.a], lambda res: 2)]
+
+		self.gr(alternatives).parse("a" * 8, stats = stats[0])
+		self.assertRaises(AmbigiousResults, self.gr(alternatives, False).parse, "a" * 8, stats = stats[1])
+
+		self.assertEqual(max(stats[0].liveStates), 2)
+		self.assertTrue(sum(stats[0].created.values()) * 10 < sum(stats[1].created.values()))
+
+	def bnf(self):
+		class keywords(grammar):
+			name = token("[a-z]+")
+			space = token("[ ]+")
+
+			lexerStartState = lexState(["name"], ["space"])
+
+			@symbol("name / name")
+			def word(res):
+				return res[0]
+
+			startSymbol = symbol("{,}*word")
+
+		self.assertTrue(keywords().word.symbols[0].ordered)
+		self.assertEqual(keywords().parse("x y"), [["x", "y"]])
+
+class operatorsTests(myTestCase):
+	tests = ["shape", "mergers", "operand", "errors", "spans", "linear", "serialization"]
+
+	class calc(grammar):
+		space = token("[ ]+")
+		number = token("\d+", lambda res: int(res))
+		plus = token("[+]")
+		minus = token("-")
+		times = token("[*]")
+		power = token("\^")
+		leftP = token("[(]")
+		rightP = token("[)]")
+
+		lexerStartState = lexState(["number", "plus", "minus", "times", "power", "leftP", "rightP"], ["space"])
+
+		@symbol("number | (leftP expr rightP)")
+		def operand(res):
+			res = res[0]
+			if isinstance(res, list):
+				return res[1]
+			return res
+
+		expr = operators("operand", [("right", ["power"]), ("left", ["times"]), ("left", ["plus", "minus"])])
+
+		startSymbol = symbol("expr")
+
+	class evaluate(calc):
+		def arithmetic(res):
+			left, op, right = res
+			return {"+" : left + right, "-" : left - right, "*" : left * right}[op]
+
+		expr = operators("operand", [("right", ["power"], lambda res: res[0] ** res[2]), ("left", ["times"]), ("left", ["plus", "minus"])], arithmetic)
+
+	def shape(self):
+		gr = self.calc()
+
+		self.assertEqual(gr.parse("1 + 2 * 3"), [[1, "+", [2, "*", 3]]])
+		self.assertEqual(gr.parse("1 - 2 - 3"), [[[1, "-", 2], "-", 3]])
+		self.assertEqual(gr.parse("2 ^ 3 ^ 2"), [[2, "^", [3, "^", 2]]])
+		self.assertEqual(gr.parse("(1 + 2) * 3 ^ 2 - 4"), [[[[1, "+", 2], "*", [3, "^", 2]], "-", 4]])
+
+	def mergers(self):
+		gr = self.evaluate()
+
+		self.assertEqual(gr.parse("1 + 2 * 3 ^ 2 ^ 1 - 6 - 7"), [1 + 2 * 3 ** 2 ** 1 - 6 - 7])
+		self.assertEqual(gr.parse("2 * (3 - 1) ^ 3"), [16])
+
+	def operand(self):
+		self.assertEqual(self.calc().parse("(42)"), [42])
+
+	def errors(self):
+		gr = self.calc()
+
+		self.assertRaises(NotCompleted, gr.parse, "1 +")
+		self.assertRaises(StatesExhausted, gr.parse, "1 + * 2")
+		self.assertRaises(ValueError, operators, "a", [("up", ["b"])])
+		self.assertRaises(ValueError, operators, "a", [])
+
+	def spans(self):
+		tree = self.calc().parseSpans("1 + 2 * 3")
+
+		self.assertEqual((tree.name(1), tree.lexeme(1)), ("expr", "1 + 2 * 3"))
+		self.assertEqual(len(list(tree.children(1))), 5)
+
+	def linear(self):
+		gr = self.evaluate()
+		created = []
+		live = []
+
+		for n in [50, 100]:
+			stats = parseStats()
+			gr.parse(" + ".join(["2 * 3 - 1"] * n), stats = stats)
+			created.append(sum(stats.created.values()))
+			live.append(max(stats.liveStates))
+
+		self.assertTrue(created[1] <= created[0] * 2.1)
+		self.assertEqual(live[0], live[1])
+
+	def serialization(self):
+		gr = grammar.loads(self.evaluate().dumps())
+
+		self.assertEqual(gr.parse("2 * (3 - 1) ^ 3"), [16])
+
+class bulkTests(myTestCase):
+	tests = ["token", "repeat", "merger", "numeric", "context", "serialization"]
+
+	class numbers(grammar):
+		space = token("[ ]+")
+		number = token("-?\d+", lambda res: int(res), bulkMerger = lambda lexemes: [int(l) * 10 for l in lexemes])
+		lexerStartState = lexState(["number"], ["space"])
+
+		@symbol("{,}*number")
+		def startSymbol(res):
+			return sum(res[0])
+
+	def token(self):
+		calls = []
+		def bulk(lexemes):
+			calls.append(lexemes)
+			return "bulk"
+
+		def single(res):
+			raise AssertionError("Merger of item called.")
+
+		gr = grammar.fromSymbol(repeat(token("[ab]", single, bulk)))
+
+		self.assertEqual(gr.parse("abba"), "bulk")
+		self.assertEqual(calls, [["a", "b", "b", "a"]])
+		self.assertEqual(grammar.fromSymbol(repeat(token("[ab]", bulkMerger = bulk))).parse(""), "bulk")
+
+	def repeat(self):
+		ab = chain([token("a"), token("b")])
+		gr = grammar.fromSymbol(repeat(ab, bulkMerger = lambda lexemes: "|".join(lexemes)),
+								lexerStates = [lexerState(ab.getTokens(), [token("[ ]+")])])
+
+		self.assertEqual(gr.parse("ab a b"), "ab|ab")
+
+	def merger(self):
+		stats = parseStats()
+		self.assertEqual(self.numbers().parse("1 2 -3", stats = stats), 0)
+		self.assertEqual(stats.mergerCalls, {"repeat" : 1, "startSymbol" : 1})
+
+	def numeric(self):
+		values = numericArray(["1", "-2", "3.5"])
+		self.assertEqual(list(values), [1.0, -2.0, 3.5])
+		self.assertEqual(list(numericArray(["1", "2"], int)), [1, 2])
+		self.assertEqual(len(numericArray([])), 0)
+
+		if numpy is not None:
+			self.assertTrue(isinstance(values, numpy.ndarray))
+			number = token("\d+", bulkMerger = numericArray)
+			gr = grammar.fromSymbol(repeat(number), lexerStates = [lexerState([number], [token("[ ]+")])])
+			self.assertEqual(list(gr.parse("1 2 3")), [1.0, 2.0, 3.0])
+
+	def context(self):
+		gr = grammar.fromSymbol(repeat(token("\d", bulkMerger = numericArray)))
+
+		self.assertEqual(list(gr.parse("12", {"x" : 1})), [1.0, 2.0])
+
+	def serialization(self):
+		gr = grammar.loads(self.numbers().dumps())
+		self.assertEqual(gr.parse("1 2 3"), 60)
+
+class charClassTests(myTestCase):
+	tests = ["shape", "tables", "lex", "unicode", "error", "parse"]
+
+	class expr(grammar):
+		space = token("[ \\t\\n]+")
+		number = token("[0-9]+", lambda res: int(res))
+		operator = token("[-+*/]")
+		lexerStartState = lexState(["number", "operator"], ["space"])
+
+		@symbol("{,}*(number | operator)")
+		def startSymbol(res):
+			return [item[0] for item in res[0]]
+
+	def shape(self):
+		self.assertEqual(charClassLexer.shape("[a-z]+"), True)
+		self.assertEqual(charClassLexer.shape("\\d"), False)
+		self.assertEqual(charClassLexer.shape("a"), False)
+		self.assertEqual(charClassLexer.shape("ab"), None)
+		self.assertEqual(charClassLexer.shape("[a-z]*"), None)
+		self.assertEqual(charClassLexer.shape("(?P<a>a)"), None)
+
+	def tables(self):
+		gr = self.expr()
+
+		if numpy is None:
+			self.assertEqual(gr.charClassLexers, {})
+			self.skipTest("numpy not installed")
+
+		self.assertTrue(gr.lexerStartState in gr.charClassLexers)
+
+		overlapping = grammar.fromSymbol(token("[a-z]+"), lexerStates = [lexerState([token("[a-z]+"), token("a")])])
+		self.assertEqual(overlapping.charClassLexers, {})
+
+		self.assertEqual(grammarTests.lang().charClassLexers, {})
+
+	def lex(self):
+		if numpy is None:
+			self.skipTest("numpy not installed")
+
+		gr = self.expr()
+		text = "12 + 3*45\t-6 / 789\n"
+		lexer = gr.charClassLexers[gr.lexerStartState]
+		fast = [(m.token, m.text, m.start, m.end) for m in lexer.lex(text)]
+		slow = [(m.token, m.text, m.start, m.end) for m in gr.iterlex(text)]
+
+		self.assertEqual(fast, slow)
+		self.assertEqual(lexer.lex(""), [])
+
+	def unicode(self):
+		if numpy is None:
+			self.skipTest("numpy not installed")
+
+		gr = self.expr()
+		lexer = gr.charClassLexers[gr.lexerStartState]
+
+		self.assertEqual([m.text for m in lexer.lex(u"1 + 22")], [u"1", u"+", u"22"])
+		self.assertEqual(lexer.lex(u"1 \u2212 2"), None)
+
+	def error(self):
+		gr = self.expr()
+
+		with self.assertRaises(LexerError) as cm:
+			gr.lex("1 + a")
+		self.assertEqual(cm.exception.pos, 4)
+
+	def parse(self):
+		gr = self.expr()
+		self.assertEqual(gr.parse("1 + 2 * 3"), [1, "+", 2, "*", 3])
+		self.assertEqual(grammar.loads(gr.dumps()).parse("4-5"), [4, "-", 5])
+
+class analysisTests(myTestCase):
+	tests = ["leftRecursion", "nullableRepeat", "nestedRepeat", "ambigiousEmpty", "overlapping", "unreachable", "strict"]
+
+	class leftRecursive(grammar):
+		startSymbol = symbol("expr")
+		expr = symbol("(expr plus a) | a")
+		a = token("a")
+		plus = token("[+]")
+		lexerStartState = lexState(["a", "plus"])
+
+	class unused(grammar):
+		startSymbol = symbol("a")
+		other = symbol("a b")
+		a = token("a")
+		b = token("b")
+		c = token("c")
+		space = token("[ ]+")
+		lexerStartState = lexState(["a", "b", "c"], ["space"])
+
+	def analyze(self, createGrammar):
+		with warnings.catch_warnings(record = True) as caught:
+			warnings.simplefilter("always")
+			gr = createGrammar()
+
+		self.assertTrue(all(issubclass(w.category, GrammarWarning) for w in caught))
+		return gr.issues, [str(w.message) for w in caught]
+
+	def leftRecursion(self):
+		issues, caught = self.analyze(self.leftRecursive)
+
+		self.assertEqual([(i.kind, i.symbols) for i in issues if i.level == "error"], [("leftRecursion", ["expr"])])
+		self.assertEqual(caught, ["expr: Left recursion, the states expand to infinity."])
+
+	def nullableRepeat(self):
+		issues, caught = self.analyze(lambda: grammar.fromSymbol(repeat(optional(token("a")))))
+
+		self.assertEqual([(i.kind, i.symbols) for i in issues], [("nullableRepeat", ["repeat"])])
+		self.assertEqual(len(caught), 1)
+
+		issues, caught = self.analyze(lambda: grammar.fromSymbol(optional(optional(token("a")))))
+		self.assertEqual(issues, [])
+
+	def nestedRepeat(self):
+		issues, caught = self.analyze(lambda: grammar.fromSymbol(repeat(chain([repeat(token("a"), From = 1)]))))
+
+		self.assertEqual([(i.kind, i.level) for i in issues], [("nestedRepeat", "warning")])
+
+	def ambigiousEmpty(self):
+		issues, caught = self.analyze(lambda: grammar.fromSymbol(oneOf([optional(token("a")), repeat(token("b"))])))
+
+		self.assertEqual([i.kind for i in issues], ["ambigiousEmpty"])
+
+	def overlapping(self):
+		issues, caught = self.analyze(grammarTests.lang)
+
+		self.assertEqual([(i.kind, i.level) for i in issues], [("overlappingOneOf", "info")])
+		self.assertEqual(caught, [])
+
+	def unreachable(self):
+		issues, caught = self.analyze(self.unused)
+
+		self.assertEqual([(i.kind, i.symbols) for i in issues], [("unreachable", ["b"]), ("unreachable", ["c"]), ("unreachable", ["other"])])
+		self.assertEqual(len(caught), 3)
+
+	def strict(self):
+		self.assertRaises(GrammarError, self.leftRecursive, strict = True)
+		self.assertRaises(GrammarError, grammar.fromSymbol, repeat(optional(token("a"))), strict = True)
+
+		strictLang = type("strictLang", (grammarTests.lang,), {"strict" : True})
+		self.assertEqual(strictLang().parse("1 + 2"), 3)
+
+		with self.assertRaises(GrammarError) as cm:
+			type("strictUnused", (self.unused,), {"strict" : True})()
+		self.assertEqual(len(cm.exception.issues), 3)
+
+class literalTests(myTestCase):
+	tests = ["literal", "longest", "priority", "keywords", "keywordParse", "manyKeywords", "errors"]
+
+	class statements(grammar):
+		space = token("[ ]+")
+		name = token("[a-z]+")
+		ifKeyword = token("if")
+		thenKeyword = token("then")
+		equals = token("=")
+		equalsTwice = token("==")
+		lexerStartState = lexState(["equalsTwice", "equals", "name"], ["space"], keywords = ["ifKeyword", "thenKeyword"])
+
+		@symbol("ifKeyword name equalsTwice name thenKeyword name equals name")
+		def startSymbol(res):
+			return (res[1], res[3], res[5], res[7])
+
+	def lexed(self, gr, text):
+		return [(m.token.name, m.text) for m in gr.lex(text)]
+
+	def literal(self):
+		a, leftP, word, b = token("a"), token("[(]"), token("\\w+"), token("b")
+		grouped = literalTrie.group([a, leftP, word, b])
+
+		self.assertEqual(len(grouped), 3)
+		self.assertEqual(grouped[0].tokens, [a, leftP])
+		self.assertEqual(grouped[1:], [word, b])
+
+		# A literal starting with an earlier one starts a new trie.
+		ab, abc, x, abcd = token("ab"), token("abc"), token("x"), token("abcd")
+		grouped = literalTrie.group([abc, ab, x, abcd, a])
+
+		self.assertEqual([g.tokens for g in grouped], [[abc, ab, x], [abcd, a]])
+
+	def longest(self):
+		# Literals are tried in order, like other tokens.
+		plus, plusplus = token("[+]"), token("[+][+]")
+
+		for tokens, lexed in (([plus, plusplus], [plus, plus, plus]), ([plusplus, plus], [plusplus, plus])):
+			gr = grammar.fromSymbol(repeat(oneOf([plus, plusplus])), lexerStates = [lexerState(tokens)])
+			self.assertEqual([m.token for m in gr.lex("+++")], lexed)
+			self.assertEqual([m.token for m in gr.iterlex("+++")], lexed)
+
+	def priority(self):
+		a, name, ab = token("a"), token("[a-z]+"), token("ab")
+		gr = grammar.fromSymbol(repeat(oneOf([a, name, ab])), lexerStates = [lexerState([a, name, ab])])
+
+		self.assertEqual([m.token for m in gr.lex("ab")], [a, name])
+
+	def keywords(self):
+		gr = self.statements()
+
+		self.assertEqual(self.lexed(gr, "if iffy then"), [("ifKeyword", "if"), ("name", "iffy"), ("thenKeyword", "then")])
+		self.assertEqual(self.lexed(gr, "a == b = c"), [("name", "a"), ("equalsTwice", "=="), ("name", "b"), ("equals", "="), ("name", "c")])
+
+	def keywordParse(self):
+		gr = self.statements()
+
+		self.assertEqual(gr.parse("if a == b then c = d"), ("a", "b", "c", "d"))
+		self.assertRaises(ParsrError, gr.parse, "if if == b then c = d")
+		self.assertEqual(grammar.loads(gr.dumps()).parse("if x == y then z = w"), ("x", "y", "z", "w"))
+
+	def manyKeywords(self):
+		keywords = [token("kw%d" % i) for i in range(300)]
+		name = token("[a-z0-9]+")
+		gr = grammar.fromSymbol(repeat(oneOf(keywords + [name])), lexerStates = [lexerState([name], [token("[ ]+")], keywords = keywords)])
+
+		self.assertEqual([m.token for m in gr.lex("kw7 kw299 kw300 x")], [keywords[7], keywords[299], name, name])
+
+	def errors(self):
+		self.assertRaises(ValueError, grammar.fromSymbol, token("a"), lexerStates = [lexerState([token("a")], keywords = [token("[ab]")])])
+
+class longestMatchTests(myTestCase):
+	tests = ["dispatch", "longest", "ties", "omit", "nonAscii", "serialization"]
+
+	class numbers(grammar):
+		space = token("[ ]+")
+		ifKeyword = token("if")
+		name = token("[a-z]+")
+		integer = token("\d+")
+		real = token("\d+[.]\d+")
+		plus = token("[+]")
+		plusPlus = token("[+][+]")
+		lexerStartState = lexState(["ifKeyword", "name", "integer", "real", "plus", "plusPlus"], ["space"], longestMatch = True)
+
+		@symbol("{,}*(ifKeyword | name | integer | real | plus | plusPlus)")
+		def startSymbol(res):
+			return [item[0] for item in res[0]]
+
+	def lexed(self, gr, text):
+		return [(m.token.name, m.text) for m in gr.lex(text)]
+
+	def dispatch(self):
+		ifKeyword, name, number, boundary = token("if"), token("[a-c_]\w*"), token("\d+"), token("\\bx")
+		matcher = longestMatcher([ifKeyword, name, number, boundary])
+
+		self.assertEqual(matcher.trie.tokens, [ifKeyword])
+		self.assertEqual(matcher.dispatch["a"], [name, boundary])
+		self.assertEqual(matcher.dispatch["1"], [number, boundary])
+		self.assertEqual(matcher.dispatch["z"], [boundary])
+		self.assertEqual(matcher.other, [number, boundary])
+
+	def longest(self):
+		gr = self.numbers()
+
+		self.assertEqual(self.lexed(gr, "12 1.5 +++"), [("integer", "12"), ("real", "1.5"), ("plusPlus", "++"), ("plus", "+")])
+		self.assertEqual(self.lexed(gr, "iffy"), [("name", "iffy")])
+
+	def ties(self):
+		gr = self.numbers()
+
+		self.assertEqual(self.lexed(gr, "if x"), [("ifKeyword", "if"), ("name", "x")])
+
+	def omit(self):
+		name, comment = token("[a-z/*]+"), token("/[*].*?[*]/")
+		gr = grammar.fromSymbol(repeat(name), lexerStates = [lexerState([name], [comment], longestMatch = True)])
+
+		self.assertEqual([m.text for m in gr.lex("/*x*/ab*/")], ["ab*/"])
+
+	def nonAscii(self):
+		word, other = token(u"\w+"), token(u"[^a-z ]+")
+		gr = grammar.fromSymbol(repeat(oneOf([word, other])), lexerStates = [lexerState([other, word], [token(" ")], longestMatch = True)])
+
+		self.assertEqual([(m.token, m.text) for m in gr.lex(u"\xe9t\xe9 ab")], [(other, u"\xe9"), (word, u"t"), (other, u"\xe9"), (word, u"ab")])
+
+	def serialization(self):
+		gr = grammar.loads(self.numbers().dumps())
+
+		self.assertEqual(gr.parse("a 1.25 ++"), ["a", "1.25", "++"])
+
+class parallelTests(myTestCase):
+	tests = ["segments", "segmentLexes", "parse", "fallback", "quoted", "errors", "pool"]
+
+	class statements(streamTests.statements):
+		syncTokens = ["semicolon"]
+
+		@symbol("{,}*statement")
+		def startSymbol(res):
+			return dict(res[0])
+
+	class blocks(statements):
+		leftB = token("[{]")
+		rightB = token("[}]")
+		lexerStartState = lexState(["name", "number", "equals", "semicolon", "leftB", "rightB"], ["space"])
+
+		@symbol("(name equals number semicolon) | (leftB {,}*statement rightB)")
+		def statement(res):
+			res = res[0]
+			if len(res) == 4:
+				return (res[0], int(res[2]))
+			return ("block", len(res[1]))
+
+	class quotes(statements):
+		quote = token("'[^']*'")
+		lexerStartState = lexState(["name", "number", "equals", "semicolon", "quote"], ["space"])
+
+		@symbol("name equals (number | quote) semicolon")
+		def statement(res):
+			return (res[0], res[2][0])
+
+	def text(self, count):
+		return " ".join("x%s = %d;" % ("abcdefghij"[i % 10], i) for i in range(count)).replace("x", "")
+
+	def segments(self):
+		gr = self.statements()
+		text = "a = 1; b = 2; c = 3; d = 4;"
+
+		self.assertEqual(gr.segments(text, 3), [(0, 13), (13, len(text))])
+		self.assertEqual(gr.segments(text, 1), [(0, len(text))])
+		self.assertEqual(streamTests.statements().segments(text, 4), [(0, len(text))])
+
+		# Sync tokens are searched for, even inside other tokens.
+		self.assertEqual(self.quotes().segments("a = 'x; y'; b = 2;", 3), [(0, 7), (7, 18)])
+
+	def segmentLexes(self):
+		gr = self.quotes()
+
+		self.assertTrue(gr.segmentLexes("a = 'x; y';"))
+		self.assertFalse(gr.segmentLexes("a = 'x;"))
+		self.assertFalse(gr.segmentLexes("a = 12"))
+
+	def parse(self):
+		gr = self.statements()
+		text = self.text(200)
+
+		self.assertEqual(gr.parallelParse(text, processes = 2), gr.parse(text))
+		self.assertEqual(gr.parallelParse("", processes = 2), {})
+
+	def fallback(self):
+		gr = self.blocks()
+		text = " ".join(["{ a = 1; b = 2; }"] * 20 + ["c = 3;"])
+
+		self.assertEqual(gr.parallelParse(text, processes = 2), {"block" : 2, "c" : 3})
+
+	def quoted(self):
+		gr = self.quotes()
+		text = " ".join("%s = '%d;%d';" % ("abcdefghij"[i % 10], i, i) for i in range(100))
+
+		self.assertEqual(gr.parallelParse(text, processes = 2), gr.parse(text))
+
+	def errors(self):
+		gr = self.statements()
+		text = self.text(20) + " a = ;"
+
+		self.assertRaises(StatesExhausted, gr.parallelParse, text, processes = 2)
+
+	def pool(self):
+		import multiprocessing
+
+		gr = self.statements()
+		text = self.text(50)
+		pool = multiprocessing.Pool(2)
+
+		try:
+			self.assertEqual(gr.parallelParse(text, pool = pool), gr.parse(text))
+		finally:
+			pool.terminate()
+
+class cacheTests(myTestCase):
+	tests = ["hits", "keys", "mergers", "eviction", "disk", "skipped"]
+
+	class counted(streamTests.statements):
+		# Names of the statements the merger was called for.
+		calls = []
+
+		@symbol("name equals number semicolon")
+		def statement(res, **context):
+			cacheTests.counted.calls.append(res[0])
+			return (res[0], int(res[2]))
+
+	def setUp(self):
+		del self.counted.calls[:]
+
+	def hits(self):
+		gr = self.counted()
+		gr.cache = parseCache()
+
+		first = gr.parse("a = 1; b = 2;")
+		self.assertTrue(gr.parse("a = 1; b = 2;") is first)
+		self.assertEqual(self.counted.calls, ["a", "b"])
+		self.assertEqual((gr.cache.hits, gr.cache.misses), (1, 1))
+
+		# Stats and tracers need the parse to run.
+		gr.parse("a = 1; b = 2;", stats = parseStats())
+		self.assertEqual(gr.cache.hits, 1)
+
+	def keys(self):
+		cache = parseCache()
+		gr = self.counted()
+
+		self.assertEqual(cache.key(gr, "a = 1;", {}), cache.key(self.counted(), "a = 1;", {}))
+		self.assertNotEqual(cache.key(gr, "a = 1;", {}), cache.key(gr, "a = 2;", {}))
+		self.assertNotEqual(cache.key(gr, "a = 1;", {}), cache.key(gr, "a = 1;", {"x" : 1}))
+		self.assertNotEqual(cache.key(gr, "a = 1;", {}), cache.key(streamTests.statements(), "a = 1;", {}))
+
+	def mergers(self):
+		# Grammars that only differ in their mergers must not share
+		# results.
+		cache = parseCache()
+
+		def parse(merger):
+			gr = grammar.fromSymbol(token("\d+", merger))
+			gr.cache = cache
+			return gr.parse("12")
+
+		self.assertEqual(repr(parse(int)), "12")
+		self.assertEqual(repr(parse(float)), "12.0")
+
+		def times(factor):
+			return lambda res: int(res) * factor
+
+		self.assertEqual(parse(times(2)), 24)
+		self.assertEqual(parse(times(3)), 36)
+
+		def plus(res, summand = 1):
+			return int(res) + summand
+
+		self.assertEqual(parse(plus), 13)
+		plus.__defaults__ = (2,)
+		self.assertEqual(parse(plus), 14)
+
+		self.assertEqual((cache.hits, cache.misses), (0, 6))
+
+	def eviction(self):
+		gr = self.counted()
+		gr.cache = parseCache()
+		gr.parse("a = 1;")
+		gr.cache.maxSize = gr.cache.size * 2
+
+		gr.parse("b = 2;")
+		gr.parse("a = 1;")
+		gr.parse("c = 3;")
+
+		self.assertEqual(gr.cache.evictions, 1)
+		self.assertEqual(len(gr.cache), 2)
+		self.assertEqual(gr.parse("a = 1;"), [[("a", 1)]])
+		self.assertEqual(gr.cache.hits, 2)
+
+	def disk(self):
+		directory = tempfile.mkdtemp()
+
+		try:
+			gr = self.counted()
+			gr.cache = parseCache(directory = directory)
+			gr.parse("a = 1;")
+
+			gr = grammar.loads(gr.dumps())
+			self.assertEqual(len(gr.cache), 0)
+
+			self.assertEqual(gr.parse("a = 1;"), [[("a", 1)]])
+			self.assertEqual((gr.cache.diskHits, gr.cache.misses), (1, 0))
+			self.assertEqual(self.counted.calls, ["a"])
+		finally:
+			for name in os.listdir(directory):
+				os.remove(os.path.join(directory, name))
+			os.rmdir(directory)
+
+	def skipped(self):
+		gr = self.counted()
+		gr.cache = parseCache()
+
+		gr.parse("a = 1;", {"f" : lambda: None})
+		gr.parse("a = 1;", {"f" : lambda: None})
+
+		self.assertEqual(self.counted.calls, ["a", "a"])
+		self.assertEqual((gr.cache.skipped, len(gr.cache)), (2, 0))
+
+class serializationTests(myTestCase):
+	tests = ["roundTrip", "reference", "file", "freshProcess", "lambdaMerger"]
+
+	def roundTrip(self):
+		gr = grammar.loads(grammarTests.lang().dumps())
+
+		self.assertTrue(isinstance(gr, grammarTests.lang))
+		self.assertEqual(gr.parse("1 + 2"), 3)
+		self.assertEqual(gr.parse("4 / -2"), -2)
+		self.assertEqual(gr.parse("1 + 2 /* foobar */"), 3)
+
+	def reference(self):
+		gr = grammar.loads(bnfGrammar().dumps())
+
+		self.assertTrue(isinstance(gr.parse("a b|c"), chain))
+
+	def file(self):
+		fd, filename = tempfile.mkstemp()
+		os.close(fd)
+
+		try:
+			grammarTests.lang().save(filename)
+			self.assertEqual(grammar.load(filename).parse("1*-2"), -2)
+		finally:
+			os.remove(filename)
+
+	def freshProcess(self):
+		fd, filename = tempfile.mkstemp()
+		os.close(fd)
+
+		try:
+			# The grammar class needs to be importable from the other process.
+			import tests
+			tests.grammarTests.lang().save(filename)
+			code = "import parsr; print parsr.grammar.load(%r).parse('4 / -2')" % filename
+			out = subprocess.check_output([sys.executable, "-c", code],
+										cwd = os.path.dirname(os.path.abspath(__file__)))
+			self.assertEqual(out.strip(), "-2")
+		finally:
+			os.remove(filename)
+
+	def lambdaMerger(self):
+		c = token("c", merger = lambda x: "CCC")
+		gr = grammar.fromSymbol(chain([token("a"), c]))
+
+		with self.assertRaises(SerializationError) as raised:
+			gr.dumps()
+
+		self.assertTrue(raised.exception.symbol is gr.startSymbol.symbols[1])
+		self.assertTrue("\"c\"" in str(raised.exception))
+
+class importTests(myTestCase):
+	tests = ["noGrammarWork", "importTime"]
+
+	def runPython(self, code):
+		return subprocess.check_output([sys.executable, "-c", code],
+										cwd = os.path.dirname(os.path.abspath(__file__)))
+
+	def noGrammarWork(self):
+		code = "\n".join([
+			"import sys",
+			"calls = []",
+			"def profile(frame, event, arg):",
+			"	if event == 'call' and frame.f_code.co_filename.endswith('parsr.py') \\",
+			"			and frame.f_code.co_name in ('initSymbols', 'initLexerStates', '__copy__', 'define'):",
+			"		calls.append(frame.f_code.co_name)",
+			"sys.setprofile(profile)",
+			"import parsr",
+			"sys.setprofile(None)",
+			"print len(calls), parsr._bnfParser is None, 'numpy' in sys.modules"])
+
+		self.assertEqual(self.runPython(code).split(), ["0", "True", "False"])
+
+	def importTime(self):
+		# Executing the module must be cheaper than creating the
+		# bnfGrammar it used to create on import.
+		code = "\n".join([
+			"import imp, os, sys, time, parsr",
+			"source = compile(open(os.path.splitext(parsr.__file__)[0] + '.py').read(), 'parsr.py', 'exec')",
+			"def importParsr():",
+			"	module = imp.new_module('parsr')",
+			"	exec source in module.__dict__",
+			"def timeIt(f):",
+			"	times = []",
+			"	for i in range(5):",
+			"		start = time.time()",
+			"		f()",
+			"		times.append(time.time() - start)",
+			"	return min(times)",
+			"print timeIt(importParsr), timeIt(parsr.bnfGrammar)"])
+
+		importTime, bootstrapTime = [float(i) for i in self.runPython(code).split()]
+		self.assertTrue(importTime < bootstrapTime,
+						"Import took %.4fs, building bnfGrammar %.4fs." % (importTime, bootstrapTime))
+
+class generatorTests(myTestCase):
+	tests = ["results", "errors", "nesting", "lexerStates", "bulk", "ordered", "bnf", "mergers", "work"]
+
+	def load(self, gr):
+		module = imp.new_module("generated")
+		exec compile(gr.generateParser(), "generated", "exec") in module.__dict__
+		return module
+
+	def outcome(self, parse, text):
+		try:
+			return parse(text)
+		except ParsrError as e:
+			return e.__class__
+
+	def assertSame(self, gr, texts):
+		module = self.load(gr)
+
+		for text in texts:
+			self.assertEqual(self.outcome(module.parse, text), self.outcome(gr.parse, text), text)
+
+	def results(self):
+		self.assertSame(grammarTests.lang(), ["1 + 2", "   1  +2   ", "1*-2", "4 / -2", "4/2"])
+		self.assertSame(operatorsTests.evaluate(), ["1", "1 - 2 - 3", "2 ^ 3 ^ 2", "1 + 2 * 3 ^ 2 - (4 - 5) * 6"])
+		self.assertSame(operatorsTests.calc(), ["1 + 2 * 3 - 4", "(1 + 2) * 3"])
+
+	def errors(self):
+		gr = operatorsTests.calc()
+		module = self.load(gr)
+
+		self.assertRaises(StatesExhausted, module.parse, "1 + + 2")
+		self.assertRaises(NotCompleted, module.parse, "1 +")
+		self.assertRaises(LexerError, module.parse, "1 + a")
+		self.assertSame(gr, ["", "+", "1 2", "(1", "1 )"])
+		self.assertSame(streamTests.statements(), ["", "a = 1", "a = 1;;", "= 1;", "a = ;b"])
+
+		a = token("a")
+		module = self.load(grammar.fromSymbol(oneOf([a, chain([a])])))
+		self.assertRaises(AmbigiousResults, module.parse, "a")
+
+		with warnings.catch_warnings():
+			warnings.simplefilter("ignore")
+			self.assertRaises(GrammarError, analysisTests.leftRecursive().generateParser)
+
+	def nesting(self):
+		gr = operatorsTests.calc()
+		module = self.load(gr)
+
+		nested = "(" * 100 + "1 + 2" + ")" * 100
+		self.assertEqual(module.parse(nested), gr.parse(nested))
+
+		# Deeper than the recursion limit allows is no infinite state
+		# expansion.
+		nested = "(" * sys.getrecursionlimit() + "1" + ")" * sys.getrecursionlimit()
+		try:
+			module.parse(nested)
+		except RuntimeError as e:
+			self.assertFalse(isinstance(e, InfiniteStateExpansion))
+
+	def lexerStates(self):
+		self.assertSame(grammarTests.lang(), ["1 + 2 /* foobar */", "1 + 2 /* foo", "1 + 2 /* */ 3"])
+		self.assertSame(literalTests.statements(), ["if a then b = 2; end", "a = 1;", "if"])
+		self.assertSame(longestMatchTests.numbers(), ["1 2.5 3e4", "12", "1.2.3"])
+
+	def bulk(self):
+		self.assertSame(bulkTests.numbers(), ["", "1 2 3", "-4"])
+
+	def ordered(self):
+		a = token("a")
+		b = token("b")
+		gr = grammar.fromSymbol(repeat(oneOf([chain([optional(b), a], len), chain([a], repr)], ordered = True)))
+
+		self.assertSame(gr, ["aaba", "aab", "b", "ba"])
+
+	def bnf(self):
+		gr = bnfGrammar()
+		module = self.load(gr)
+
+		describe = bnfTests("differential").describe
+
+		for text in ["a b", "a | (b c)", "{1,2}*(a b) / ?c", "a / b"]:
+			self.assertEqual(describe(module.parse(text, {"parser" : gr})), describe(gr.parse(text)))
+
+		self.assertRaises(StatesExhausted, module.parse, "a | b / c", {"parser" : gr})
+
+	def mergers(self):
+		gr = grammar.fromSymbol(token("c", merger = lambda x: "CCC"))
+
+		self.assertRaises(ValueError, gr.generateParser)
+
+		module = self.load(grammar.fromSymbol(repeat(token("c", merger = len))))
+		self.assertEqual(module.parse("ccc"), [1, 1, 1])
+
+	def calls(self, parse, text):
+		"""
+			The number of python functions called while parsing text.
+		"""
+		calls = [0]
+
+		def profile(frame, event, arg):
+			if event == "call":
+				calls[0] += 1
+
+		sys.setprofile(profile)
+		try:
+			parse(text)
+		finally:
+			sys.setprofile(None)
+
+		return calls[0]
+
+	def work(self):
+		gr = streamTests.statements()
+		module = self.load(gr)
+
+		self.assertEqual(module.parse("abc = 12; " * 200), gr.parse("abc = 12; " * 200))
+
+		generated = [self.calls(module.parse, "abc = 12; " * n) for n in (100, 200)]
+		engine = self.calls(gr.parse, "abc = 12; " * 100)
+
+		self.assertTrue(generated[0] * 5 < engine, "Generated parser made %d calls, grammar %d." % (generated[0], engine))
+		self.assertTrue(generated[1] < generated[0] * 2.2)
+
 class parsrTests(myTestSuite):
 	def __init__(self, *args, **kwargs):
 		super(parsrTests, self).__init__(*args, **kwargs)
@@ -386,6 +2091,28 @@ class parsrTests(myTestSuite):
 		self.addTests(stateTests.suite())
 		self.addTests(grammarTests.suite())
 		self.addTests(generalTests.suite())
+		self.addTests(bnfTests.suite())
+		self.addTests(streamTests.suite())
+		self.addTests(incrementalTests.suite())
+		self.addTests(sessionTests.suite())
+		self.addTests(spanTests.suite())
+		self.addTests(statsTests.suite())
+		self.addTests(tracerTests.suite())
+		self.addTests(memoryTests.suite())
+		self.addTests(complexityTests.suite())
+		self.addTests(limitsTests.suite())
+		self.addTests(orderedTests.suite())
+		self.addTests(operatorsTests.suite())
+		self.addTests(bulkTests.suite())
+		self.addTests(charClassTests.suite())
+		self.addTests(analysisTests.suite())
+		self.addTests(literalTests.suite())
+		self.addTests(longestMatchTests.suite())
+		self.addTests(parallelTests.suite())
+		self.addTests(cacheTests.suite())
+		self.addTests(serializationTests.suite())
+		self.addTests(generatorTests.suite())
+		self.addTests(importTests.suite())
 	
 
 if __name__ == "__main__":